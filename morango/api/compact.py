@@ -0,0 +1,209 @@
+"""
+Compact binary encoding of serialized buffers, as produced by `BufferSerializer`, for transfer
+between instances with the COMPACT_BUFFER_FORMAT capability.
+
+The encoding is zlib compressed, and once decompressed is laid out as follows, with all integers
+little endian:
+
+    magic (4 bytes) | version (1 byte)
+    string table: count (uint32), then each string as length (uint32) and UTF-8 bytes
+    buffer count (uint32), then for each buffer:
+        model_uuid (16 bytes)
+        flags (1 byte): 1 = deleted, 2 = hard_deleted
+        last_saved_counter (int64)
+        string table indexes (uint32) of last_saved_instance, partition, model_name, profile and
+            transfer_session
+        serialized, source_id, conflicting_serialized_data and _self_ref_fk, each as length
+            (uint32, or 0xFFFFFFFF for null) and UTF-8 bytes
+        RMCB count (uint32), then for each RMCB, the string table index (uint32) of its
+            instance_id and its counter (int64)
+
+Values that repeat across buffers, such as model names, partitions and instance IDs, are written
+once in the string table, and the transfer session and model UUID of each RMCB are implied by its
+buffer.
+"""
+import binascii
+import struct
+import zlib
+
+from django.utils import six
+
+
+MEDIA_TYPE = "application/vnd.morango.buffers"
+
+MAGIC = b"MRGB"
+VERSION = 1
+
+DELETED = 1
+HARD_DELETED = 2
+
+NULL_LENGTH = 0xFFFFFFFF
+
+_version = struct.Struct("<B")
+_uint32 = struct.Struct("<I")
+_buffer_header = struct.Struct("<16sBqIIIII")
+_rmcb = struct.Struct("<Iq")
+
+# buffer fields held in the string table, in order of the buffer header
+_TABLE_FIELDS = (
+    "last_saved_instance",
+    "partition",
+    "model_name",
+    "profile",
+    "transfer_session",
+)
+# buffer fields written inline
+_INLINE_FIELDS = (
+    "serialized",
+    "source_id",
+    "conflicting_serialized_data",
+    "_self_ref_fk",
+)
+
+
+class CompactFormatError(ValueError):
+    pass
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.indexes = {}
+        self.strings = []
+
+    def index(self, value):
+        value = six.text_type(value)
+        try:
+            return self.indexes[value]
+        except KeyError:
+            self.indexes[value] = len(self.strings)
+            self.strings.append(value)
+            return self.indexes[value]
+
+
+def _encode_string(value, pieces):
+    if value is None:
+        pieces.append(_uint32.pack(NULL_LENGTH))
+        return
+    encoded = six.text_type(value).encode("utf-8")
+    pieces.append(_uint32.pack(len(encoded)))
+    pieces.append(encoded)
+
+
+def dumps(buffers, compresslevel=6):
+    """
+    :param buffers: A list of dicts, serialized Buffers
+    :param compresslevel: The zlib compression level
+    :return: The compact encoding, as bytes
+    """
+    table = _StringTable()
+    pieces = []
+    for record in buffers:
+        flags = 0
+        if record["deleted"]:
+            flags |= DELETED
+        if record["hard_deleted"]:
+            flags |= HARD_DELETED
+
+        pieces.append(
+            _buffer_header.pack(
+                binascii.unhexlify(record["model_uuid"]),
+                flags,
+                record["last_saved_counter"],
+                *[table.index(record[field]) for field in _TABLE_FIELDS]
+            )
+        )
+        for field in _INLINE_FIELDS:
+            _encode_string(record[field], pieces)
+
+        rmcb_list = record["rmcb_list"]
+        pieces.append(_uint32.pack(len(rmcb_list)))
+        for rmcb in rmcb_list:
+            pieces.append(
+                _rmcb.pack(table.index(rmcb["instance_id"]), rmcb["counter"])
+            )
+
+    header = [MAGIC, _version.pack(VERSION), _uint32.pack(len(table.strings))]
+    for string in table.strings:
+        _encode_string(string, header)
+    header.append(_uint32.pack(len(buffers)))
+
+    return zlib.compress(b"".join(header + pieces), compresslevel)
+
+
+class _Reader(object):
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def string(self):
+        (length,) = self.unpack(_uint32)
+        if length == NULL_LENGTH:
+            return None
+        end = self.offset + length
+        if end > len(self.data):
+            raise struct.error("String extends past the end of the data")
+        value = self.data[self.offset : end].decode("utf-8")
+        self.offset = end
+        return value
+
+
+def loads(data):
+    """
+    :param data: The compact encoding, as bytes
+    :return: A list of dicts, serialized Buffers, as `BufferSerializer` would represent them
+    """
+    try:
+        reader = _Reader(zlib.decompress(data))
+        if reader.data[: len(MAGIC)] != MAGIC:
+            raise CompactFormatError("Not a compact buffer encoding")
+        reader.offset = len(MAGIC)
+        (version,) = reader.unpack(_version)
+        if version != VERSION:
+            raise CompactFormatError(
+                "Unsupported compact buffer encoding version {}".format(version)
+            )
+
+        (string_count,) = reader.unpack(_uint32)
+        strings = [reader.string() for _ in range(string_count)]
+
+        (buffer_count,) = reader.unpack(_uint32)
+        buffers = []
+        for _ in range(buffer_count):
+            header = reader.unpack(_buffer_header)
+            model_uuid = binascii.hexlify(header[0]).decode("ascii")
+            flags = header[1]
+            table_values = [strings[i] for i in header[3:]]
+            record = dict(zip(_TABLE_FIELDS, table_values))
+            record.update(
+                model_uuid=model_uuid,
+                deleted=bool(flags & DELETED),
+                hard_deleted=bool(flags & HARD_DELETED),
+                last_saved_counter=header[2],
+            )
+            for field in _INLINE_FIELDS:
+                record[field] = reader.string()
+
+            (rmcb_count,) = reader.unpack(_uint32)
+            rmcb_list = []
+            for _ in range(rmcb_count):
+                instance_index, counter = reader.unpack(_rmcb)
+                rmcb_list.append(
+                    {
+                        "transfer_session": record["transfer_session"],
+                        "model_uuid": model_uuid,
+                        "instance_id": strings[instance_index],
+                        "counter": counter,
+                    }
+                )
+            record["rmcb_list"] = rmcb_list
+            buffers.append(record)
+    except (zlib.error, struct.error, IndexError, UnicodeDecodeError) as e:
+        raise CompactFormatError("Malformed compact buffer encoding: {}".format(e))
+    return buffers
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+from rest_framework import pagination
+from rest_framework import response
+
+
+class BufferPagination(pagination.LimitOffsetPagination):
+    """
+    Paginates buffers by offset, or by keyset on `model_uuid` when the `after` query param is
+    present, which is sent by clients with the KEYSET_BUFFER_PAGINATION capability. The keyset
+    pages are ordered by `model_uuid`, so each page is a seek on the buffer's unique index rather
+    than a scan over all of the previous pages.
+    """
+
+    after_query_param = "after"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.after = request.query_params.get(self.after_query_param)
+        if self.after is None:
+            return super(BufferPagination, self).paginate_queryset(
+                queryset, request, view=view
+            )
+
+        self.limit = self.get_limit(request)
+        # an empty cursor requests the first page
+        if self.after:
+            queryset = queryset.filter(model_uuid__gt=self.after)
+        queryset = queryset.order_by("model_uuid")
+        if self.limit is not None:
+            queryset = queryset[: self.limit]
+        return list(queryset)
+
+    def get_paginated_response(self, data):
+        if self.after is None:
+            return super(BufferPagination, self).get_paginated_response(data)
+        return response.Response(OrderedDict([("results", data)]))
@@ -1,22 +1,191 @@
-import io
+import codecs
+import itertools
 import json
 
+from rest_framework.exceptions import ParseError
 from rest_framework.parsers import BaseParser
 
+from morango.api import compact
 
-class GzipParser(BaseParser):
+
+# number of compressed bytes read from the request stream at a time
+READ_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+def _iter_text(stream, decompressor):
+    """
+    Reads the compressed stream in pieces, yielding the decompressed UTF-8 text of each piece
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        compressed = stream.read(READ_SIZE)
+        if not compressed:
+            break
+        yield decoder.decode(decompressor.decompress(compressed))
+    yield decoder.decode(b"", final=True)
+
+
+class _JSONArrayLoader(object):
+    """
+    Decodes the elements of a JSON array from pieces of its text, as soon as each element has been
+    fully received, dropping the text of the elements already decoded
+    """
+
+    def __init__(self, text):
+        """
+        :param text: The text of the array following its opening bracket
+        """
+        self.decoder = json.JSONDecoder()
+        self.text = text
+        self.pos = 0
+        self.items = []
+        self.expect_item = True
+        self.closed = False
+
+    def feed(self, piece):
+        """
+        :param piece: The next piece of text, or None once all of it has been fed
+        :return: Whether the array has been closed
+        """
+        done = piece is None
+        if not done:
+            self.text = self.text[self.pos :] + piece
+            self.pos = 0
+        while not self.closed and self._skip_whitespace():
+            if not self.expect_item:
+                self._decode_delimiter()
+            elif not self._decode_item(done):
+                break
+        if done and not self.closed:
+            raise ValueError("Unterminated JSON array")
+        return self.closed
+
+    def remaining_text(self):
+        return self.text[self.pos :]
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+            self.pos += 1
+        return self.pos < len(self.text)
+
+    def _decode_delimiter(self):
+        char = self.text[self.pos]
+        if char == ",":
+            self.expect_item = True
+        elif char == "]":
+            self.closed = True
+        else:
+            raise ValueError("Expecting ',' delimiter: char {}".format(self.pos))
+        self.pos += 1
+
+    def _decode_item(self, done):
+        if self.text[self.pos] == "]" and not self.items:
+            self.closed = True
+            self.pos += 1
+            return True
+        try:
+            item, end = self.decoder.raw_decode(self.text, self.pos)
+        except ValueError:
+            if done:
+                raise
+            # the item hasn't been fully received yet
+            return False
+        # a number can only be known to be complete once something follows it
+        if end == len(self.text) and not done:
+            return False
+        self.items.append(item)
+        self.pos = end
+        self.expect_item = False
+        return True
+
+
+def _load_json(pieces):
+    """
+    Loads JSON from pieces of text. The elements of a top level array are decoded as soon as
+    they've been received, so only the text of the element being received is held in memory.
+    """
+    pieces = iter(pieces)
+    text = ""
+    for piece in pieces:
+        text += piece
+        if text.strip():
+            break
+    text = text.lstrip()
+    if not text.startswith("["):
+        return json.loads(text + "".join(pieces))
+
+    loader = _JSONArrayLoader(text[1:])
+    for piece in itertools.chain(pieces, [None]):
+        if loader.feed(piece):
+            break
+    if loader.remaining_text().strip() or "".join(pieces).strip():
+        raise ValueError("Extra data after JSON array")
+    return loader.items
+
+
+class CompressedJSONParser(BaseParser):
+    """
+    Base class for parsers of compressed JSON, which decompress and decode the request stream
+    incrementally rather than holding the whole body, compressed or decompressed, in memory.
+    """
+
+    def get_decompressor(self):
+        """
+        :return: An object with a `decompress` method, that's fed the compressed data in pieces
+        """
+        raise NotImplementedError()
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parses the incoming bytestream by decompressing the data and returns the resulting data as a dictionary.
+        """
+        try:
+            return _load_json(_iter_text(stream, self.get_decompressor()))
+        except ValueError as e:
+            raise ParseError("JSON parse error - {}".format(e))
+
+
+class GzipParser(CompressedJSONParser):
     """
     Parses Gzipped data.
     """
 
     media_type = "application/gzip"
 
+    def get_decompressor(self):
+        import zlib
+
+        # the window bits offset tells zlib to expect a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class ZstdParser(CompressedJSONParser):
+    """
+    Parses Zstandard compressed data.
+    """
+
+    media_type = "application/zstd"
+
+    def get_decompressor(self):
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+class CompactBufferParser(BaseParser):
+    """
+    Parses buffers in the compact binary encoding.
+    """
+
+    media_type = compact.MEDIA_TYPE
+
     def parse(self, stream, media_type=None, parser_context=None):
         """
-        Parses the incoming bytestream by decompressing the gzipped data and returns the resulting data as a dictionary.
+        Parses the incoming bytestream of compactly encoded buffers and returns the list of serialized buffers.
         """
-        import gzip
-
-        with gzip.GzipFile(fileobj=io.BytesIO(stream.read())) as f:
-            data = f.read()
-        return json.loads(data.decode("utf-8"))
+        try:
+            return compact.loads(stream.read())
+        except compact.CompactFormatError as e:
+            raise ParseError(str(e))
@@ -0,0 +1,29 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.renderers import JSONRenderer
+
+from morango.api import compact
+
+
+class CompactBufferRenderer(BaseRenderer):
+    """
+    Renders lists of serialized buffers in the compact binary encoding. Anything else, such as an
+    error response, is rendered as JSON instead.
+    """
+
+    media_type = compact.MEDIA_TYPE
+    format = "compact"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # parse out the results from a paginated set, if needed
+        if isinstance(data, dict) and "results" in data:
+            data = data["results"]
+
+        if isinstance(data, list):
+            return compact.dumps(data)
+
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = JSONRenderer.media_type
+        return JSONRenderer().render(data, renderer_context=renderer_context)
@@ -1,3 +1,7 @@
+from collections import OrderedDict
+
+from django.db import models
+from django.utils import six
 from rest_framework import exceptions
 from rest_framework import serializers
 
@@ -138,11 +142,87 @@ class RecordMaxCounterBufferSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+# number of model UUIDs per query when fetching the record max counter buffers in bulk
+RMCB_LIST_CHUNK_SIZE = 500
+
+
+def _get_representation_function(field):
+    # mirrors the representation of the field by its `ModelSerializer` counterpart
+    if isinstance(field, models.ForeignKey):
+        return None
+    if isinstance(field, models.BooleanField):
+        return bool
+    if isinstance(field, models.IntegerField):
+        return int
+    return six.text_type
+
+
+class BufferListSerializer(serializers.ListSerializer):
+    """
+    Serializes many buffers to the same representation as `BufferSerializer`, but fetches the
+    record max counter buffers of all of them in bulk, rather than with a query per buffer, and
+    builds each representation directly rather than through the serializer fields.
+    """
+
+    def _get_rmcb_lists(self, buffers):
+        rmcb_lists = {}
+        transfer_session_ids = set(b.transfer_session_id for b in buffers)
+        model_uuids = [b.model_uuid for b in buffers]
+        for i in range(0, len(model_uuids), RMCB_LIST_CHUNK_SIZE):
+            rmcbs = RecordMaxCounterBuffer.objects.filter(
+                transfer_session_id__in=transfer_session_ids,
+                model_uuid__in=model_uuids[i : i + RMCB_LIST_CHUNK_SIZE],
+            ).values_list(
+                "transfer_session_id", "model_uuid", "instance_id", "counter"
+            )
+            for transfer_session_id, model_uuid, instance_id, counter in rmcbs:
+                rmcb_lists.setdefault((transfer_session_id, model_uuid), []).append(
+                    OrderedDict(
+                        [
+                            ("transfer_session", transfer_session_id),
+                            ("model_uuid", six.text_type(model_uuid)),
+                            ("instance_id", six.text_type(instance_id)),
+                            ("counter", counter),
+                        ]
+                    )
+                )
+        return rmcb_lists
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        buffers = list(data)
+        rmcb_lists = self._get_rmcb_lists(buffers)
+
+        fields = []
+        for name in self.child.Meta.fields:
+            if name == "rmcb_list":
+                fields.append((name, None, None))
+                continue
+            field = Buffer._meta.get_field(name)
+            fields.append((name, field.attname, _get_representation_function(field)))
+
+        representations = []
+        for b in buffers:
+            representation = OrderedDict()
+            for name, attname, to_representation in fields:
+                if attname is None:
+                    value = rmcb_lists.get((b.transfer_session_id, b.model_uuid), [])
+                else:
+                    value = getattr(b, attname)
+                    if value is not None and to_representation is not None:
+                        value = to_representation(value)
+                representation[name] = value
+            representations.append(representation)
+        return representations
+
+
 class BufferSerializer(serializers.ModelSerializer):
     rmcb_list = RecordMaxCounterBufferSerializer(many=True)
 
     class Meta:
         model = Buffer
+        list_serializer_class = BufferListSerializer
         fields = (
             "serialized",
             "deleted",
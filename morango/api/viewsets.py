@@ -7,20 +7,23 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from ipware.ip import get_ip
 from rest_framework import mixins
-from rest_framework import pagination
 from rest_framework import response
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
 
 import morango
 from morango import errors
+from morango.api import pagination
 from morango.api import permissions
 from morango.api import serializers
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import ASYNC_OPERATIONS
+from morango.constants.capabilities import COMPACT_BUFFER_FORMAT
 from morango.constants.capabilities import GZIP_BUFFER_POST
+from morango.constants.capabilities import ZSTD_BUFFER_POST
 from morango.models import certificates
 from morango.models.core import Buffer
 from morango.models.core import Certificate
@@ -35,12 +38,26 @@ from morango.utils import _assert
 from morango.utils import parse_capabilities_from_server_request
 
 
+parsers = (JSONParser,)
+
 if GZIP_BUFFER_POST in CAPABILITIES:
     from .parsers import GzipParser
 
-    parsers = (GzipParser, JSONParser)
-else:
-    parsers = (JSONParser,)
+    parsers = (GzipParser,) + parsers
+
+if ZSTD_BUFFER_POST in CAPABILITIES:
+    from .parsers import ZstdParser
+
+    parsers = (ZstdParser,) + parsers
+
+renderers = tuple(api_settings.DEFAULT_RENDERER_CLASSES)
+
+if COMPACT_BUFFER_FORMAT in CAPABILITIES:
+    from .parsers import CompactBufferParser
+    from .renderers import CompactBufferRenderer
+
+    parsers = (CompactBufferParser,) + parsers
+    renderers = renderers + (CompactBufferRenderer,)
 
 
 def controller_signal_logger(context=None):
@@ -464,8 +481,9 @@ class TransferSessionViewSet(
 class BufferViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = (permissions.BufferPermissions,)
     serializer_class = serializers.BufferSerializer
-    pagination_class = pagination.LimitOffsetPagination
+    pagination_class = pagination.BufferPagination
     parser_classes = parsers
+    renderer_classes = renderers
 
     def create(self, request):
         data = request.data if isinstance(request.data, list) else [request.data]
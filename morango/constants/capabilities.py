@@ -1,3 +1,6 @@
 GZIP_BUFFER_POST = "GZIP_BUFFER_POST"
+ZSTD_BUFFER_POST = "ZSTD_BUFFER_POST"
+COMPACT_BUFFER_FORMAT = "COMPACT_BUFFER_FORMAT"
 ALLOW_CERTIFICATE_PUSHING = "ALLOW_CERTIFICATE_PUSHING"
 ASYNC_OPERATIONS = "ASYNC_OPERATIONS"
+KEYSET_BUFFER_PAGINATION = "KEYSET_BUFFER_PAGINATION"
@@ -2,6 +2,16 @@ ALLOW_CERTIFICATE_PUSHING = False
 MORANGO_SERIALIZE_BEFORE_QUEUING = True
 MORANGO_DESERIALIZE_AFTER_DEQUEUING = True
 MORANGO_DISALLOW_ASYNC_OPERATIONS = False
+MORANGO_SERIALIZE_BATCH_SIZE = 500
+MORANGO_ENABLE_CHANGE_LOG = False
+MORANGO_DESERIALIZE_WORKERS = 1
+MORANGO_DESERIALIZE_FK_CACHE_SIZE = 100000
+MORANGO_TRANSFER_PIPELINE_DEPTH = 1
+MORANGO_ADAPTIVE_CHUNK_SIZE = False
+MORANGO_CHUNK_SIZE_MIN = 50
+MORANGO_CHUNK_SIZE_MAX = 5000
+MORANGO_CHUNK_TARGET_LATENCY = 2.0
+MORANGO_DEQUEUE_CHUNK_SIZE = None
 MORANGO_INITIALIZE_OPERATIONS = (
     "morango.sync.operations:InitializeOperation",
     "morango.sync.operations:LegacyNetworkInitializeOperation",
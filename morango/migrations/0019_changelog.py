@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 05:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import morango.models.fields.uuids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0018_auto_20210714_2216"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLog",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_uuid", morango.models.fields.uuids.UUIDField()),
+                ("profile", models.CharField(max_length=40)),
+                ("model_name", models.CharField(max_length=40)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name="changelog",
+            index_together=set([("profile", "model_name")]),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 05:50
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0019_changelog"),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name="store",
+            index_together=set(
+                [("profile", "last_saved_instance", "last_saved_counter")]
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+INDEX_NAME = "morango_store_profile_partition"
+
+
+def create_partition_index(apps, schema_editor):
+    # postgres needs the `text_pattern_ops` operator class to use the index for `LIKE 'prefix%'`, which
+    # can't be declared through django, while sqlite uses it for range comparisons on the partition
+    opclass = " text_pattern_ops" if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS {index} ON morango_store (profile, partition{opclass})".format(
+            index=INDEX_NAME, opclass=opclass
+        )
+    )
+
+
+def drop_partition_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS {index}".format(index=INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0020_store_fsic_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_partition_index, drop_partition_index),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0021_store_partition_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transfersession",
+            name="chunk_sizes",
+            field=models.TextField(blank=True, default="[]"),
+        ),
+    ]
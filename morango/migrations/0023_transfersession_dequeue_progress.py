@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db import models
+import morango.models.fields.uuids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0022_transfersession_chunk_sizes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transfersession",
+            name="dequeue_cursor",
+            field=morango.models.fields.uuids.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="transfersession",
+            name="records_dequeued",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 12:32
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0023_transfersession_dequeue_progress"),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name="recordmaxcounterbuffer",
+            index_together=set(
+                [("transfer_session", "model_uuid", "instance_id", "counter")]
+            ),
+        ),
+    ]
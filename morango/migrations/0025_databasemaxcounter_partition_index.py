@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 14:05
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0024_dequeue_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name="databasemaxcounter",
+            index_together=set([("partition", "instance_id", "counter")]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 07:03
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("morango", "0025_databasemaxcounter_partition_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogProfile",
+            fields=[
+                (
+                    "profile",
+                    models.CharField(max_length=40, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
@@ -5,6 +5,8 @@ from morango.models.certificates import Nonce
 from morango.models.certificates import Scope
 from morango.models.certificates import ScopeDefinition
 from morango.models.core import Buffer
+from morango.models.core import ChangeLog
+from morango.models.core import ChangeLogProfile
 from morango.models.core import DatabaseIDModel
 from morango.models.core import DatabaseMaxCounter
 from morango.models.core import DeletedModels
@@ -50,6 +52,8 @@ __all__ += [
     "TransferSession",
     "DeletedModels",
     "HardDeletedModels",
+    "ChangeLog",
+    "ChangeLogProfile",
     "Store",
     "Buffer",
     "DatabaseMaxCounter",
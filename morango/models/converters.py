@@ -0,0 +1,124 @@
+import json
+
+from django.core import exceptions
+from django.db import models
+from django.db.models import signals
+
+from morango.models.core import _fk_lookup_cache_key
+from morango.models.core import SyncableModel
+
+
+def _get_function(method):
+    # unbound methods on python 2 wrap the underlying function
+    return getattr(method, "__func__", method)
+
+
+class StoreModelConverter(object):
+    """
+    Converts store records of a syncable model into the DB values of its app model's fields, in the
+    order of `model._meta.fields`, for bulk insertion into the app model's table.
+
+    For models that use the default `deserialize`, `clean_fields` and `__init__`, the serialized data
+    is validated and converted field by field without instantiating the app model. Otherwise, or
+    when the record is deleted or fails to validate, the conversion goes through
+    `Store._deserialize_store_model` so that custom behavior and deletion propagation still apply.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = model._meta.fields
+        self.fk_fields = [f for f in self.fields if isinstance(f, models.ForeignKey)]
+        self.is_compilable = (
+            _get_function(model.deserialize)
+            is _get_function(SyncableModel.deserialize)
+            and _get_function(model.clean_fields)
+            is _get_function(SyncableModel.clean_fields)
+            and _get_function(model.cached_clean_fields)
+            is _get_function(SyncableModel.cached_clean_fields)
+            and _get_function(model.__init__) is _get_function(models.Model.__init__)
+        )
+
+    def can_skip_instantiation(self):
+        # signal receivers may be connected at any time, so this isn't cached
+        return (
+            self.is_compilable
+            and not signals.pre_init.has_listeners(self.model)
+            and not signals.post_init.has_listeners(self.model)
+        )
+
+    def app_model_to_db_values(self, app_model, connection):
+        return [
+            f.get_db_prep_value(getattr(app_model, f.attname), connection)
+            for f in self.fields
+        ]
+
+    def _deserialize_values(self, store_model):
+        """
+        Mirrors `SyncableModel.deserialize`, returning the raw values of the app model's fields.
+        """
+        data = json.loads(store_model.serialized)
+        values = {}
+        for f in self.fields:
+            if f.attname in data:
+                values[f.attname] = data[f.attname]
+            else:
+                values[f.attname] = f.get_default()
+        values["_morango_source_id"] = store_model.source_id
+        values["_morango_partition"] = store_model.partition
+        values["_morango_dirty_bit"] = False
+        return values
+
+    def _validated_fk_fields(self, values, fk_cache):
+        """
+        Returns the names of the foreign key fields whose values are known to be valid, validating and
+        caching the ones not yet in the FK cache.
+        """
+        validated_fields = set()
+        for f in self.fk_fields:
+            key = _fk_lookup_cache_key(f, values[f.attname])
+            if key not in fk_cache:
+                try:
+                    f.validate(values[f.attname], None)
+                except exceptions.ValidationError:
+                    continue
+                fk_cache[key] = 1
+            validated_fields.add(f.name)
+        return validated_fields
+
+    def _clean_values(self, store_model, fk_cache):
+        """
+        Mirrors `SyncableModel.deserialize` followed by `cached_clean_fields`, returning the cleaned
+        values, or None if they don't validate.
+        """
+        values = self._deserialize_values(store_model)
+        excluded_fields = self._validated_fk_fields(values, fk_cache)
+
+        for f in self.fields:
+            if f.name in excluded_fields:
+                continue
+            raw_value = values[f.attname]
+            if f.blank and raw_value in f.empty_values:
+                continue
+            try:
+                values[f.attname] = f.clean(raw_value, None)
+            except exceptions.ValidationError:
+                return None
+        return values
+
+    def to_db_values(self, store_model, fk_cache, connection):
+        """
+        Returns the list of DB values for the store record's app model, or None if the record was
+        deleted. Raises a `ValidationError` or `ObjectDoesNotExist` if the record can't be deserialized.
+        """
+        if not store_model.deleted and self.can_skip_instantiation():
+            values = self._clean_values(store_model, fk_cache)
+            if values is not None:
+                return [
+                    f.get_db_prep_value(values[f.attname], connection)
+                    for f in self.fields
+                ]
+
+        app_model = store_model._deserialize_store_model(fk_cache)
+        if app_model is None:
+            return None
+        return self.app_model_to_db_values(app_model, connection)
@@ -1,11 +1,14 @@
 from __future__ import unicode_literals
 
+import itertools
 import json
 import logging
+import threading
 import uuid
 
 from django.core import exceptions
 from django.db import connection
+from django.db import connections
 from django.db import models
 from django.db import router
 from django.db import transaction
@@ -21,6 +24,7 @@ from django.utils import timezone
 
 from morango import proquint
 from morango.registry import syncable_models
+from morango.sync.backends.utils import load_backend
 from morango.models.certificates import Certificate
 from morango.models.certificates import Filter
 from morango.models.fields.uuids import sha2_uuid
@@ -34,9 +38,64 @@ from morango.models.utils import get_0_5_mac_address
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.utils import _assert
+from morango.utils import LRUCache
+from morango.utils import SETTINGS
 
 logger = logging.getLogger(__name__)
 
+# max number of values to check for existence with a single `IN` query, for sqlite variable limits
+FK_PREFETCH_CHUNK_SIZE = 500
+# number of dirty app model IDs per insert when seeding the change log
+CHANGE_LOG_SEED_CHUNK_SIZE = 500
+
+
+def _fk_lookup_cache_key(field, raw_value):
+    return (field.related_model._meta.db_table, raw_value)
+
+
+def _uncached_fk_values(field, dict_models, fk_lookup_cache):
+    """
+    Maps the referenced values of a foreign key field in the serialized models, which aren't
+    already cached, to the raw serialized values that are used in the cache keys.
+    """
+    raw_values = {}
+    for dict_model in dict_models:
+        raw_value = dict_model.get(field.attname)
+        if raw_value is None:
+            continue
+        if _fk_lookup_cache_key(field, raw_value) in fk_lookup_cache:
+            continue
+        try:
+            value = field.target_field.to_python(raw_value)
+        except exceptions.ValidationError:
+            # leave invalid values to be reported by model validation
+            continue
+        raw_values.setdefault(value, set()).add(raw_value)
+    return raw_values
+
+
+def _cache_existing_fk_values(field, raw_values, fk_lookup_cache):
+    """
+    Queries which of the referenced values exist, in chunks, and adds the raw values referencing
+    them to the FK lookup cache.
+    """
+    target_field = field.target_field
+    manager = field.related_model._default_manager.using(
+        router.db_for_read(field.related_model)
+    )
+    values = list(raw_values)
+    for i in range(0, len(values), FK_PREFETCH_CHUNK_SIZE):
+        queryset = manager.filter(
+            **{
+                "{}__in".format(target_field.attname): values[
+                    i : i + FK_PREFETCH_CHUNK_SIZE
+                ]
+            }
+        ).complex_filter(field.get_limit_choices_to())
+        for value in queryset.values_list(target_field.attname, flat=True):
+            for raw_value in raw_values.get(target_field.to_python(value), ()):
+                fk_lookup_cache[_fk_lookup_cache_key(field, raw_value)] = 1
+
 
 class DatabaseIDManager(models.Manager):
     """
@@ -252,6 +311,13 @@ class TransferSession(models.Model):
     )  # total number of records to be synced across in this transfer
     bytes_sent = models.BigIntegerField(default=0, null=True, blank=True)
     bytes_received = models.BigIntegerField(default=0, null=True, blank=True)
+    # JSON list of [records transferred, chunk size, bytes per second] for each time the chunk
+    # size was adapted during the transfer
+    chunk_sizes = models.TextField(blank=True, default="[]")
+    # track the progress of chunked dequeuing, as the number of records dequeued and the model_uuid
+    # of the last one, so an interrupted dequeue resumes after the last completed chunk
+    records_dequeued = models.IntegerField(default=0)
+    dequeue_cursor = UUIDField(blank=True, null=True)
 
     sync_session = models.ForeignKey(SyncSession)
 
@@ -298,9 +364,17 @@ class TransferSession(models.Model):
             self.transfer_stage_status = stage_status
         if stage is not None or stage_status is not None:
             self.last_activity_timestamp = timezone.now()
-            self.save()
+            # only the stage fields are written, since other fields like `records_transferred` may
+            # be concurrently updated while receiving chunks
+            self.save(
+                update_fields=[
+                    "transfer_stage",
+                    "transfer_stage_status",
+                    "last_activity_timestamp",
+                ]
+            )
             self.sync_session.last_activity_timestamp = timezone.now()
-            self.sync_session.save()
+            self.sync_session.save(update_fields=["last_activity_timestamp"])
 
     def delete_buffers(self):
         """
@@ -348,6 +422,78 @@ class HardDeletedModels(models.Model):
     profile = models.CharField(max_length=40)
 
 
+class ChangeLogProfile(models.Model):
+    """
+    ``ChangeLogProfile`` keeps track of the profiles whose ``ChangeLog`` has been seeded from the
+    dirty bits of their syncable models, and has been kept up to date since.
+    """
+
+    profile = models.CharField(max_length=40, primary_key=True)
+
+
+class ChangeLog(models.Model):
+    """
+    ``ChangeLog`` is an append-only log of syncable models that were marked dirty through
+    ``SyncableModel.save`` or ``SyncableModelQuerySet.update``/``bulk_create``. When enabled through
+    ``MORANGO_ENABLE_CHANGE_LOG``, serialization only looks up the app models logged here rather
+    than scanning each syncable model's table for its dirty bit.
+
+    The first serialization of a profile with the log enabled seeds it from the dirty bits, so
+    records marked dirty before the log was enabled are still serialized. Records marked dirty
+    through raw SQL while the log is enabled have to be logged with ``log_changes``.
+    """
+
+    model_uuid = UUIDField()
+    profile = models.CharField(max_length=40)
+    model_name = models.CharField(max_length=40)
+
+    class Meta:
+        index_together = ("profile", "model_name")
+
+    @classmethod
+    def log_changes(cls, model, ids):
+        """
+        :param model: The ``SyncableModel`` class of the changed records
+        :param ids: The IDs of the changed records
+        """
+        if not SETTINGS.MORANGO_ENABLE_CHANGE_LOG or model.morango_model_name is None:
+            return
+        cls.objects.bulk_create(
+            [
+                cls(
+                    model_uuid=model_id,
+                    profile=model.morango_profile,
+                    model_name=model.morango_model_name,
+                )
+                for model_id in ids
+            ]
+        )
+
+    @classmethod
+    @transaction.atomic
+    def seed(cls, profile):
+        """
+        Logs the dirty app models of the profile's syncable models, unless the profile's log has
+        already been seeded
+
+        :param profile: The profile of the syncable models
+        """
+        if ChangeLogProfile.objects.filter(profile=profile).exists():
+            return
+        for model in syncable_models.get_models(profile):
+            dirty_ids = (
+                model.objects.filter(_morango_dirty_bit=True)
+                .values_list("id", flat=True)
+                .iterator()
+            )
+            while True:
+                ids = list(itertools.islice(dirty_ids, CHANGE_LOG_SEED_CHUNK_SIZE))
+                if not ids:
+                    break
+                cls.log_changes(model, ids)
+        ChangeLogProfile.objects.create(profile=profile)
+
+
 class AbstractStore(models.Model):
     """
     Base abstract model for storing serialized data.
@@ -415,6 +561,10 @@ class Store(AbstractStore):
 
     objects = StoreManager()
 
+    class Meta:
+        # supports joining the store against FSICs when queuing
+        index_together = ("profile", "last_saved_instance", "last_saved_counter")
+
     def _deserialize_store_model(self, fk_cache):  # noqa: C901
         """
         When deserializing a store model, we look at the deleted flags to know if we should delete the app model.
@@ -490,6 +640,7 @@ class Buffer(AbstractStore):
     model_uuid = UUIDField()
 
     class Meta:
+        # the unique index also backs joining queued records to their record max counters
         unique_together = ("transfer_session", "model_uuid")
 
     def rmcb_list(self):
@@ -512,6 +663,19 @@ class AbstractCounter(models.Model):
         abstract = True
 
 
+# FSICs of filters, by filter and version of the database max counters
+_fsic_cache = LRUCache(100)
+# version of the database max counters, incremented whenever they're updated
+_dmc_version = 0
+_dmc_version_lock = threading.Lock()
+
+
+def _increment_dmc_version():
+    global _dmc_version
+    with _dmc_version_lock:
+        _dmc_version += 1
+
+
 class DatabaseMaxCounter(AbstractCounter):
     """
     ``DatabaseMaxCounter`` is used to keep track of what data this database already has across all
@@ -523,6 +687,8 @@ class DatabaseMaxCounter(AbstractCounter):
 
     class Meta:
         unique_together = ("instance_id", "partition")
+        # covers looking up the counters of partition prefixes
+        index_together = ("partition", "instance_id", "counter")
 
     @classmethod
     @transaction.atomic
@@ -539,39 +705,102 @@ class DatabaseMaxCounter(AbstractCounter):
                 updated_fsic[key] = fsics[key]
 
         # load database max counters
-        for (key, value) in six.iteritems(updated_fsic):
-            for f in sync_filter:
-                DatabaseMaxCounter.objects.update_or_create(
-                    instance_id=key, partition=f, defaults={"counter": value}
-                )
+        DatabaseMaxCounter.update_counters(
+            {
+                (key, f): value
+                for (key, value) in six.iteritems(updated_fsic)
+                for f in sync_filter
+            }
+        )
 
     @classmethod
-    def calculate_filter_max_counters(cls, filters):
+    def update_counters(cls, counters):
+        """
+        Creates or updates database max counters in bulk, keeping the greater of the existing and
+        new counters
 
-        # create string of prefixes to place into sql statement
-        condition = " UNION ".join(
-            ["SELECT CAST('{}' as TEXT) AS a".format(prefix) for prefix in filters]
-        )
+        :param counters: A dict of counters keyed by (instance ID, partition) tuples
+        """
+        if not counters:
+            return
+        with connection.cursor() as cursor:
+            load_backend(connection).SQLWrapper()._bulk_upsert_dmcs(
+                cursor,
+                [
+                    (instance_id, partition, counter)
+                    for (instance_id, partition), counter in six.iteritems(counters)
+                ],
+            )
+        # the cached FSICs are invalidated right away for this transaction, and once it commits
+        # for FSICs calculated by others in the meantime
+        _increment_dmc_version()
+        transaction.on_commit(_increment_dmc_version)
 
-        filter_max_calculation = """
-        SELECT PMC.instance, MIN(PMC.counter)
-        FROM
-            (
-            SELECT dmc.instance_id as instance, MAX(dmc.counter) as counter, filter as filter_partition
-            FROM {dmc_table} as dmc, (SELECT T.a as filter FROM ({filter_list}) as T) as foo
-            WHERE filter LIKE dmc.partition || '%'
-            GROUP BY instance, filter_partition
-            ) as PMC
-        GROUP BY PMC.instance
-        HAVING {count} = COUNT(PMC.filter_partition)
-        """.format(
-            dmc_table=cls._meta.db_table, filter_list=condition, count=len(filters)
+    @classmethod
+    def calculate_filter_max_counters(cls, filters):
+        """
+        Calculates the FSIC of the filters, the minimum across the filter's partitions of the
+        maximum counter of each instance for the partition prefixes of each, considering only
+        instances with counters for all of the filter's partitions.
+
+        The FSIC is cached by database, filter and version of the database max counters, which is
+        incremented by `update_counters`, so it's only recalculated once the counters have been
+        updated. Only counters updated through `update_counters` in this process invalidate the
+        cache.
+
+        Since the partition prefixes of a filter's partition are its leading substrings, the
+        calculation looks up the counters of each of those on the partition index, rather than
+        matching every counter's partition against every filter.
+        """
+        partitions = frozenset(filters)
+        db_connection = connections[router.db_for_read(cls)]
+        key = (db_connection.settings_dict["NAME"], partitions, _dmc_version)
+        try:
+            return dict(_fsic_cache[key])
+        except KeyError:
+            pass
+
+        prefixes = list(
+            {
+                partition[:length]
+                for partition in partitions
+                for length in range(len(partition) + 1)
+            }
         )
+        chunk_size = load_backend(connection).SQLWrapper()._max_query_params()
+        counters = []
+        for i in range(0, len(prefixes), chunk_size):
+            counters.extend(
+                cls.objects.filter(partition__in=prefixes[i : i + chunk_size])
+                .values_list("instance_id", "partition", "counter")
+                .iterator()
+            )
 
-        with connection.cursor() as cursor:
-            cursor.execute(filter_max_calculation)
-            # try to get hex value because postgres returns values as uuid
-            return {getattr(tup[0], "hex", tup[0]): tup[1] for tup in cursor.fetchall()}
+        fsic = None
+        for partition in partitions:
+            partition_max_counters = {}
+            for instance_id, prefix, counter in counters:
+                if partition.startswith(prefix):
+                    # try to get hex value because postgres returns values as uuid
+                    instance_id = getattr(instance_id, "hex", instance_id)
+                    partition_max_counters[instance_id] = max(
+                        counter, partition_max_counters.get(instance_id, counter)
+                    )
+            if fsic is None:
+                fsic = partition_max_counters
+            else:
+                fsic = {
+                    instance_id: min(counter, partition_max_counters[instance_id])
+                    for instance_id, counter in six.iteritems(fsic)
+                    if instance_id in partition_max_counters
+                }
+
+        fsic = fsic or {}
+        # counters updated in a transaction may yet be rolled back, so only calculations of
+        # committed counters are cached
+        if not db_connection.in_atomic_block:
+            _fsic_cache[key] = fsic
+        return dict(fsic)
 
 
 class RecordMaxCounter(AbstractCounter):
@@ -596,6 +825,11 @@ class RecordMaxCounterBuffer(AbstractCounter):
     transfer_session = models.ForeignKey(TransferSession)
     model_uuid = UUIDField(db_index=True)
 
+    class Meta:
+        # covers dequeuing the counters of a transfer session's records, and the lookups of whether
+        # they've seen an instance's counter
+        index_together = ("transfer_session", "model_uuid", "instance_id", "counter")
+
 
 class SyncableModel(UUIDModelMixin):
     """
@@ -641,6 +875,8 @@ class SyncableModel(UUIDModelMixin):
         elif not update_dirty_bit_to:
             self._morango_dirty_bit = False
         super(SyncableModel, self).save(*args, **kwargs)
+        if self._morango_dirty_bit:
+            ChangeLog.log_changes(self.__class__, [self.id])
 
     def delete(
         self, using=None, keep_parents=False, hard_delete=False, *args, **kwargs
@@ -674,9 +910,7 @@ class SyncableModel(UUIDModelMixin):
         ]
         for f in fk_fields:
             raw_value = getattr(self, f.attname)
-            key = "morango_{id}_{db_table}_foreignkey".format(
-                db_table=f.related_model._meta.db_table, id=raw_value
-            )
+            key = _fk_lookup_cache_key(f, raw_value)
             try:
                 fk_lookup_cache[key]
                 excluded_fields.append(f.name)
@@ -690,6 +924,18 @@ class SyncableModel(UUIDModelMixin):
                     excluded_fields.append(f.name)
         self.clean_fields(exclude=excluded_fields)
 
+    @classmethod
+    def prefetch_foreign_keys(cls, dict_models, fk_lookup_cache):
+        """
+        Checks which foreign key referents of the serialized models exist, with one `IN` query per
+        related table, and adds those that do to the cache used by `cached_clean_fields`, so that
+        validating the models doesn't need a query per referent.
+        """
+        for f in cls._meta.fields:
+            if isinstance(f, ForeignKey):
+                raw_values = _uncached_fk_values(f, dict_models, fk_lookup_cache)
+                _cache_existing_fk_values(f, raw_values, fk_lookup_cache)
+
     def serialize(self):
         """All concrete fields of the ``SyncableModel`` subclass, except for those specifically blacklisted, are returned in a dict."""
         # NOTE: code adapted from https://github.com/django/django/blob/master/django/forms/models.py#L75
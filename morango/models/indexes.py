@@ -0,0 +1,47 @@
+from django.db.migrations.operations.base import Operation
+
+from morango.sync.backends.utils import load_backend
+
+
+class AddSyncableModelIndexes(Operation):
+    """
+    Migration operation that adds indexes to a `SyncableModel` subclass's table to support
+    looking up dirty records during serialization, and filtering records by partition prefix.
+    The index definitions are vendor specific, so they're created through the sync backends:
+
+        operations = [
+            AddSyncableModelIndexes("mymodel"),
+        ]
+    """
+
+    reversible = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return (self.__class__.__name__, [self.model_name], {})
+
+    def state_forwards(self, app_label, state):
+        # raw indexes aren't part of the model state
+        pass
+
+    def _run(self, method_name, app_label, schema_editor, state):
+        model = state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        connection = schema_editor.connection
+        DBBackend = load_backend(connection).SQLWrapper()
+        with connection.cursor() as cursor:
+            getattr(DBBackend, method_name)(cursor, connection, model)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._run("_create_syncable_model_indexes", app_label, schema_editor, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._run("_drop_syncable_model_indexes", app_label, schema_editor, from_state)
+
+    def describe(self):
+        return "Add morango dirty bit and partition indexes to {}".format(
+            self.model_name
+        )
@@ -1,5 +1,7 @@
 from django.db import models
 
+from morango.utils import SETTINGS
+
 
 class SyncableModelQuerySet(models.query.QuerySet):
     def as_manager(cls):
@@ -14,10 +16,28 @@ class SyncableModelQuerySet(models.query.QuerySet):
     as_manager = classmethod(as_manager)
 
     def update(self, update_dirty_bit_to=True, **kwargs):
+        changed_ids = None
         if update_dirty_bit_to is None:
             pass  # don't do anything with the dirty bit
         elif update_dirty_bit_to:
             kwargs.update({"_morango_dirty_bit": True})
         elif not update_dirty_bit_to:
             kwargs.update({"_morango_dirty_bit": False})
+        if kwargs.get("_morango_dirty_bit") and SETTINGS.MORANGO_ENABLE_CHANGE_LOG:
+            # grab IDs before updating, since the update may change what the queryset matches
+            changed_ids = list(self.values_list("id", flat=True))
         super(SyncableModelQuerySet, self).update(**kwargs)
+        if changed_ids:
+            from .core import ChangeLog
+
+            ChangeLog.log_changes(self.model, changed_ids)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super(SyncableModelQuerySet, self).bulk_create(objs, *args, **kwargs)
+        if SETTINGS.MORANGO_ENABLE_CHANGE_LOG:
+            from .core import ChangeLog
+
+            ChangeLog.log_changes(
+                self.model, [obj.id for obj in objs if obj._morango_dirty_bit]
+            )
+        return objs
@@ -23,6 +23,17 @@ def _get_foreign_key_classes(m):
     )
 
 
+def _get_model_dependencies(m):
+    """
+    Returns the classes a model depends on, through foreign keys and `morango_model_dependencies`
+    """
+    dependencies = _get_foreign_key_classes(m)
+    # add any more specified dependencies
+    if hasattr(m, "morango_model_dependencies"):
+        dependencies = dependencies | set(m.morango_model_dependencies)
+    return dependencies
+
+
 def _multiple_self_ref_fk_check(class_model):
     """
     We check whether a class has more than 1 FK reference to itself.
@@ -39,6 +50,7 @@ def _multiple_self_ref_fk_check(class_model):
 class SyncableModelRegistry(object):
     def __init__(self):
         self.profile_models = {}
+        self.model_converters = {}
         self.ready = False
         self.models_ready = {}
         if hasattr(sys.modules[__name__], "syncable_models"):
@@ -65,19 +77,67 @@ class SyncableModelRegistry(object):
         self.check_models_ready(profile)
         return list(self.profile_models.get(profile, {}).values())
 
+    def get_model_converter(self, model):
+        """
+        Return the `StoreModelConverter` for the model, which is built once and then cached.
+        """
+        from morango.models.converters import StoreModelConverter
+
+        if model not in self.model_converters:
+            self.model_converters[model] = StoreModelConverter(model)
+        return self.model_converters[model]
+
+    def get_model_dependencies(self, profile):
+        """
+        Return a mapping of each syncable model for this profile to the set of other syncable
+        models in this profile that it depends on.
+        """
+        models = self.get_models(profile)
+        return OrderedDict(
+            (
+                model,
+                set(
+                    cls
+                    for cls in _get_model_dependencies(model)
+                    if cls in models and cls is not model
+                ),
+            )
+            for model in models
+        )
+
+    def get_model_levels(self, profile):
+        """
+        Return the syncable models for this profile grouped into a list of levels, where models
+        in a level only depend on models from previous levels, so models within the same level
+        can be processed independently of each other. Within a level, models keep the same
+        order as `get_models`.
+        """
+        dependencies = self.get_model_dependencies(profile)
+        levels = []
+        processed = set()
+        while dependencies:
+            level = [
+                model
+                for model, model_dependencies in six.iteritems(dependencies)
+                if model_dependencies <= processed
+            ]
+            if not level:
+                # circular dependencies through `morango_model_dependencies`, so fall back to
+                # processing the remaining models one at a time, in dependency order
+                level = [next(iter(dependencies))]
+            for model in level:
+                del dependencies[model]
+            processed.update(level)
+            levels.append(level)
+        return levels
+
     def _insert_model_in_dependency_order(self, model, profile):
         # When we add models to be synced, we need to make sure
         #   that models that depend on other models are synced AFTER
         #   the model it depends on has been synced.
 
         # Get the dependencies of the new model
-        foreign_key_classes = _get_foreign_key_classes(model)
-
-        # add any more specified dependencies
-        if hasattr(model, "morango_model_dependencies"):
-            foreign_key_classes = foreign_key_classes | set(
-                model.morango_model_dependencies
-            )
+        foreign_key_classes = _get_model_dependencies(model)
 
         # Find all the existing models that this new model refers to.
         class_indices = [
@@ -1,134 +1,222 @@
+import uuid
+
+from django.db import connection
+from django.db.backends.utils import truncate_name
+from django.db.models import Q
+
 from morango.models.core import Buffer
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
 
 
+# temporary table of the buffered records' actions, while dequeuing
+ACTIONS_TABLE = "morango_dequeue_actions"
+
+# the actions of buffered records when dequeued into the store
+REVERSE_FAST_FORWARD = 0
+"""The store already has the buffered version, or a newer one, so the record is discarded"""
+FAST_FORWARD = 1
+"""The buffered version is new, or newer than the store's, so it replaces the store record"""
+MERGE_CONFLICT = 2
+"""The store and buffered versions diverged, so the buffered version is merged as a conflict"""
+
+
 class BaseSQLWrapper(object):
-    def _dequeuing_delete_rmcb_records(self, cursor, transfersession_id):
-        # delete all RMCBs which are a reverse FF (store version newer than buffer version)
-        delete_rmcb_records = """DELETE FROM {rmcb}
-                                 WHERE model_uuid IN
-                                 (SELECT rmcb.model_uuid FROM {store} as store, {buffer} as buffer, {rmc} as rmc, {rmcb} as rmcb
-                                 /*Scope to a single record*/
-                                 WHERE store.id = buffer.model_uuid
-                                 AND  store.id = rmc.store_model_id
-                                 AND  store.id = rmcb.model_uuid
-                                 /*Checks whether LSB of buffer or less is in RMC of store*/
-                                 AND buffer.last_saved_instance = rmc.instance_id
-                                 AND buffer.last_saved_counter <= rmc.counter
-                                 AND rmcb.transfer_session_id = '{transfer_session_id}'
-                                 AND buffer.transfer_session_id = '{transfer_session_id}')
-                                  """.format(
-            buffer=Buffer._meta.db_table,
-            store=Store._meta.db_table,
-            rmc=RecordMaxCounter._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
-        )
+    def _prepare_bulk_values(self, connection, fields, records):
+        """
+        Returns a flat list of DB prepared values for ``fields`` of each record, and a list of
+        '%s' placeholder tuples, one per record, for use in a multi-row VALUES clause
+        """
+        db_values = []
+        for record in records:
+            for f in fields:
+                db_values.append(
+                    f.get_db_prep_value(getattr(record, f.attname), connection)
+                )
+        placeholder_tuple = "({})".format(", ".join(["%s" for _ in range(len(fields))]))
+        placeholder_list = [placeholder_tuple for _ in range(len(records))]
+        return db_values, placeholder_list
 
-        cursor.execute(delete_rmcb_records)
-
-    def _dequeuing_delete_buffered_records(self, cursor, transfersession_id):
-        # delete all buffer records which are a reverse FF (store version newer than buffer version)
-        delete_buffered_records = """DELETE FROM {buffer}
-                                     WHERE model_uuid in
-                                     (SELECT buffer.model_uuid FROM {store} as store, {buffer} as buffer, {rmc} as rmc
-                                     /*Scope to a single record*/
-                                     WHERE store.id = buffer.model_uuid
-                                     AND rmc.store_model_id = buffer.model_uuid
-                                     /*Checks whether LSB of buffer or less is in RMC of store*/
-                                     AND buffer.last_saved_instance = rmc.instance_id
-                                     AND buffer.last_saved_counter <= rmc.counter
-                                     AND buffer.transfer_session_id = '{transfer_session_id}')
-                                  """.format(
-            buffer=Buffer._meta.db_table,
-            store=Store._meta.db_table,
-            rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
+    def _bulk_update_store_records(self, cursor, store_models):
+        raise NotImplementedError("Subclass must implement this method.")
+
+    def _max_query_params(self):
+        """
+        Returns the maximum number of parameters that should be bound in a single query
+        """
+        return 10000
+
+    def _prefix_filter(self, field_name, prefix):
+        """
+        Returns a Q object filtering `field_name` to values that start with `prefix`
+        """
+        return Q(**{"{}__startswith".format(field_name): prefix})
+
+    def _prefix_condition(self, column, prefix):
+        """
+        Returns a raw SQL condition, and its params, filtering `column` to values that start with `prefix`
+        """
+        return "{} LIKE %s".format(column), ["{}%".format(prefix)]
+
+    def _get_syncable_model_index_names(self, connection, model):
+        """
+        Returns the names of the dirty bit and partition indexes for a syncable model's table
+        """
+        return tuple(
+            truncate_name(
+                "{table}_morango_{suffix}".format(
+                    table=model._meta.db_table, suffix=suffix
+                ),
+                connection.ops.max_name_length(),
+            )
+            for suffix in ("dirty", "partition")
         )
-        cursor.execute(delete_buffered_records)
 
-    def _dequeuing_merge_conflict_rmcb(self, cursor, transfersession_id):
+    def _create_syncable_model_indexes(self, cursor, connection, model):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
+    def _drop_syncable_model_indexes(self, cursor, connection, model):
+        for index_name in self._get_syncable_model_index_names(connection, model):
+            cursor.execute(
+                "DROP INDEX IF EXISTS {index}".format(
+                    index=connection.ops.quote_name(index_name)
+                )
+            )
+
+    def _bulk_upsert_rmcs(self, cursor, current_id, store_model_ids):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_update_rmcs_last_saved_by(
-        self, cursor, current_id, transfersession_id
-    ):
+    def _bulk_upsert_dmcs(self, cursor, counters):
+        """
+        Creates or updates database max counters, keeping the greater of the existing and new
+        counters
+
+        :param counters: A list of (instance_id, partition, counter) tuples, unique by instance ID
+            and partition
+        """
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_delete_mc_buffer(self, cursor, transfersession_id):
-        # delete records with merge conflicts from buffer
-        delete_mc_buffer = """DELETE FROM {buffer}
-                                    WHERE EXISTS
-                                    (SELECT 1 FROM {store} AS store, {buffer} AS buffer
-                                    /*Scope to a single record.*/
-                                    WHERE store.id = {buffer}.model_uuid
-                                    AND {buffer}.transfer_session_id = '{transfer_session_id}'
-                                    /*Exclude fast-forwards*/
-                                    AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb WHERE store.id = rmcb.model_uuid
-                                                                                  AND store.last_saved_instance = rmcb.instance_id
-                                                                                  AND store.last_saved_counter <= rmcb.counter
-                                                                                  AND rmcb.transfer_session_id = '{transfer_session_id}'))
-                               """.format(
-            buffer=Buffer._meta.db_table,
-            store=Store._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
+    def _dequeuing_create_actions_table(self, cursor):
+        # temporary tables are private to the connection, so the name can't collide with another
+        # dequeue, but it may linger from an interrupted one on a persistent connection
+        cursor.execute("DROP TABLE IF EXISTS {actions}".format(actions=ACTIONS_TABLE))
+        cursor.execute(
+            """CREATE TEMPORARY TABLE {actions}
+               (model_uuid {uuid_type} PRIMARY KEY, action integer NOT NULL)
+            """.format(
+                actions=ACTIONS_TABLE,
+                uuid_type=Buffer._meta.get_field("model_uuid").db_type(connection),
+            )
         )
-        cursor.execute(delete_mc_buffer)
-
-    def _dequeuing_delete_mc_rmcb(self, cursor, transfersession_id):
-        # delete rmcb records with merge conflicts
-        delete_mc_rmc = """DELETE FROM {rmcb}
-                                    WHERE EXISTS
-                                    (SELECT 1 FROM {store} AS store, {rmc} AS rmc
-                                    /*Scope to a single record.*/
-                                    WHERE store.id = {rmcb}.model_uuid
-                                    AND store.id = rmc.store_model_id
-                                    /*Where buffer rmc is greater than store rmc*/
-                                    AND {rmcb}.instance_id = rmc.instance_id
-                                    AND {rmcb}.transfer_session_id = '{transfer_session_id}'
-                                    /*Exclude fast fast-forwards*/
-                                    AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                                                  AND store.last_saved_instance = rmcb2.instance_id
-                                                                                  AND store.last_saved_counter <= rmcb2.counter
-                                                                                  AND rmcb2.transfer_session_id = '{transfer_session_id}'))
-                               """.format(
+
+    def _dequeuing_drop_actions_table(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS {actions}".format(actions=ACTIONS_TABLE))
+
+    def _dequeuing_range_condition(self, column, after=None, upto=None):
+        """
+        :return: SQL conditions limiting `column` to the range of model UUIDs after `after`, up to
+            and including `upto`, where either bound may be None for an open range
+        """
+        conditions = []
+        if after is not None:
+            conditions.append("AND {} > '{}'".format(column, uuid.UUID(str(after)).hex))
+        if upto is not None:
+            conditions.append("AND {} <= '{}'".format(column, uuid.UUID(str(upto)).hex))
+        return " ".join(conditions)
+
+    def _dequeuing_classify(self, cursor, transfersession_id, after=None, upto=None):
+        """
+        Classifies each buffered record, once, by how it should be merged into the store
+
+        :return: The number of buffered records classified
+        """
+        classify = """INSERT INTO {actions} (model_uuid, action)
+                      SELECT buffer.model_uuid,
+                          CASE
+                          /*New records*/
+                          WHEN store.id IS NULL THEN {fast_forward}
+                          /*Checks whether LSB of buffer or less is in RMC of store*/
+                          WHEN EXISTS (SELECT 1 FROM {rmc} AS rmc WHERE rmc.store_model_id = buffer.model_uuid
+                                                                 AND rmc.instance_id = buffer.last_saved_instance
+                                                                 AND rmc.counter >= buffer.last_saved_counter)
+                          THEN {reverse_fast_forward}
+                          /*Checks whether LSB of store or less is in RMCB of buffer*/
+                          WHEN EXISTS (SELECT 1 FROM {rmcb} AS rmcb WHERE rmcb.model_uuid = buffer.model_uuid
+                                                                   AND rmcb.instance_id = store.last_saved_instance
+                                                                   AND rmcb.counter >= store.last_saved_counter
+                                                                   AND rmcb.transfer_session_id = '{transfer_session_id}')
+                          THEN {fast_forward}
+                          ELSE {merge_conflict}
+                          END
+                      FROM {buffer} AS buffer
+                      LEFT OUTER JOIN {store} AS store ON store.id = buffer.model_uuid
+                      WHERE buffer.transfer_session_id = '{transfer_session_id}'
+                      {range_condition}
+                   """.format(
+            actions=ACTIONS_TABLE,
+            buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
             transfer_session_id=transfersession_id,
+            fast_forward=FAST_FORWARD,
+            reverse_fast_forward=REVERSE_FAST_FORWARD,
+            merge_conflict=MERGE_CONFLICT,
+            range_condition=self._dequeuing_range_condition(
+                "buffer.model_uuid", after=after, upto=upto
+            ),
         )
-        cursor.execute(delete_mc_rmc)
+        cursor.execute(classify)
+        return cursor.rowcount
 
-    def _dequeuing_insert_remaining_buffer(self, cursor, transfersession_id):
+    def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
+        raise NotImplementedError("Subclass must implement this method.")
+
+    def _dequeuing_update_rmcs_last_saved_by(
+        self, cursor, current_id, transfersession_id
+    ):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_insert_remaining_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_insert_fast_forward_buffer(self, cursor, transfersession_id):
         raise NotImplementedError("Subclass must implement this method.")
 
-    def _dequeuing_delete_remaining_rmcb(self, cursor, transfersession_id):
+    def _dequeuing_insert_rmcb(self, cursor, transfersession_id):
+        raise NotImplementedError("Subclass must implement this method.")
+
+    def _dequeuing_delete_remaining_rmcb(
+        self, cursor, transfersession_id, after=None, upto=None
+    ):
         # delete the remaining rmcb for this transfer session
         delete_remaining_rmcb = """
                                 DELETE FROM {rmcb}
                                 WHERE {rmcb}.transfer_session_id = '{transfer_session_id}'
+                                {range_condition}
                                 """.format(
             rmcb=RecordMaxCounterBuffer._meta.db_table,
             transfer_session_id=transfersession_id,
+            range_condition=self._dequeuing_range_condition(
+                "{}.model_uuid".format(RecordMaxCounterBuffer._meta.db_table),
+                after=after,
+                upto=upto,
+            ),
         )
 
         cursor.execute(delete_remaining_rmcb)
 
-    def _dequeuing_delete_remaining_buffer(self, cursor, transfersession_id):
+    def _dequeuing_delete_remaining_buffer(
+        self, cursor, transfersession_id, after=None, upto=None
+    ):
         # delete the remaining buffer for this transfer session
         delete_remaining_buffer = """
                                   DELETE FROM {buffer}
                                   WHERE {buffer}.transfer_session_id = '{transfer_session_id}'
+                                  {range_condition}
                                   """.format(
-            buffer=Buffer._meta.db_table, transfer_session_id=transfersession_id
+            buffer=Buffer._meta.db_table,
+            transfer_session_id=transfersession_id,
+            range_condition=self._dequeuing_range_condition(
+                "{}.model_uuid".format(Buffer._meta.db_table), after=after, upto=upto
+            ),
         )
         cursor.execute(delete_remaining_buffer)
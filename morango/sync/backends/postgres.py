@@ -1,7 +1,11 @@
 from django.db import connection
 
+from .base import ACTIONS_TABLE
 from .base import BaseSQLWrapper
+from .base import FAST_FORWARD
+from .base import MERGE_CONFLICT
 from morango.models.core import Buffer
+from morango.models.core import DatabaseMaxCounter
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
@@ -65,33 +69,105 @@ class SQLWrapper(BaseSQLWrapper):
         # use DB-APIs parameter substitution (2nd parameter expects a sequence)
         cursor.execute(insert, db_values)
 
-    def _dequeuing_merge_conflict_rmcb(self, cursor, transfersession_id):
-        # transfer record max counters for records with merge conflicts + perform max
-        merge_conflict_rmc = """UPDATE {rmc} as rmc SET counter
-                                    = rmcb.counter
-                                    FROM {rmcb} AS rmcb, {store} AS store, {buffer} AS buffer
-                                    /*Scope to a single record.*/
-                                    WHERE store.id = rmcb.model_uuid
-                                    AND store.id = rmc.store_model_id
-                                    AND store.id = buffer.model_uuid
-                                    /*Where buffer rmc is greater than store rmc*/
-                                    AND rmcb.instance_id = rmc.instance_id
-                                    AND rmcb.counter > rmc.counter
-                                    AND rmcb.transfer_session_id = '{transfer_session_id}'
-                                    /*Exclude fast-forwards*/
-                                    AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                                                  AND store.last_saved_instance = rmcb2.instance_id
-                                                                                  AND store.last_saved_counter <= rmcb2.counter
-                                                                                  AND rmcb2.transfer_session_id = '{transfer_session_id}')
-                               """.format(
-            buffer=Buffer._meta.db_table,
-            store=Store._meta.db_table,
-            rmc=RecordMaxCounter._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
+    def _bulk_update_store_records(self, cursor, store_models):
+        fields = Store._meta.concrete_fields
+        # cast the values in the SET statement to their appropiate postgres db types
+        set_casted_values = ", ".join(
+            map(
+                lambda f: "{f} = nv.{f}::{type}".format(
+                    f=f.attname, type=f.rel_db_type(connection)
+                ),
+                [f for f in fields if not f.primary_key],
+            )
         )
+        # update in chunks that stay within the limit on bound parameters
+        chunk_size = max(1, self._max_query_params() // len(fields))
+        for i in range(0, len(store_models), chunk_size):
+            db_values, placeholder_list = self._prepare_bulk_values(
+                connection, fields, store_models[i : i + chunk_size]
+            )
+            update = """
+                UPDATE {store} store
+                SET {set_values}
+                FROM (VALUES {placeholder_str}) AS nv {fields}
+                WHERE store.id = nv.id::{id_type}
+            """.format(
+                store=Store._meta.db_table,
+                set_values=set_casted_values,
+                placeholder_str=", ".join(placeholder_list),
+                fields=str(tuple(str(f.attname) for f in fields)).replace("'", ""),
+                id_type=Store._meta.pk.rel_db_type(connection),
+            )
+            cursor.execute(update, db_values)
+
+    def _bulk_upsert_rmcs(self, cursor, current_id, store_model_ids):
+        # update or create rmcs for the store models with local instance id
+        chunk_size = self._max_query_params()
+        for i in range(0, len(store_model_ids), chunk_size):
+            chunk = store_model_ids[i : i + chunk_size]
+            upsert = """
+                WITH new_values (store_model_id) as
+                (
+                    VALUES {placeholder_str}
+                ),
+                updated as
+                (
+                    UPDATE {rmc} rmc
+                    SET counter = {current_instance_counter}
+                    FROM new_values nv
+                    WHERE rmc.store_model_id = nv.store_model_id::uuid AND rmc.instance_id = '{current_instance_id}'::uuid
+                    returning rmc.*
+                )
+                INSERT INTO {rmc}(instance_id, counter, store_model_id)
+                SELECT '{current_instance_id}'::uuid, {current_instance_counter}, nv.store_model_id::uuid
+                FROM new_values nv
+                WHERE nv.store_model_id::uuid not in (SELECT store_model_id FROM updated)
+            """.format(
+                rmc=RecordMaxCounter._meta.db_table,
+                placeholder_str=", ".join(["(%s)" for _ in chunk]),
+                current_instance_id=current_id.id,
+                current_instance_counter=current_id.counter,
+            )
+            cursor.execute(upsert, chunk)
 
-        cursor.execute(merge_conflict_rmc)
+    def _bulk_upsert_dmcs(self, cursor, counters):
+        # update or create dmcs, keeping the greater counter
+        chunk_size = self._max_query_params() // 3
+        for i in range(0, len(counters), chunk_size):
+            chunk = counters[i : i + chunk_size]
+            upsert = """
+                INSERT INTO {dmc} (instance_id, partition, counter)
+                VALUES {placeholder_str}
+                ON CONFLICT (instance_id, partition)
+                DO UPDATE SET counter = GREATEST({dmc}.counter, EXCLUDED.counter)
+            """.format(
+                dmc=DatabaseMaxCounter._meta.db_table,
+                placeholder_str=", ".join(["(%s, %s, %s)" for _ in chunk]),
+            )
+            cursor.execute(upsert, [value for counter in chunk for value in counter])
+
+    def _create_syncable_model_indexes(self, cursor, connection, model):
+        """
+        Creates a partial index over dirty records only, which stays small since records are only
+        dirty until the next serialization, and an index supporting `LIKE 'prefix%'` filters
+        on the partition
+        """
+        dirty_index, partition_index = self._get_syncable_model_index_names(
+            connection, model
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS {index} ON {table} ({pk}) WHERE _morango_dirty_bit = TRUE".format(
+                index=connection.ops.quote_name(dirty_index),
+                table=connection.ops.quote_name(model._meta.db_table),
+                pk=connection.ops.quote_name(model._meta.pk.column),
+            )
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS {index} ON {table} (_morango_partition varchar_pattern_ops)".format(
+                index=connection.ops.quote_name(partition_index),
+                table=connection.ops.quote_name(model._meta.db_table),
+            )
+        )
 
     def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
         # transfer buffer serialized into conflicting store
@@ -102,19 +178,16 @@ class SQLWrapper(BaseSQLWrapper):
                                                    CASE buffer.hard_deleted WHEN TRUE THEN '' ELSE buffer.serialized || '\n' || store.conflicting_serialized_data END, TRUE, store._self_ref_fk,
                                                    '', '{transfer_session_id}')
                                             /*Scope to a single record.*/
-                                            FROM {buffer} AS buffer
+                                            FROM {buffer} AS buffer, {actions} AS actions
                                             WHERE store.id = buffer.model_uuid
+                                            AND actions.model_uuid = buffer.model_uuid
+                                            AND actions.action = {merge_conflict}
                                             AND buffer.transfer_session_id = '{transfer_session_id}'
-                                            /*Exclude fast-forwards*/
-                                            AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                                                          AND store.last_saved_instance = rmcb2.instance_id
-                                                                                          AND store.last_saved_counter <= rmcb2.counter
-                                                                                          AND rmcb2.transfer_session_id = '{transfer_session_id}')
                                       """.format(
             buffer=Buffer._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
             store=Store._meta.db_table,
-            rmc=RecordMaxCounter._meta.db_table,
+            actions=ACTIONS_TABLE,
+            merge_conflict=MERGE_CONFLICT,
             transfer_session_id=transfersession_id,
             current_instance_id=current_id.id,
             current_instance_counter=current_id.counter,
@@ -129,16 +202,9 @@ class SQLWrapper(BaseSQLWrapper):
         merge_conflict_store = """
                 WITH new_values as
             (
-                SELECT '{current_instance_id}'::uuid curr_id, {current_instance_counter} curr_counter, store.id
-                FROM {store} as store, {buffer} as buffer
-                /*Scope to a single record.*/
-                WHERE store.id = buffer.model_uuid
-                AND buffer.transfer_session_id = '{transfer_session_id}'
-                /*Exclude fast-forwards*/
-                AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                              AND store.last_saved_instance = rmcb2.instance_id
-                                                              AND store.last_saved_counter <= rmcb2.counter
-                                                              AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                SELECT '{current_instance_id}'::uuid curr_id, {current_instance_counter} curr_counter, actions.model_uuid id
+                FROM {actions} as actions
+                WHERE actions.action = {merge_conflict}
             ),
             updated as
             (
@@ -153,26 +219,26 @@ class SQLWrapper(BaseSQLWrapper):
             FROM new_values ut
             WHERE ut.id not in (SELECT store_model_id FROM updated)
         """.format(
-            buffer=Buffer._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
-            store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
+            actions=ACTIONS_TABLE,
+            merge_conflict=MERGE_CONFLICT,
             current_instance_id=current_id.id,
             current_instance_counter=current_id.counter,
         )
 
         cursor.execute(merge_conflict_store)
 
-    def _dequeuing_insert_remaining_buffer(self, cursor, transfersession_id):
-        # insert remaining records into store
-        insert_remaining_buffer = """
+    def _dequeuing_insert_fast_forward_buffer(self, cursor, transfersession_id):
+        # insert new and fast-forwarded records into store
+        insert_fast_forward_buffer = """
             WITH new_values as
             (
                 SELECT buffer.model_uuid, buffer.serialized, buffer.deleted, buffer.last_saved_instance, buffer.last_saved_counter, buffer.hard_deleted,
                        buffer.model_name, buffer.profile, buffer.partition, buffer.source_id, buffer.conflicting_serialized_data, buffer._self_ref_fk
-                FROM {buffer} as buffer
-                WHERE buffer.transfer_session_id = '{transfer_session_id}'
+                FROM {buffer} as buffer, {actions} as actions
+                WHERE actions.model_uuid = buffer.model_uuid
+                AND actions.action = {fast_forward}
+                AND buffer.transfer_session_id = '{transfer_session_id}'
             ),
             updated as
             (
@@ -195,19 +261,27 @@ class SQLWrapper(BaseSQLWrapper):
         """.format(
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
+            actions=ACTIONS_TABLE,
+            fast_forward=FAST_FORWARD,
             transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_buffer)
+        cursor.execute(insert_fast_forward_buffer)
 
-    def _dequeuing_insert_remaining_rmcb(self, cursor, transfersession_id):
-        # insert remaining records into rmc
-        insert_remaining_rmcb = """
+    def _dequeuing_insert_rmcb(self, cursor, transfersession_id):
+        # insert rmcbs of fast-forwards into rmc, and of merge conflicts where greater than the rmc
+        insert_rmcb = """
                 WITH new_values as
             (
                 SELECT rmcb.instance_id rmcb_instance_id, rmcb.counter, rmcb.model_uuid
                 FROM {rmcb} as rmcb
+                INNER JOIN {actions} as actions ON actions.model_uuid = rmcb.model_uuid
+                LEFT OUTER JOIN {rmc} as rmc ON rmc.store_model_id = rmcb.model_uuid
+                                            AND rmc.instance_id = rmcb.instance_id
                 WHERE rmcb.transfer_session_id = '{transfer_session_id}'
+                AND (actions.action = {fast_forward}
+                     OR (actions.action = {merge_conflict}
+                         AND (rmc.counter IS NULL OR rmcb.counter > rmc.counter)))
             ),
             updated as
             (
@@ -225,7 +299,10 @@ class SQLWrapper(BaseSQLWrapper):
             """.format(
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
+            actions=ACTIONS_TABLE,
+            fast_forward=FAST_FORWARD,
+            merge_conflict=MERGE_CONFLICT,
             transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_rmcb)
+        cursor.execute(insert_rmcb)
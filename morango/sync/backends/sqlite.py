@@ -1,11 +1,30 @@
+from django.db import connection
+from django.db.models import Q
+from django.utils import six
+
+from .base import ACTIONS_TABLE
 from .base import BaseSQLWrapper
+from .base import FAST_FORWARD
+from .base import MERGE_CONFLICT
 from .utils import calculate_max_sqlite_variables
 from morango.models.core import Buffer
+from morango.models.core import DatabaseMaxCounter
 from morango.models.core import RecordMaxCounter
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
 
 
+def _prefix_upper_bound(prefix):
+    """
+    Returns the smallest string greater than all strings starting with `prefix`, or None if there
+    isn't one
+    """
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10FFFF:
+            return prefix[:i] + six.unichr(ord(prefix[i]) + 1)
+    return None
+
+
 class SQLWrapper(BaseSQLWrapper):
     backend = "sqlite"
 
@@ -18,7 +37,7 @@ class SQLWrapper(BaseSQLWrapper):
         where values=[1,2,3,4,5,6,7,8,9]
         """
         # calculate and create equal sized chunks of data to insert incrementally
-        num_of_rows_able_to_insert = calculate_max_sqlite_variables() // len(fields)
+        num_of_rows_able_to_insert = self._max_query_params() // len(fields)
         num_of_values_able_to_insert = num_of_rows_able_to_insert * len(fields)
         value_chunks = [
             db_values[x : x + num_of_values_able_to_insert]
@@ -40,32 +59,114 @@ class SQLWrapper(BaseSQLWrapper):
             # use DB-APIs parameter substitution (2nd parameter expects a sequence)
             cursor.execute(insert, values)
 
-    def _dequeuing_merge_conflict_rmcb(self, cursor, transfersession_id):
-        # transfer record max counters for records with merge conflicts + perform max
-        merge_conflict_rmc = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
-                                    SELECT rmcb.instance_id, rmcb.counter, rmcb.model_uuid
-                                    FROM {rmcb} AS rmcb, {store} AS store, {rmc} AS rmc, {buffer} AS buffer
-                                    /*Scope to a single record.*/
-                                    WHERE store.id = rmcb.model_uuid
-                                    AND store.id = rmc.store_model_id
-                                    AND store.id = buffer.model_uuid
-                                    /*Where buffer rmc is greater than store rmc*/
-                                    AND rmcb.instance_id = rmc.instance_id
-                                    AND rmcb.counter > rmc.counter
-                                    AND rmcb.transfer_session_id = '{transfer_session_id}'
-                                    /*Exclude fast-forwards*/
-                                    AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                                                  AND store.last_saved_instance = rmcb2.instance_id
-                                                                                  AND store.last_saved_counter <= rmcb2.counter
-                                                                                  AND rmcb2.transfer_session_id = '{transfer_session_id}')
-                               """.format(
-            buffer=Buffer._meta.db_table,
-            store=Store._meta.db_table,
-            rmc=RecordMaxCounter._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
-            transfer_session_id=transfersession_id,
+    def _prefix_filter(self, field_name, prefix):
+        """
+        SQLite can't use indexes for LIKE since it's case insensitive, so prefixes are matched with
+        an equivalent range instead
+        """
+        upper_bound = _prefix_upper_bound(prefix)
+        condition = Q(**{"{}__gte".format(field_name): prefix})
+        if upper_bound is not None:
+            condition &= Q(**{"{}__lt".format(field_name): upper_bound})
+        return condition
+
+    def _prefix_condition(self, column, prefix):
+        upper_bound = _prefix_upper_bound(prefix)
+        if upper_bound is None:
+            return "{} >= %s".format(column), [prefix]
+        return "({column} >= %s AND {column} < %s)".format(column=column), [
+            prefix,
+            upper_bound,
+        ]
+
+    def _max_query_params(self):
+        return calculate_max_sqlite_variables()
+
+    def _bulk_update_store_records(self, cursor, store_models):
+        """
+        Since REPLACE deletes and re-inserts the row, all concrete fields of the store models
+        are written, not only those modified during serialization
+        """
+        fields = Store._meta.concrete_fields
+        db_values, placeholder_list = self._prepare_bulk_values(
+            connection, fields, store_models
+        )
+        self._bulk_insert_into_app_models(
+            cursor, Store._meta.db_table, fields, db_values, placeholder_list
+        )
+
+    def _bulk_upsert_rmcs(self, cursor, current_id, store_model_ids):
+        """
+        Example query:
+        `REPLACE INTO rmc (instance_id, counter, store_model_id) VALUES ('abc', 2, %s), ('abc', 2, %s)`
+        where values=[store_model_id_1, store_model_id_2]
+        """
+        chunk_size = self._max_query_params()
+        for i in range(0, len(store_model_ids), chunk_size):
+            chunk = store_model_ids[i : i + chunk_size]
+            placeholder_str = ", ".join(
+                [
+                    "('{current_instance_id}', {current_instance_counter}, %s)".format(
+                        current_instance_id=current_id.id,
+                        current_instance_counter=current_id.counter,
+                    )
+                    for _ in chunk
+                ]
+            )
+            upsert = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
+                        VALUES {placeholder_str}
+            """.format(
+                rmc=RecordMaxCounter._meta.db_table, placeholder_str=placeholder_str
+            )
+            cursor.execute(upsert, chunk)
+
+    def _bulk_upsert_dmcs(self, cursor, counters):
+        """
+        Example query:
+        `WITH new_values (instance_id, partition, counter) AS (VALUES (%s, %s, %s))
+        REPLACE INTO dmc (instance_id, partition, counter) SELECT ... MAX(dmc.counter, nv.counter)`
+        """
+        chunk_size = calculate_max_sqlite_variables() // 3
+        for i in range(0, len(counters), chunk_size):
+            chunk = counters[i : i + chunk_size]
+            upsert = """
+                WITH new_values (instance_id, partition, counter) AS
+                (
+                    VALUES {placeholder_str}
+                )
+                REPLACE INTO {dmc} (instance_id, partition, counter)
+                SELECT nv.instance_id, nv.partition, MAX(nv.counter, COALESCE(dmc.counter, nv.counter))
+                FROM new_values AS nv
+                LEFT OUTER JOIN {dmc} AS dmc ON dmc.instance_id = nv.instance_id
+                                            AND dmc.partition = nv.partition
+            """.format(
+                dmc=DatabaseMaxCounter._meta.db_table,
+                placeholder_str=", ".join(["(%s, %s, %s)" for _ in chunk]),
+            )
+            cursor.execute(upsert, [value for counter in chunk for value in counter])
+
+    def _create_syncable_model_indexes(self, cursor, connection, model):
+        """
+        SQLite's LIKE is case insensitive so can't use a plain index for prefix matching, therefore
+        the partition index is meant to support range comparisons, and the dirty bit index covers
+        the primary key so that paging through dirty records by primary key doesn't touch the table
+        """
+        dirty_index, partition_index = self._get_syncable_model_index_names(
+            connection, model
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS {index} ON {table} (_morango_dirty_bit, {pk})".format(
+                index=connection.ops.quote_name(dirty_index),
+                table=connection.ops.quote_name(model._meta.db_table),
+                pk=connection.ops.quote_name(model._meta.pk.column),
+            )
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS {index} ON {table} (_morango_partition)".format(
+                index=connection.ops.quote_name(partition_index),
+                table=connection.ops.quote_name(model._meta.db_table),
+            )
         )
-        cursor.execute(merge_conflict_rmc)
 
     def _dequeuing_merge_conflict_buffer(self, cursor, current_id, transfersession_id):
         # transfer buffer serialized into conflicting store
@@ -75,20 +176,17 @@ class SQLWrapper(BaseSQLWrapper):
                                                    {current_instance_counter}, store.hard_deleted OR buffer.hard_deleted, store.model_name, store.profile, store.partition, store.source_id,
                                                    CASE buffer.hard_deleted WHEN 1 THEN '' ELSE buffer.serialized || '\n' || store.conflicting_serialized_data END, 1, store._self_ref_fk,
                                                    '', '{transfer_session_id}'
-                                            FROM {buffer} AS buffer, {store} AS store
+                                            FROM {buffer} AS buffer, {store} AS store, {actions} AS actions
                                             /*Scope to a single record.*/
                                             WHERE store.id = buffer.model_uuid
+                                            AND actions.model_uuid = buffer.model_uuid
+                                            AND actions.action = {merge_conflict}
                                             AND buffer.transfer_session_id = '{transfer_session_id}'
-                                            /*Exclude fast-forwards*/
-                                            AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                                                          AND store.last_saved_instance = rmcb2.instance_id
-                                                                                          AND store.last_saved_counter <= rmcb2.counter
-                                                                                          AND rmcb2.transfer_session_id = '{transfer_session_id}')
                                       """.format(
             buffer=Buffer._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
             store=Store._meta.db_table,
-            rmc=RecordMaxCounter._meta.db_table,
+            actions=ACTIONS_TABLE,
+            merge_conflict=MERGE_CONFLICT,
             transfer_session_id=transfersession_id,
             current_instance_id=current_id.id,
             current_instance_counter=current_id.counter,
@@ -100,54 +198,58 @@ class SQLWrapper(BaseSQLWrapper):
     ):
         # update or create rmc for merge conflicts with local instance id
         merge_conflict_store = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
-                                SELECT '{current_instance_id}', {current_instance_counter}, store.id
-                                FROM {store} as store, {buffer} as buffer
-                                /*Scope to a single record.*/
-                                WHERE store.id = buffer.model_uuid
-                                AND buffer.transfer_session_id = '{transfer_session_id}'
-                                /*Exclude fast-forwards*/
-                                AND NOT EXISTS (SELECT 1 FROM {rmcb} AS rmcb2 WHERE store.id = rmcb2.model_uuid
-                                                                              AND store.last_saved_instance = rmcb2.instance_id
-                                                                              AND store.last_saved_counter <= rmcb2.counter
-                                                                              AND rmcb2.transfer_session_id = '{transfer_session_id}')
+                                SELECT '{current_instance_id}', {current_instance_counter}, actions.model_uuid
+                                FROM {actions} AS actions
+                                WHERE actions.action = {merge_conflict}
                                       """.format(
-            buffer=Buffer._meta.db_table,
-            rmcb=RecordMaxCounterBuffer._meta.db_table,
-            store=Store._meta.db_table,
             rmc=RecordMaxCounter._meta.db_table,
-            transfer_session_id=transfersession_id,
+            actions=ACTIONS_TABLE,
+            merge_conflict=MERGE_CONFLICT,
             current_instance_id=current_id.id,
             current_instance_counter=current_id.counter,
         )
         cursor.execute(merge_conflict_store)
 
-    def _dequeuing_insert_remaining_buffer(self, cursor, transfersession_id):
-        # insert remaining records into store
-        insert_remaining_buffer = """REPLACE INTO {store} (id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile, partition,
-                                                           source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
+    def _dequeuing_insert_fast_forward_buffer(self, cursor, transfersession_id):
+        # insert new and fast-forwarded records into store
+        insert_fast_forward_buffer = """REPLACE INTO {store} (id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile, partition,
+                                                              source_id, conflicting_serialized_data, dirty_bit, _self_ref_fk, deserialization_error, last_transfer_session_id)
                                     SELECT buffer.model_uuid, buffer.serialized, buffer.deleted, buffer.last_saved_instance, buffer.last_saved_counter, buffer.hard_deleted,
                                            buffer.model_name, buffer.profile, buffer.partition, buffer.source_id, buffer.conflicting_serialized_data, 1,
                                            buffer._self_ref_fk, '', '{transfer_session_id}'
-                                    FROM {buffer} AS buffer
-                                    WHERE buffer.transfer_session_id = '{transfer_session_id}'
+                                    FROM {buffer} AS buffer, {actions} AS actions
+                                    WHERE actions.model_uuid = buffer.model_uuid
+                                    AND actions.action = {fast_forward}
+                                    AND buffer.transfer_session_id = '{transfer_session_id}'
                            """.format(
             buffer=Buffer._meta.db_table,
             store=Store._meta.db_table,
+            actions=ACTIONS_TABLE,
+            fast_forward=FAST_FORWARD,
             transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_buffer)
+        cursor.execute(insert_fast_forward_buffer)
 
-    def _dequeuing_insert_remaining_rmcb(self, cursor, transfersession_id):
-        # insert remaining records into rmc
-        insert_remaining_rmcb = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
-                                    SELECT rmcb.instance_id, rmcb.counter, rmcb.model_uuid
-                                    FROM {rmcb} AS rmcb
-                                    WHERE rmcb.transfer_session_id = '{transfer_session_id}'
-                           """.format(
+    def _dequeuing_insert_rmcb(self, cursor, transfersession_id):
+        # insert rmcbs of fast-forwards into rmc, and of merge conflicts where greater than the rmc
+        insert_rmcb = """REPLACE INTO {rmc} (instance_id, counter, store_model_id)
+                         SELECT rmcb.instance_id, rmcb.counter, rmcb.model_uuid
+                         FROM {rmcb} AS rmcb
+                         INNER JOIN {actions} AS actions ON actions.model_uuid = rmcb.model_uuid
+                         LEFT OUTER JOIN {rmc} AS rmc ON rmc.store_model_id = rmcb.model_uuid
+                                                     AND rmc.instance_id = rmcb.instance_id
+                         WHERE rmcb.transfer_session_id = '{transfer_session_id}'
+                         AND (actions.action = {fast_forward}
+                              OR (actions.action = {merge_conflict}
+                                  AND (rmc.counter IS NULL OR rmcb.counter > rmc.counter)))
+                      """.format(
             rmc=RecordMaxCounter._meta.db_table,
             rmcb=RecordMaxCounterBuffer._meta.db_table,
+            actions=ACTIONS_TABLE,
+            fast_forward=FAST_FORWARD,
+            merge_conflict=MERGE_CONFLICT,
             transfer_session_id=transfersession_id,
         )
 
-        cursor.execute(insert_remaining_rmcb)
+        cursor.execute(insert_rmcb)
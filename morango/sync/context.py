@@ -279,7 +279,7 @@ class NetworkSessionContext(SessionContext):
     Class that holds the context for operating on a transfer remotely through network connection
     """
 
-    __slots__ = ("connection", "_stage", "_stage_status")
+    __slots__ = ("connection", "push_cursor", "_stage", "_stage_status")
 
     def __init__(self, connection, **kwargs):
         """
@@ -288,6 +288,8 @@ class NetworkSessionContext(SessionContext):
         :type connection: NetworkSyncConnection
         """
         self.connection = connection
+        # tracks the last pushed buffer, as (transfer session ID, records transferred, pk)
+        self.push_cursor = None
         super(NetworkSessionContext, self).__init__(
             capabilities=self.connection.server_info.get("capabilities", []), **kwargs
         )
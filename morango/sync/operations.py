@@ -1,7 +1,9 @@
 import functools
 import json
 import logging
+import time
 import uuid
+from multiprocessing.pool import ThreadPool
 
 from django.core import exceptions
 from django.core.serializers.json import DjangoJSONEncoder
@@ -9,20 +11,29 @@ from django.db import connection
 from django.db import connections
 from django.db import router
 from django.db import transaction
+from django.db.models import Case
+from django.db.models import Max
 from django.db.models import Q
 from django.db.models import signals
+from django.db.models import TextField
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.fields.related import ForeignKey
 from django.utils import six
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
+from morango.api import compact
 from morango.api.serializers import BufferSerializer
 from morango.constants.capabilities import ASYNC_OPERATIONS
+from morango.constants.capabilities import KEYSET_BUFFER_PAGINATION
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.errors import MorangoResumeSyncError
-from morango.errors import MorangoLimitExceeded
 from morango.models.certificates import Filter
 from morango.models.core import Buffer
+from morango.models.core import ChangeLog
+from morango.models.core import ChangeLogProfile
 from morango.models.core import DatabaseMaxCounter
 from morango.models.core import DeletedModels
 from morango.models.core import HardDeletedModels
@@ -38,6 +49,7 @@ from morango.sync.context import NetworkSessionContext
 from morango.sync.utils import mute_signals
 from morango.sync.utils import validate_and_create_buffer_data
 from morango.utils import _assert
+from morango.utils import LRUCache
 from morango.utils import SETTINGS
 
 
@@ -56,7 +68,9 @@ if "postgresql" in transaction.get_connection(USING_DB).vendor:
             which copies all the configuration settings of the `default` db connection",
     )
 
-SQL_UNION_MAX = 500
+DESERIALIZATION_CHUNK_SIZE = 500
+# each error takes 3 query parameters, so this keeps under sqlite variable limits
+DESERIALIZATION_ERROR_CHUNK_SIZE = 300
 
 
 class OperationLogger(object):
@@ -74,11 +88,6 @@ class OperationLogger(object):
             logger.info("Error: {}".format(self.start_msg))
 
 
-def _join_with_logical_operator(lst, operator):
-    op = ") {operator} (".format(operator=operator)
-    return "(({items}))".format(items=op.join(lst))
-
-
 def _self_referential_fk(model):
     """
     Return whether this model has a self ref FK, and the name for the field
@@ -106,6 +115,86 @@ def _fsic_queuing_calc(fsic1, fsic2):
     }
 
 
+def _serialize_batch_into_store(model, app_models, store_records_dict, current_id):
+    """
+    Serializes a batch of dirty app models of a single class into the store, bulk updating the
+    existing store records passed in ``store_records_dict`` and bulk creating the missing ones.
+    """
+    new_store_records = []
+    new_rmc_records = []
+    updated_store_records = []
+    for app_model in app_models:
+        try:
+            store_model = store_records_dict[app_model.id]
+
+            # if store record dirty and app record dirty, append store serialized to conflicting data
+            if store_model.dirty_bit:
+                store_model.conflicting_serialized_data = (
+                    store_model.serialized
+                    + "\n"
+                    + store_model.conflicting_serialized_data
+                )
+                store_model.dirty_bit = False
+
+            # set new serialized data on this store model
+            ser_dict = json.loads(store_model.serialized)
+            ser_dict.update(app_model.serialize())
+            store_model.serialized = DjangoJSONEncoder().encode(ser_dict)
+
+            # update last saved bys for this store model
+            store_model.last_saved_instance = current_id.id
+            store_model.last_saved_counter = current_id.counter
+            # update deleted flags in case it was previously deleted
+            store_model.deleted = False
+            store_model.hard_deleted = False
+            # clear last_transfer_session_id
+            store_model.last_transfer_session_id = None
+
+            # append to list of store models to be bulk updated for this class
+            updated_store_records.append(store_model)
+
+        except KeyError:
+            kwargs = {
+                "id": app_model.id,
+                "serialized": DjangoJSONEncoder().encode(app_model.serialize()),
+                "last_saved_instance": current_id.id,
+                "last_saved_counter": current_id.counter,
+                "model_name": app_model.morango_model_name,
+                "profile": app_model.morango_profile,
+                "partition": app_model._morango_partition,
+                "source_id": app_model._morango_source_id,
+            }
+            # check if model has FK pointing to it and add the value to a field on the store
+            self_ref_fk = _self_referential_fk(model)
+            if self_ref_fk:
+                self_ref_fk_value = getattr(app_model, self_ref_fk)
+                kwargs.update({"_self_ref_fk": self_ref_fk_value or ""})
+            # create store model and record max counter for the app model
+            new_store_records.append(Store(**kwargs))
+            new_rmc_records.append(
+                RecordMaxCounter(
+                    store_model_id=app_model.id,
+                    instance_id=current_id.id,
+                    counter=current_id.counter,
+                )
+            )
+
+    # bulk update existing store records, and create or update their record max
+    # counters for our instance id
+    if updated_store_records:
+        with connection.cursor() as cursor:
+            DBBackend._bulk_update_store_records(cursor, updated_store_records)
+            DBBackend._bulk_upsert_rmcs(
+                cursor,
+                current_id,
+                [store_model.id for store_model in updated_store_records],
+            )
+
+    # bulk create store and rmc records for this class
+    Store.objects.bulk_create(new_store_records)
+    RecordMaxCounter.objects.bulk_create(new_rmc_records)
+
+
 def _serialize_into_store(profile, filter=None):
     """
     Takes data from app layer and serializes the models into the store.
@@ -116,99 +205,83 @@ def _serialize_into_store(profile, filter=None):
     the latest changes from the model's fields. We also update the counter's based on this device's current Instance ID.
     2. If there is no store record for this app model, we proceed to create an in memory store model and append to a list to be
     bulk created on a per class model basis.
+
+    If `MORANGO_ENABLE_CHANGE_LOG` is set, only the dirty app models recorded in the ``ChangeLog`` are considered,
+    after seeding the log from the dirty bits the first time it's used for the profile.
+    Dirty app models are paged through by primary key, in batches of `MORANGO_SERIALIZE_BATCH_SIZE`, and each
+    batch is committed in its own transaction so memory usage doesn't grow with the number of dirty records.
     """
     # ensure that we write and retrieve the counter in one go for consistency
     current_id = InstanceIDModel.get_current_instance_and_increment_counter()
+    batch_size = SETTINGS.MORANGO_SERIALIZE_BATCH_SIZE
 
-    with transaction.atomic(using=USING_DB):
-        # create Q objects for filtering by prefixes
-        prefix_condition = None
-        if filter:
-            prefix_condition = functools.reduce(
-                lambda x, y: x | y,
-                [Q(_morango_partition__startswith=prefix) for prefix in filter],
-            )
+    # create Q objects for filtering by prefixes
+    prefix_condition = None
+    if filter:
+        prefix_condition = functools.reduce(
+            lambda x, y: x | y,
+            [
+                DBBackend._prefix_filter("_morango_partition", prefix)
+                for prefix in filter
+            ],
+        )
 
-        # filter through all models with the dirty bit turned on
-        for model in syncable_models.get_models(profile):
-            new_store_records = []
-            new_rmc_records = []
-            klass_queryset = model.objects.filter(_morango_dirty_bit=True)
-            if prefix_condition:
-                klass_queryset = klass_queryset.filter(prefix_condition)
-            store_records_dict = Store.objects.in_bulk(
-                id_list=klass_queryset.values_list("id", flat=True)
+    # if capturing changes, only consider changes logged up to this point
+    use_change_log = SETTINGS.MORANGO_ENABLE_CHANGE_LOG
+    if use_change_log:
+        ChangeLog.seed(profile)
+        change_log = ChangeLog.objects.filter(profile=profile)
+        change_log_cursor = change_log.aggregate(Max("id"))["id__max"] or 0
+    else:
+        # changes aren't logged while disabled, so the log has to be seeded again once re-enabled
+        ChangeLogProfile.objects.filter(profile=profile).delete()
+
+    # filter through all models with the dirty bit turned on
+    for model in syncable_models.get_models(profile):
+        klass_queryset = model.objects.filter(_morango_dirty_bit=True)
+        if prefix_condition:
+            klass_queryset = klass_queryset.filter(prefix_condition)
+        if use_change_log:
+            # look up the logged app models by primary key, rather than scanning the whole table
+            klass_changes = change_log.filter(
+                model_name=model.morango_model_name, id__lte=change_log_cursor
             )
-            for app_model in klass_queryset:
-                try:
-                    store_model = store_records_dict[app_model.id]
-
-                    # if store record dirty and app record dirty, append store serialized to conflicting data
-                    if store_model.dirty_bit:
-                        store_model.conflicting_serialized_data = (
-                            store_model.serialized
-                            + "\n"
-                            + store_model.conflicting_serialized_data
-                        )
-                        store_model.dirty_bit = False
-
-                    # set new serialized data on this store model
-                    ser_dict = json.loads(store_model.serialized)
-                    ser_dict.update(app_model.serialize())
-                    store_model.serialized = DjangoJSONEncoder().encode(ser_dict)
-
-                    # create or update instance and counter on the record max counter for this store model
-                    RecordMaxCounter.objects.update_or_create(
-                        defaults={"counter": current_id.counter},
-                        instance_id=current_id.id,
-                        store_model_id=store_model.id,
-                    )
+            klass_queryset = klass_queryset.filter(
+                pk__in=klass_changes.values("model_uuid")
+            )
+        klass_queryset = klass_queryset.order_by("pk")
+
+        last_pk = None
+        while True:
+            page_queryset = klass_queryset
+            if last_pk is not None:
+                page_queryset = page_queryset.filter(pk__gt=last_pk)
+            page_pks = list(page_queryset.values_list("pk", flat=True)[:batch_size])
+            if not page_pks:
+                break
+            last_pk = page_pks[-1]
+            batch_queryset = page_queryset.filter(pk__lte=last_pk)
+
+            with transaction.atomic(using=USING_DB):
+                store_records_dict = Store.objects.in_bulk(id_list=page_pks)
+                _serialize_batch_into_store(
+                    model, batch_queryset.iterator(), store_records_dict, current_id
+                )
 
-                    # update last saved bys for this store model
-                    store_model.last_saved_instance = current_id.id
-                    store_model.last_saved_counter = current_id.counter
-                    # update deleted flags in case it was previously deleted
-                    store_model.deleted = False
-                    store_model.hard_deleted = False
-                    # clear last_transfer_session_id
-                    store_model.last_transfer_session_id = None
-
-                    # update this model
-                    store_model.save()
-
-                except KeyError:
-                    kwargs = {
-                        "id": app_model.id,
-                        "serialized": DjangoJSONEncoder().encode(app_model.serialize()),
-                        "last_saved_instance": current_id.id,
-                        "last_saved_counter": current_id.counter,
-                        "model_name": app_model.morango_model_name,
-                        "profile": app_model.morango_profile,
-                        "partition": app_model._morango_partition,
-                        "source_id": app_model._morango_source_id,
-                    }
-                    # check if model has FK pointing to it and add the value to a field on the store
-                    self_ref_fk = _self_referential_fk(model)
-                    if self_ref_fk:
-                        self_ref_fk_value = getattr(app_model, self_ref_fk)
-                        kwargs.update({"_self_ref_fk": self_ref_fk_value or ""})
-                    # create store model and record max counter for the app model
-                    new_store_records.append(Store(**kwargs))
-                    new_rmc_records.append(
-                        RecordMaxCounter(
-                            store_model_id=app_model.id,
-                            instance_id=current_id.id,
-                            counter=current_id.counter,
-                        )
-                    )
+                # set dirty bit to false for all instances of this model in the batch
+                batch_queryset.update(update_dirty_bit_to=False)
+
+                if use_change_log:
+                    klass_changes.filter(model_uuid__in=page_pks).delete()
 
-            # bulk create store and rmc records for this class
-            Store.objects.bulk_create(new_store_records)
-            RecordMaxCounter.objects.bulk_create(new_rmc_records)
+            if len(page_pks) < batch_size:
+                break
 
-            # set dirty bit to false for all instances of this model
-            klass_queryset.update(update_dirty_bit_to=False)
+    # without a filter, all remaining logged changes were for app models that are no longer dirty
+    if use_change_log and not filter:
+        change_log.filter(id__lte=change_log_cursor).delete()
 
+    with transaction.atomic(using=USING_DB):
         # get list of ids of deleted models
         deleted_ids = DeletedModels.objects.filter(profile=profile).values_list(
             "id", flat=True
@@ -254,19 +327,233 @@ def _serialize_into_store(profile, filter=None):
         HardDeletedModels.objects.filter(profile=profile).delete()
 
         # update our own database max counters after serialization
-        if not filter:
-            DatabaseMaxCounter.objects.update_or_create(
-                instance_id=current_id.id,
-                partition="",
-                defaults={"counter": current_id.counter},
+        DatabaseMaxCounter.update_counters(
+            {(current_id.id, f): current_id.counter for f in filter or [""]}
+        )
+
+
+def _deserialize_model_from_store(
+    model, profile, fk_cache, skip_erroring=False, filter=None
+):
+    """
+    Integrates the dirty store records for a single syncable model into the application. See
+    `_deserialize_from_store` for the algorithm.
+    """
+    store_models = Store.objects.filter(profile=profile)
+
+    model_condition = Q(model_name=model.morango_model_name)
+    for klass in model.morango_model_dependencies:
+        model_condition |= Q(model_name=klass.morango_model_name)
+
+    store_models = store_models.filter(model_condition)
+
+    if filter:
+        # create Q objects for filtering by prefixes
+        prefix_condition = functools.reduce(
+            lambda x, y: x | y,
+            [DBBackend._prefix_filter("partition", prefix) for prefix in filter],
+        )
+        store_models = store_models.filter(prefix_condition)
+
+    # if requested, skip any records that previously errored, to be faster
+    if skip_erroring:
+        store_models = store_models.filter(deserialization_error="")
+
+    # handle cases where a class has a single FK reference to itself
+    if _self_referential_fk(model):
+        _deserialize_self_referential_model_from_store(model, store_models, fk_cache)
+
+    else:
+        errors = {}
+        rows = []
+        deserialized_ids = []
+        converter = syncable_models.get_model_converter(model)
+        dirty_store_models = list(store_models.filter(dirty_bit=True))
+        _prefetch_foreign_keys(model, dirty_store_models, fk_cache)
+        for store_model in dirty_store_models:
+            try:
+                row = converter.to_db_values(store_model, fk_cache, connection)
+                # if the model was not deleted add its field values to the list
+                if row is not None:
+                    rows.append(row)
+                deserialized_ids.append(store_model.id)
+            except (
+                exceptions.ValidationError,
+                exceptions.ObjectDoesNotExist,
+            ) as e:
+                # if the app model did not validate, we leave the store dirty bit set
+                errors[store_model.id] = str(e)
+
+        _bulk_insert_into_app_models(model, rows)
+        _bulk_update_deserialization_errors(errors)
+
+        # clear dirty bit for the store records that were deserialized, in chunks rather than
+        # excluding the ones that did not validate, to keep the number of query parameters bounded
+        for i in range(0, len(deserialized_ids), DESERIALIZATION_CHUNK_SIZE):
+            Store.objects.filter(
+                id__in=deserialized_ids[i : i + DESERIALIZATION_CHUNK_SIZE]
+            ).update(dirty_bit=False)
+
+
+def _bulk_update_deserialization_errors(errors):
+    """
+    Saves the deserialization errors, a dict of store record IDs to error messages, with a
+    `CASE` update per chunk of errors
+    """
+    errors = list(six.iteritems(errors))
+    for i in range(0, len(errors), DESERIALIZATION_ERROR_CHUNK_SIZE):
+        chunk = errors[i : i + DESERIALIZATION_ERROR_CHUNK_SIZE]
+        Store.objects.filter(id__in=[store_id for store_id, _ in chunk]).update(
+            deserialization_error=Case(
+                *[When(id=store_id, then=Value(error)) for store_id, error in chunk],
+                output_field=TextField()
+            )
+        )
+
+
+def _prefetch_foreign_keys(model, store_models, fk_cache):
+    """
+    Seeds the FK cache with the foreign key referents of the store records that exist in the app, so
+    validating the records doesn't take a query per referent
+    """
+    if not any(isinstance(f, ForeignKey) for f in model._meta.fields):
+        return
+    model.prefetch_foreign_keys(
+        [
+            json.loads(store_model.serialized)
+            for store_model in store_models
+            if store_model.model_name == model.morango_model_name
+            and not store_model.deleted
+        ],
+        fk_cache,
+    )
+
+
+def _bulk_insert_into_app_models(model, rows):
+    """
+    Inserts or replaces the app model rows, each a list of DB values for `model._meta.fields`,
+    with a single bulk query
+    """
+    if not rows:
+        return
+    fields = model._meta.fields
+    db_values = [value for row in rows for value in row]
+    placeholder_list = [
+        "({})".format(", ".join(["%s"] * len(fields))) for _ in range(len(rows))
+    ]
+    with connection.cursor() as cursor:
+        DBBackend._bulk_insert_into_app_models(
+            cursor, model._meta.db_table, fields, db_values, placeholder_list
+        )
+
+
+def _deserialize_self_referential_model_from_store(model, store_models, fk_cache):
+    """
+    Deserializes the dirty store records of a model with a foreign key to itself, level by level down the tree, so
+    that parents are always integrated before their children. The tree of dirty records is computed from a single
+    query of the store's `_self_ref_fk` values, and each level is then inserted in bulk. MPTT models are saved one by
+    one since their tree fields have to be maintained by MPTT.
+    """
+    all_ids = set()
+    clean_ids = set()
+    dirty_children = {}
+    for store_id, parent_id, dirty_bit in store_models.values_list(
+        "id", "_self_ref_fk", "dirty_bit"
+    ):
+        all_ids.add(store_id)
+        if dirty_bit:
+            dirty_children.setdefault(parent_id, []).append(store_id)
+        else:
+            clean_ids.add(store_id)
+
+    # the first level are dirty records without a parent, or which have a clean parent
+    level = list(dirty_children.pop("", []))
+    for parent_id in clean_ids.intersection(dirty_children):
+        level.extend(dirty_children.pop(parent_id))
+
+    is_mptt_model = hasattr(model, "_internal_mptt_fields_not_to_serialize")
+    converter = syncable_models.get_model_converter(model)
+
+    while level:
+        next_level = []
+        for i in range(0, len(level), DESERIALIZATION_CHUNK_SIZE):
+            chunk = level[i : i + DESERIALIZATION_CHUNK_SIZE]
+            errors = {}
+            rows = []
+            deserialized_ids = []
+            chunk_store_models = list(store_models.filter(id__in=chunk))
+            _prefetch_foreign_keys(model, chunk_store_models, fk_cache)
+            for store_model in chunk_store_models:
+                try:
+                    if is_mptt_model:
+                        app_model = store_model._deserialize_store_model(fk_cache)
+                        if app_model:
+                            with mute_signals(signals.pre_save, signals.post_save):
+                                app_model.save(update_dirty_bit_to=False)
+                    else:
+                        row = converter.to_db_values(store_model, fk_cache, connection)
+                        if row is not None:
+                            rows.append(row)
+                    deserialized_ids.append(store_model.id)
+                except (
+                    exceptions.ValidationError,
+                    exceptions.ObjectDoesNotExist,
+                ) as e:
+                    # if the app model did not validate, we leave the store dirty bit set, but mark the error
+                    errors[store_model.id] = str(e)
+
+            _bulk_insert_into_app_models(model, rows)
+            _bulk_update_deserialization_errors(errors)
+            # we update store models after deserializing them to mark them as clean parents
+            store_models.filter(id__in=deserialized_ids).update(
+                dirty_bit=False, deserialization_error=""
             )
+            for store_id in deserialized_ids:
+                next_level.extend(dirty_children.pop(store_id, []))
+        level = next_level
+
+    # A. Mark records that were skipped due to missing parents with error info
+    errors = {}
+    for parent_id, store_ids in six.iteritems(dirty_children):
+        if parent_id in all_ids:
+            # A(i). The ones that have a parent Store entry but it's dirty
+            error = "Parent is dirty; could not deserialize."
         else:
-            for f in filter:
-                DatabaseMaxCounter.objects.update_or_create(
-                    instance_id=current_id.id,
-                    partition=f,
-                    defaults={"counter": current_id.counter},
-                )
+            # A(ii). The ones that don't even have Store entries for parent at all
+            error = "Parent does not exist in Store; could not deserialize."
+        errors.update((store_id, error) for store_id in store_ids)
+    _bulk_update_deserialization_errors(errors)
+
+
+def _deserialize_level_in_parallel(level, profile, fk_cache, pool, **kwargs):
+    """
+    Deserializes the models of a single dependency level concurrently, each within its own
+    transaction on the worker thread's own database connections. MPTT models are saved with
+    signals muted, which is process global, so they are deserialized serially on the calling
+    thread once the workers are done. Returns once all models have been deserialized, so it
+    acts as a barrier between levels.
+    """
+    mptt_models = []
+    parallel_models = []
+    for model in level:
+        if hasattr(model, "_internal_mptt_fields_not_to_serialize"):
+            mptt_models.append(model)
+        else:
+            parallel_models.append(model)
+
+    def deserialize_model(model):
+        try:
+            with transaction.atomic(using=USING_DB):
+                _deserialize_model_from_store(model, profile, fk_cache, **kwargs)
+        finally:
+            # database connections are thread local, so clean up the ones used by this worker
+            connections.close_all()
+
+    pool.map(deserialize_model, parallel_models)
+
+    for model in mptt_models:
+        with transaction.atomic(using=USING_DB):
+            _deserialize_model_from_store(model, profile, fk_cache, **kwargs)
 
 
 def _deserialize_from_store(profile, skip_erroring=False, filter=None):
@@ -279,132 +566,50 @@ def _deserialize_from_store(profile, skip_erroring=False, filter=None):
     2. On a per app model basis, we append the field values to a single list, and do a single bulk insert/replace query.
 
     If a model fails to deserialize/validate, we exclude it from being marked as clean in the store.
-    """
-
-    fk_cache = {}
-    with transaction.atomic(using=USING_DB):
-        excluded_list = []
-        # iterate through classes which are in foreign key dependency order
-        for model in syncable_models.get_models(profile):
 
-            store_models = Store.objects.filter(profile=profile)
-
-            model_condition = Q(model_name=model.morango_model_name)
-            for klass in model.morango_model_dependencies:
-                model_condition |= Q(model_name=klass.morango_model_name)
-
-            store_models = store_models.filter(model_condition)
-
-            if filter:
-                # create Q objects for filtering by prefixes
-                prefix_condition = functools.reduce(
-                    lambda x, y: x | y,
-                    [Q(partition__startswith=prefix) for prefix in filter],
-                )
-                store_models = store_models.filter(prefix_condition)
-
-            # if requested, skip any records that previously errored, to be faster
-            if skip_erroring:
-                store_models = store_models.filter(deserialization_error="")
-
-            # handle cases where a class has a single FK reference to itself
-            if _self_referential_fk(model):
-                clean_parents = store_models.filter(dirty_bit=False).char_ids_list()
-                dirty_children = (
-                    store_models.filter(dirty_bit=True)
-                    # handle parents or if the model has no parent
-                    .filter(Q(_self_ref_fk__in=clean_parents) | Q(_self_ref_fk=""))
-                )
+    When `MORANGO_DESERIALIZE_WORKERS` is greater than 1 on Postgres, models are instead grouped into
+    dependency levels and the models of each level are deserialized concurrently, with each model committed
+    in its own transaction before moving on to the next level.
+    """
 
-                # keep iterating until size of dirty_children is 0
-                while len(dirty_children) > 0:
-                    for store_model in dirty_children:
-                        try:
-                            app_model = store_model._deserialize_store_model(fk_cache)
-                            if app_model:
-                                with mute_signals(signals.pre_save, signals.post_save):
-                                    app_model.save(update_dirty_bit_to=False)
-                            # we update a store model after we have deserialized it to be able to mark it as a clean parent
-                            store_model.dirty_bit = False
-                            store_model.deserialization_error = ""
-                            store_model.save(
-                                update_fields=["dirty_bit", "deserialization_error"]
-                            )
-                        except (
-                            exceptions.ValidationError,
-                            exceptions.ObjectDoesNotExist,
-                        ) as e:
-                            excluded_list.append(store_model.id)
-                            # if the app model did not validate, we leave the store dirty bit set, but mark the error
-                            store_model.deserialization_error = str(e)
-                            store_model.save(update_fields=["deserialization_error"])
-
-                    # update lists with new clean parents and dirty children
-                    clean_parents = store_models.filter(dirty_bit=False).char_ids_list()
-                    dirty_children = store_models.filter(
-                        dirty_bit=True, _self_ref_fk__in=clean_parents
-                    ).exclude(id__in=excluded_list)
-
-                # A. Mark records that were skipped due to missing parents with error info
-                # A(i). The ones that have a parent Store entry but it's dirty
-                dirty_parents = store_models.filter(dirty_bit=True).char_ids_list()
-                store_models.filter(
-                    dirty_bit=True, _self_ref_fk__in=dirty_parents
-                ).exclude(id__in=excluded_list).update(
-                    deserialization_error="Parent is dirty; could not deserialize."
+    fk_cache = LRUCache(SETTINGS.MORANGO_DESERIALIZE_FK_CACHE_SIZE)
+    workers = SETTINGS.MORANGO_DESERIALIZE_WORKERS
+    db_connection = transaction.get_connection(USING_DB)
+
+    # sqlite doesn't allow concurrent writes, and the work of separate connections couldn't be
+    # rolled back with an outer transaction
+    if (
+        workers > 1
+        and "postgresql" in db_connection.vendor
+        and not db_connection.in_atomic_block
+    ):
+        pool = ThreadPool(workers)
+        try:
+            for level in syncable_models.get_model_levels(profile):
+                _deserialize_level_in_parallel(
+                    level,
+                    profile,
+                    fk_cache,
+                    pool,
+                    skip_erroring=skip_erroring,
+                    filter=filter,
                 )
-                # A(ii). The ones that don't even have Store entries for parent at all
-                all_parents = store_models.char_ids_list()
-                store_models.filter(dirty_bit=True).exclude(
-                    _self_ref_fk__in=all_parents
-                ).exclude(id__in=excluded_list).update(
-                    deserialization_error="Parent does not exist in Store; could not deserialize."
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        with transaction.atomic(using=USING_DB):
+            # iterate through classes which are in foreign key dependency order
+            for model in syncable_models.get_models(profile):
+                _deserialize_model_from_store(
+                    model, profile, fk_cache, skip_erroring=skip_erroring, filter=filter
                 )
 
-            else:
-                # array for holding db values from the fields of each model for this class
-                db_values = []
-                fields = model._meta.fields
-                for store_model in store_models.filter(dirty_bit=True):
-                    try:
-                        app_model = store_model._deserialize_store_model(fk_cache)
-                        # if the model was not deleted add its field values to the list
-                        if app_model:
-                            for f in fields:
-                                value = getattr(app_model, f.attname)
-                                db_value = f.get_db_prep_value(value, connection)
-                                db_values.append(db_value)
-                    except (
-                        exceptions.ValidationError,
-                        exceptions.ObjectDoesNotExist,
-                    ) as e:
-                        # if the app model did not validate, we leave the store dirty bit set
-                        excluded_list.append(store_model.id)
-                        store_model.deserialization_error = str(e)
-                        store_model.save(update_fields=["deserialization_error"])
-
-                if db_values:
-                    # number of rows to update
-                    num_of_rows = len(db_values) // len(fields)
-                    # create '%s' placeholders for a single row
-                    placeholder_tuple = tuple(["%s" for _ in range(len(fields))])
-                    # create list of the '%s' tuple placeholders based on number of rows to update
-                    placeholder_list = [
-                        str(placeholder_tuple) for _ in range(num_of_rows)
-                    ]
-                    with connection.cursor() as cursor:
-                        DBBackend._bulk_insert_into_app_models(
-                            cursor,
-                            model._meta.db_table,
-                            fields,
-                            db_values,
-                            placeholder_list,
-                        )
-
-                # clear dirty bit for all store records for this model/profile except for rows that did not validate
-                store_models.exclude(id__in=excluded_list).filter(
-                    dirty_bit=True
-                ).update(dirty_bit=False)
+    logger.info(
+        "Deserialization foreign key cache: {hits} hits, {misses} misses, {evictions} evictions".format(
+            **fk_cache.stats()
+        )
+    )
 
 
 @transaction.atomic(using=USING_DB)
@@ -429,135 +634,179 @@ def _queue_into_buffer(transfersession):
     if not fsics:
         return
 
-    profile_condition = ["profile = '{}'".format(transfersession.sync_session.profile)]
-    partition_conditions = []
+    partition_condition = ""
+    partition_params = []
     # create condition for filtering by partitions
-    for prefix in filter_prefixes:
-        partition_conditions += ["partition LIKE '{}%'".format(prefix)]
     if filter_prefixes:
-        partition_conditions = [_join_with_logical_operator(partition_conditions, "OR")]
-
-    chunk_size = 200
-    fsics = list(fsics.items())
-    fsics_len = len(fsics)
-    fsics_limit = chunk_size * SQL_UNION_MAX
-
-    if fsics_len >= fsics_limit:
-        raise MorangoLimitExceeded(
-            "Limit of {limit} instance counters exceeded with {actual}".format(
-                limit=fsics_limit,
-                actual=fsics_len,
+        conditions = []
+        for prefix in filter_prefixes:
+            condition, condition_params = DBBackend._prefix_condition(
+                "store.partition", prefix
             )
-        )
+            conditions.append(condition)
+            partition_params += condition_params
+        partition_condition = "AND ({})".format(" OR ".join(conditions))
 
-    # chunk fsics creating multiple SQL selects which will be unioned before insert
-    i = 0
-    chunk = fsics[:chunk_size]
-    select_buffers = []
-    select_rmc_buffers = []
-
-    while chunk:
-        # create condition for all push FSICs where instance_ids are equal, but internal counters are higher than
-        # FSICs counters
-        last_saved_by_conditions = [
-            "(last_saved_instance = '{0}' AND last_saved_counter > {1})".format(
-                instance, counter
-            )
-            for instance, counter in chunk
-        ]
-        if last_saved_by_conditions:
-            last_saved_by_conditions = [
-                _join_with_logical_operator(last_saved_by_conditions, "OR")
-            ]
+    transfer_session_id_type = TransferSession._meta.pk.rel_db_type(connection)
+    params = [transfersession.id, transfersession.sync_session.profile]
+    params += partition_params
 
-        # combine conditions and filter by profile
-        where_condition = _join_with_logical_operator(
-            profile_condition + last_saved_by_conditions + partition_conditions,
-            "AND",
-        )
+    # the fsics are joined against the store as a VALUES table, in chunks that fit the parameter
+    # limits. Each instance ID only appears in one chunk so each chunk selects different records
+    chunk_size = max(1, (DBBackend._max_query_params() - len(params)) // 2)
+    fsics = list(fsics.items())
 
-        # execute raw sql to take all records that match condition, to be put into buffer for transfer
-        select_buffers.append(
-            """SELECT
-                   id, serialized, deleted, last_saved_instance, last_saved_counter, hard_deleted, model_name, profile,
-                   partition, source_id, conflicting_serialized_data,
-                   CAST ('{transfer_session_id}' AS {transfer_session_id_type}), _self_ref_fk
-               FROM {store} WHERE {condition}
-            """.format(
-                transfer_session_id=transfersession.id,
-                transfer_session_id_type=TransferSession._meta.pk.rel_db_type(
-                    connection
+    with connection.cursor() as cursor:
+        for i in range(0, len(fsics), chunk_size):
+            chunk = fsics[i : i + chunk_size]
+            # select all records where instance_ids are equal to the FSICs', but internal counters are higher
+            cursor.execute(
+                """WITH fsic (instance_id, counter) AS (VALUES {fsic_values})
+                   INSERT INTO {outgoing_buffer}
+                   (model_uuid, serialized, deleted, last_saved_instance, last_saved_counter,
+                   hard_deleted, model_name, profile, partition, source_id, conflicting_serialized_data,
+                   transfer_session_id, _self_ref_fk)
+                   SELECT
+                       store.id, store.serialized, store.deleted, store.last_saved_instance, store.last_saved_counter,
+                       store.hard_deleted, store.model_name, store.profile, store.partition, store.source_id,
+                       store.conflicting_serialized_data, CAST (%s AS {transfer_session_id_type}), store._self_ref_fk
+                   FROM {store} AS store
+                   INNER JOIN fsic ON store.last_saved_instance = fsic.instance_id
+                       AND store.last_saved_counter > fsic.counter
+                   WHERE store.profile = %s {partition_condition}
+                """.format(
+                    fsic_values=", ".join(
+                        [
+                            "(CAST (%s AS {instance_id_type}), CAST (%s AS {counter_type}))".format(
+                                instance_id_type=Store._meta.get_field(
+                                    "last_saved_instance"
+                                ).rel_db_type(connection),
+                                counter_type=Store._meta.get_field(
+                                    "last_saved_counter"
+                                ).rel_db_type(connection),
+                            )
+                        ]
+                        * len(chunk)
+                    ),
+                    outgoing_buffer=Buffer._meta.db_table,
+                    transfer_session_id_type=transfer_session_id_type,
+                    store=Store._meta.db_table,
+                    partition_condition=partition_condition,
                 ),
-                condition=where_condition,
-                store=Store._meta.db_table,
+                [value for fsic in chunk for value in fsic] + params,
             )
-        )
+
         # take all record max counters that are foreign keyed onto store models, which were queued into the buffer
-        select_rmc_buffers.append(
-            """SELECT instance_id, counter, CAST ('{transfer_session_id}' AS {transfer_session_id_type}), store_model_id
+        cursor.execute(
+            """INSERT INTO {outgoing_rmcb}
+               (instance_id, counter, transfer_session_id, model_uuid)
+               SELECT instance_id, counter, CAST ('{transfer_session_id}' AS {transfer_session_id_type}), store_model_id
                FROM {record_max_counter} AS rmc
                INNER JOIN {outgoing_buffer} AS buffer ON rmc.store_model_id = buffer.model_uuid
                WHERE buffer.transfer_session_id = '{transfer_session_id}'
             """.format(
+                outgoing_rmcb=RecordMaxCounterBuffer._meta.db_table,
                 transfer_session_id=transfersession.id,
-                transfer_session_id_type=TransferSession._meta.pk.rel_db_type(
-                    connection
-                ),
+                transfer_session_id_type=transfer_session_id_type,
                 record_max_counter=RecordMaxCounter._meta.db_table,
                 outgoing_buffer=Buffer._meta.db_table,
             )
         )
-        i += chunk_size
-        chunk = fsics[i : i + chunk_size]
-
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """INSERT INTO {outgoing_buffer}
-               (model_uuid, serialized, deleted, last_saved_instance, last_saved_counter,
-               hard_deleted, model_name, profile, partition, source_id, conflicting_serialized_data,
-               transfer_session_id, _self_ref_fk)
-               {select}
-            """.format(
-                outgoing_buffer=Buffer._meta.db_table,
-                select=" UNION ".join(select_buffers),
-            )
-        )
-        cursor.execute(
-            """INSERT INTO {outgoing_rmcb}
-               (instance_id, counter, transfer_session_id, model_uuid)
-               {select}
-            """.format(
-                outgoing_rmcb=RecordMaxCounterBuffer._meta.db_table,
-                select=" UNION ".join(select_rmc_buffers),
-            )
-        )
 
 
-@transaction.atomic(using=USING_DB)
-def _dequeue_into_store(transfersession):
+def _dequeue_buffers(transfersession, after=None, upto=None):
     """
-    Takes data from the buffers and merges into the store and record max counters.
+    Takes data from the buffers and merges into the store and record max counters, optionally
+    limited to the buffers with a model_uuid after `after`, up to and including `upto`.
+
+    ALGORITHM: Classify each buffered record once, as a reverse fast-forward, fast-forward or merge
+    conflict, into a temporary table, then apply each action with set-based statements joined to
+    that table, so later statements aren't affected by the store and RMC changes of earlier ones.
+    Reverse fast-forwards are discarded along with the rest of the transfer session's buffers.
 
-    ALGORITHM: Incrementally insert and delete on a case by case basis to ensure subsequent cases
-    are not affected by previous cases.
+    :return: The number of buffered records dequeued
     """
     with connection.cursor() as cursor:
-        DBBackend._dequeuing_delete_rmcb_records(cursor, transfersession.id)
-        DBBackend._dequeuing_delete_buffered_records(cursor, transfersession.id)
+        DBBackend._dequeuing_create_actions_table(cursor)
+        dequeued = DBBackend._dequeuing_classify(
+            cursor, transfersession.id, after=after, upto=upto
+        )
         current_id = InstanceIDModel.get_current_instance_and_increment_counter()
         DBBackend._dequeuing_merge_conflict_buffer(
             cursor, current_id, transfersession.id
         )
-        DBBackend._dequeuing_merge_conflict_rmcb(cursor, transfersession.id)
+        DBBackend._dequeuing_insert_fast_forward_buffer(cursor, transfersession.id)
+        DBBackend._dequeuing_insert_rmcb(cursor, transfersession.id)
         DBBackend._dequeuing_update_rmcs_last_saved_by(
             cursor, current_id, transfersession.id
         )
-        DBBackend._dequeuing_delete_mc_rmcb(cursor, transfersession.id)
-        DBBackend._dequeuing_delete_mc_buffer(cursor, transfersession.id)
-        DBBackend._dequeuing_insert_remaining_buffer(cursor, transfersession.id)
-        DBBackend._dequeuing_insert_remaining_rmcb(cursor, transfersession.id)
-        DBBackend._dequeuing_delete_remaining_rmcb(cursor, transfersession.id)
-        DBBackend._dequeuing_delete_remaining_buffer(cursor, transfersession.id)
+        DBBackend._dequeuing_delete_remaining_rmcb(
+            cursor, transfersession.id, after=after, upto=upto
+        )
+        DBBackend._dequeuing_delete_remaining_buffer(
+            cursor, transfersession.id, after=after, upto=upto
+        )
+        DBBackend._dequeuing_drop_actions_table(cursor)
+    return dequeued
+
+
+@transaction.atomic(using=USING_DB)
+def _dequeue_chunk(transfersession, chunk_size):
+    """
+    Dequeues the next chunk of up to `chunk_size` buffered records, in order of model_uuid after the
+    transfer session's dequeue cursor, and advances the cursor in the same transaction, so chunks
+    are dequeued exactly once even if dequeuing is interrupted and resumed.
+
+    :return: Whether there may be more buffered records to dequeue
+    """
+    after = transfersession.dequeue_cursor
+    buffers = Buffer.objects.filter(transfer_session=transfersession)
+    if after is not None:
+        buffers = buffers.filter(model_uuid__gt=after)
+    upto = list(
+        buffers.order_by("model_uuid").values_list("model_uuid", flat=True)[
+            chunk_size - 1 : chunk_size
+        ]
+    )
+    upto = upto[0] if upto else None
+    if upto is None and not buffers.exists():
+        return False
+
+    dequeued = _dequeue_buffers(transfersession, after=after, upto=upto)
+    transfersession.records_dequeued += dequeued
+    if upto is not None:
+        transfersession.dequeue_cursor = upto
+    transfersession.save(update_fields=["records_dequeued", "dequeue_cursor"])
+    return upto is not None
+
+
+def _dequeue_into_store(transfersession, chunk_size=None):
+    """
+    Takes data from the buffers and merges into the store and record max counters.
+
+    :param chunk_size: If set, the buffers are dequeued in chunks of up to this many records, by
+        ranges of model_uuid, each in its own transaction, rather than all in one transaction
+    """
+    if not chunk_size:
+        with transaction.atomic(using=USING_DB):
+            _dequeue_buffers(transfersession)
+        return
+
+    while _dequeue_chunk(transfersession, chunk_size):
+        pass
+
+
+def _timed(func, *args):
+    """
+    :return: A tuple of the result of calling `func` and the duration of the call in seconds
+    """
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+def _transferred_bytes(connection):
+    return connection.bytes_sent + connection.bytes_received
 
 
 class BaseOperation(object):
@@ -833,7 +1082,10 @@ class ReceiverDequeueOperation(LocalOperation):
         # if no records were transferred, we can safely skip
         records_transferred = context.transfer_session.records_transferred or 0
         if records_transferred > 0:
-            _dequeue_into_store(context.transfer_session)
+            _dequeue_into_store(
+                context.transfer_session,
+                chunk_size=SETTINGS.MORANGO_DEQUEUE_CHUNK_SIZE,
+            )
 
         return transfer_statuses.COMPLETED
 
@@ -971,14 +1223,56 @@ class NetworkOperation(BaseOperation):
         :type context: NetworkSessionContext
         :return: A list of dicts, serialized Buffers
         """
-        response = context.connection._pull_record_chunk(context.transfer_session)
+        data = self.pull_buffers(context, self._get_pull_cursor(context))
+        return self.validate_buffers(context, data)
+
+    def _get_pull_cursor(self, context):
+        """
+        :type context: NetworkSessionContext
+        :return: The model UUID after which to pull the next chunk, or None to pull by offset
+        """
+        if KEYSET_BUFFER_PAGINATION not in context.capabilities:
+            return None
+
+        # pages are ordered by model_uuid, so the next page starts after the greatest one
+        # we've buffered, which also holds when resuming
+        return (
+            Buffer.objects.filter(transfer_session=context.transfer_session)
+            .order_by("-model_uuid")
+            .values_list("model_uuid", flat=True)
+            .first()
+            or ""
+        )
+
+    def pull_buffers(self, context, after=None):
+        """
+        Pulls a single chunk of buffers from the remote server, without touching the database
+
+        :type context: NetworkSessionContext
+        :param after: The model UUID after which to pull buffers, or None to pull by offset
+        :return: A list of dicts, serialized Buffers
+        """
+        response = context.connection._pull_record_chunk(
+            context.transfer_session, after=after
+        )
 
-        data = response.json()
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith(compact.MEDIA_TYPE):
+            data = compact.loads(response.content)
+        else:
+            data = response.json()
 
         # parse out the results from a paginated set, if needed
         if isinstance(data, dict) and "results" in data:
             data = data["results"]
+        return data
 
+    def validate_buffers(self, context, data):
+        """
+        :type context: NetworkSessionContext
+        :param data: A list of dicts, serialized Buffers
+        :return: The validated list of dicts
+        """
         # no buffers?
         if len(data) == 0:
             return data
@@ -999,6 +1293,45 @@ class NetworkOperation(BaseOperation):
             )
         return data
 
+    def adapt_chunk_size(self, context, records, seconds, transferred_bytes):
+        """
+        Adapts the connection's chunk size to the measured transfer of chunks, if enabled, and
+        records any change on the transfer session
+
+        :type context: NetworkSessionContext
+        :param records: The average number of records per chunk
+        :param seconds: The average duration of the requests for the chunks
+        :param transferred_bytes: The average number of bytes sent and received per chunk
+        """
+        connection = context.connection
+        controller = connection.chunk_size_controller
+        if controller is None:
+            return
+
+        chunk_size = controller.update(
+            connection.chunk_size, records, seconds, transferred_bytes
+        )
+        if chunk_size == connection.chunk_size:
+            return
+
+        logger.debug(
+            "Adapting chunk size from {} to {} records at {} bytes per second".format(
+                connection.chunk_size, chunk_size, int(controller.bytes_per_second)
+            )
+        )
+        connection.chunk_size = chunk_size
+        transfer_session = context.transfer_session
+        chunk_sizes = json.loads(transfer_session.chunk_sizes or "[]")
+        chunk_sizes.append(
+            [
+                transfer_session.records_transferred,
+                chunk_size,
+                int(controller.bytes_per_second),
+            ]
+        )
+        transfer_session.chunk_sizes = json.dumps(chunk_sizes)
+        transfer_session.save(update_fields=["chunk_sizes"])
+
     def remote_proceed_to(self, context, stage, **kwargs):
         """
         Uses server API's to push updates to a remote `TransferSession`, which triggers the
@@ -1169,6 +1502,14 @@ class NetworkQueueOperation(NetworkOperation):
 
 
 class NetworkPushTransferOperation(NetworkOperation):
+    """
+    Pushes chunks of buffers to the remote. With `MORANGO_TRANSFER_PIPELINE_DEPTH` greater than 1,
+    up to that many chunks are in flight at once, with the next chunk being read while the previous
+    ones are sent. Chunks are acknowledged in order, so `records_transferred` only ever counts the
+    contiguous run of chunks the remote has received, and resuming re-sends any received after a
+    failed one, which the remote skips.
+    """
+
     def handle(self, context):
         """
         :type context: NetworkSessionContext
@@ -1176,43 +1517,136 @@ class NetworkPushTransferOperation(NetworkOperation):
         self._assert(context.transfer_session is not None)
         self._assert(context.is_push)
 
-        if context.transfer_session.records_total == 0:
+        transfer_session = context.transfer_session
+        if transfer_session.records_total == 0:
             # since we won't be transferring anything, we can say we're done
             return transfer_statuses.COMPLETED
 
-        offset = context.transfer_session.records_transferred
+        depth = max(1, SETTINGS.MORANGO_TRANSFER_PIPELINE_DEPTH)
         chunk_size = context.connection.chunk_size
 
         buffered_records = Buffer.objects.filter(
-            transfer_session=context.transfer_session
+            transfer_session=transfer_session
         ).order_by("pk")
+        after_pk = self._get_cursor(context, buffered_records)
 
-        data = BufferSerializer(
-            buffered_records[offset : offset + chunk_size], many=True
-        ).data
+        records_transferred = transfer_session.records_transferred
+        transferred_bytes = _transferred_bytes(context.connection)
+
+        pool = ThreadPool(depth) if depth > 1 else None
+        chunks = []
+        try:
+            records_read = transfer_session.records_transferred
+            while len(chunks) < depth and records_read < transfer_session.records_total:
+                records = buffered_records
+                if after_pk is not None:
+                    records = records.filter(pk__gt=after_pk)
+                records = list(records[:chunk_size])
+                records_read += chunk_size
+                if records:
+                    after_pk = records[-1].pk
+
+                data = BufferSerializer(records, many=True).data
+
+                # push buffers chunk to server
+                args = (self.put_buffers, context, data)
+                if pool is None:
+                    chunks.append((records, _timed(*args)))
+                else:
+                    chunks.append((records, pool.apply_async(_timed, args)))
+
+            error = None
+            durations = []
+            for records, result in chunks:
+                if pool is not None:
+                    try:
+                        result = result.get()
+                    except Exception as e:
+                        error = e
+                        break
+                durations.append(result[1])
+                self._acknowledge(context, records, chunk_size)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if durations:
+            self.adapt_chunk_size(
+                context,
+                (transfer_session.records_transferred - records_transferred)
+                / len(durations),
+                sum(durations) / len(durations),
+                (_transferred_bytes(context.connection) - transferred_bytes)
+                / len(durations),
+            )
 
-        # push buffers chunk to server
-        self.put_buffers(context, data)
+        transfer_session.bytes_sent = context.connection.bytes_sent
+        transfer_session.bytes_received = context.connection.bytes_received
+        transfer_session.save()
 
-        context.transfer_session.records_transferred = min(
-            offset + chunk_size, context.transfer_session.records_total
-        )
-        context.transfer_session.bytes_sent = context.connection.bytes_sent
-        context.transfer_session.bytes_received = context.connection.bytes_received
-        context.transfer_session.save()
+        if error is not None:
+            raise error
 
         # if we've transferred all records, return a completed status
         op_status = transfer_statuses.PENDING
-        if (
-            context.transfer_session.records_transferred
-            >= context.transfer_session.records_total
-        ):
+        if transfer_session.records_transferred >= transfer_session.records_total:
             op_status = transfer_statuses.COMPLETED
 
         return op_status
 
+    def _acknowledge(self, context, records, chunk_size):
+        """
+        Marks a chunk as transferred, in the order the chunks were read
+
+        :type context: NetworkSessionContext
+        :param records: The chunk's buffers
+        :param chunk_size: The number of records requested for the chunk
+        """
+        transfer_session = context.transfer_session
+        transfer_session.records_transferred = min(
+            transfer_session.records_transferred + chunk_size,
+            transfer_session.records_total,
+        )
+        if records:
+            context.push_cursor = (
+                transfer_session.id,
+                transfer_session.records_transferred,
+                records[-1].pk,
+            )
+
+    def _get_cursor(self, context, buffered_records):
+        """
+        Returns the pk of the last pushed buffer, so the next chunk can be sought by keyset rather
+        than by offset, or None if nothing has been pushed yet
+
+        :type context: NetworkSessionContext
+        :param buffered_records: The transfer session's buffers, ordered by pk
+        """
+        transfer_session = context.transfer_session
+        offset = transfer_session.records_transferred
+        if offset == 0:
+            return None
+
+        if context.push_cursor is not None:
+            transfer_session_id, records_transferred, pk = context.push_cursor
+            if (transfer_session_id, records_transferred) == (
+                transfer_session.id,
+                offset,
+            ):
+                return pk
+
+        # when resuming, find where we left off by offset once
+        return buffered_records.values_list("pk", flat=True)[offset - 1]
+
 
 class NetworkPullTransferOperation(NetworkOperation):
+    """
+    Pulls chunks of buffers from the remote. With `MORANGO_TRANSFER_PIPELINE_DEPTH` greater than 1
+    and keyset pagination, up to that many chunks are pulled at a time, requesting each next chunk
+    while the previous one is written to the buffer.
+    """
+
     def handle(self, context):
         """
         :type context: NetworkSessionContext
@@ -1223,11 +1657,28 @@ class NetworkPullTransferOperation(NetworkOperation):
         transfer_session = context.transfer_session
 
         if transfer_session.records_total > 0:
-            # grab buffers, just one chunk
-            data = self.get_buffers(context)
+            records_transferred = transfer_session.records_transferred
+            transferred_bytes = _transferred_bytes(context.connection)
+
+            depth = SETTINGS.MORANGO_TRANSFER_PIPELINE_DEPTH
+            if depth > 1 and KEYSET_BUFFER_PAGINATION in context.capabilities:
+                durations = self._pull_pipelined(context, depth)
+            else:
+                # grab buffers, just one chunk
+                data, duration = _timed(self.get_buffers, context)
+                durations = [duration]
+
+                validate_and_create_buffer_data(
+                    data, transfer_session, connection=context.connection
+                )
 
-            validate_and_create_buffer_data(
-                data, transfer_session, connection=context.connection
+            self.adapt_chunk_size(
+                context,
+                (transfer_session.records_transferred - records_transferred)
+                / len(durations),
+                sum(durations) / len(durations),
+                (_transferred_bytes(context.connection) - transferred_bytes)
+                / len(durations),
             )
 
         # if we've transferred all records, return a completed status
@@ -1247,6 +1698,47 @@ class NetworkPullTransferOperation(NetworkOperation):
 
         return op_status
 
+    def _pull_pipelined(self, context, depth):
+        """
+        :type context: NetworkSessionContext
+        :param depth: The maximum number of chunks to pull
+        :return: The durations of the requests for the chunks
+        """
+        transfer_session = context.transfer_session
+        durations = []
+        pool = ThreadPool(1)
+        try:
+            result = pool.apply_async(
+                _timed, (self.pull_buffers, context, self._get_pull_cursor(context))
+            )
+            for i in range(depth):
+                data, duration = result.get()
+                durations.append(duration)
+                result = None
+                # keyset pages are ordered by model_uuid, so the next one can be requested
+                # before this one is buffered
+                if (
+                    data
+                    and i + 1 < depth
+                    and transfer_session.records_transferred + len(data)
+                    < transfer_session.records_total
+                ):
+                    result = pool.apply_async(
+                        _timed, (self.pull_buffers, context, data[-1]["model_uuid"])
+                    )
+
+                validate_and_create_buffer_data(
+                    self.validate_buffers(context, data),
+                    transfer_session,
+                    connection=context.connection,
+                )
+                if result is None:
+                    break
+        finally:
+            pool.close()
+            pool.join()
+        return durations
+
 
 class LegacyDequeueOperation(NetworkLegacyNoOpMixin, NetworkOperation):
     """
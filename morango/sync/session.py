@@ -1,4 +1,5 @@
 import logging
+import threading
 
 from requests import exceptions
 from requests.sessions import Session
@@ -35,6 +36,11 @@ class SessionWrapper(Session):
     bytes_sent = 0
     bytes_received = 0
 
+    def __init__(self, *args, **kwargs):
+        super(SessionWrapper, self).__init__(*args, **kwargs)
+        # requests may be made concurrently when transferring chunks in a pipeline
+        self._bytes_lock = threading.Lock()
+
     def request(self, method, url, **kwargs):
         response = None
         try:
@@ -46,11 +52,13 @@ class SessionWrapper(Session):
             if not content_length:
                 content_length = super_len(response.content)
 
-            self.bytes_received += len(
+            bytes_received = len(
                 "HTTP/1.1 {} {}".format(response.status_code, response.reason)
             )
-            self.bytes_received += _length_of_headers(response.headers)
-            self.bytes_received += content_length
+            bytes_received += _length_of_headers(response.headers)
+            bytes_received += content_length
+            with self._bytes_lock:
+                self.bytes_received += bytes_received
 
             response.raise_for_status()
             return response
@@ -81,9 +89,11 @@ class SessionWrapper(Session):
         # we don't bother checking if the content length header exists here because we've probably
         # been given the request body as Morango sends bodies that aren't streamed, so the
         # underlying requests code will set it appropriately
-        self.bytes_sent += len("{} {} HTTP/1.1".format(request.method, parsed_url.path))
-        self.bytes_sent += _length_of_headers(prepped.headers)
-        self.bytes_sent += _headers_content_length(prepped.headers)
+        bytes_sent = len("{} {} HTTP/1.1".format(request.method, parsed_url.path))
+        bytes_sent += _length_of_headers(prepped.headers)
+        bytes_sent += _headers_content_length(prepped.headers)
+        with self._bytes_lock:
+            self.bytes_sent += bytes_sent
 
         return prepped
 
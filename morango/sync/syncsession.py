@@ -18,13 +18,16 @@ from django.utils.six.moves.urllib.parse import urljoin
 from django.utils.six.moves.urllib.parse import urlparse
 
 from .session import SessionWrapper
+from morango.api import compact
 from morango.api.serializers import CertificateSerializer
 from morango.api.serializers import InstanceIDSerializer
 from morango.constants import api_urls
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
+from morango.constants.capabilities import COMPACT_BUFFER_FORMAT
 from morango.constants.capabilities import GZIP_BUFFER_POST
+from morango.constants.capabilities import ZSTD_BUFFER_POST
 from morango.errors import CertificateSignatureInvalid
 from morango.errors import MorangoError
 from morango.errors import MorangoResumeSyncError
@@ -36,14 +39,20 @@ from morango.models.core import SyncSession
 from morango.sync.controller import SessionController
 from morango.sync.context import LocalSessionContext
 from morango.sync.context import NetworkSessionContext
+from morango.sync.utils import ChunkSizeController
 from morango.sync.utils import SyncSignal
 from morango.sync.utils import SyncSignalGroup
 from morango.utils import CAPABILITIES
 from morango.utils import pid_exists
+from morango.utils import SETTINGS
 
 if GZIP_BUFFER_POST in CAPABILITIES:
+    import zlib
     from gzip import GzipFile
 
+if ZSTD_BUFFER_POST in CAPABILITIES:
+    import zstandard
+
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +91,55 @@ def compress_string(s, compresslevel=9):
     return zbuf.getvalue()
 
 
+# size of the pieces of serialized JSON that are compressed at a time
+COMPRESS_BUFFER_SIZE = 64 * 1024
+
+# Zstandard's default level, which is faster than gzip while compressing about as well
+ZSTD_COMPRESSION_LEVEL = 3
+
+
+def _iter_json(data):
+    """
+    Yields the UTF-8 encoded JSON of `data` in pieces of about `COMPRESS_BUFFER_SIZE` characters
+    """
+    pieces = []
+    size = 0
+    for piece in json.JSONEncoder().iterencode(data):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= COMPRESS_BUFFER_SIZE:
+            yield "".join(pieces).encode("utf-8")
+            pieces = []
+            size = 0
+    if pieces:
+        yield "".join(pieces).encode("utf-8")
+
+
+def iter_compressed_json(data, capability=GZIP_BUFFER_POST, compresslevel=6):
+    """
+    Encodes `data` as JSON and compresses it incrementally, so that neither the full JSON string
+    nor its uncompressed bytes are ever held in memory
+
+    :param data: The JSON serializable data
+    :param capability: GZIP_BUFFER_POST or ZSTD_BUFFER_POST, for the compression format
+    :param compresslevel: The gzip compression level
+    :return: A generator of the compressed bytes
+    """
+    if capability == ZSTD_BUFFER_POST:
+        compressor = zstandard.ZstdCompressor(
+            level=ZSTD_COMPRESSION_LEVEL
+        ).compressobj()
+    else:
+        # the window bits offset tells zlib to write a gzip header and trailer
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for piece in _iter_json(data):
+        compressed = compressor.compress(piece)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
 class Connection(object):
     """
     Abstraction around a connection with a syncing peer (network or disk),
@@ -104,6 +162,7 @@ class NetworkSyncConnection(Connection):
         "server_info",
         "capabilities",
         "chunk_size",
+        "chunk_size_controller",
     )
 
     default_chunk_size = 500
@@ -111,7 +170,7 @@ class NetworkSyncConnection(Connection):
     def __init__(
         self,
         base_url="",
-        compresslevel=9,
+        compresslevel=6,
         retries=7,
         backoff_factor=0.3,
         chunk_size=default_chunk_size,
@@ -139,6 +198,13 @@ class NetworkSyncConnection(Connection):
         ).json()
         self.capabilities = self.server_info.get("capabilities", [])
         self.chunk_size = chunk_size
+        self.chunk_size_controller = None
+        if SETTINGS.MORANGO_ADAPTIVE_CHUNK_SIZE:
+            self.chunk_size_controller = ChunkSizeController(
+                SETTINGS.MORANGO_CHUNK_SIZE_MIN,
+                SETTINGS.MORANGO_CHUNK_SIZE_MAX,
+                SETTINGS.MORANGO_CHUNK_TARGET_LATENCY,
+            )
 
     @property
     def bytes_sent(self):
@@ -466,28 +532,60 @@ class NetworkSyncConnection(Connection):
         )
 
     def _push_record_chunk(self, data):
-        # gzip the data if both client and server have gzipping capabilities
-        if GZIP_BUFFER_POST in self.capabilities and GZIP_BUFFER_POST in CAPABILITIES:
-            json_data = json.dumps([dict(el) for el in data])
-            gzipped_data = compress_string(
-                bytes(json_data.encode("utf-8")), compresslevel=self.compresslevel
-            )
+        # encode the data compactly if both client and server have the capability
+        if (
+            COMPACT_BUFFER_FORMAT in self.capabilities
+            and COMPACT_BUFFER_FORMAT in CAPABILITIES
+        ):
             return self.session.post(
                 self.urlresolve(api_urls.BUFFER),
-                data=gzipped_data,
-                headers={"content-type": "application/gzip"},
+                data=compact.dumps(data, compresslevel=self.compresslevel),
+                headers={"content-type": compact.MEDIA_TYPE},
             )
-        else:
-            return self.session.post(self.urlresolve(api_urls.BUFFER), json=data)
 
-    def _pull_record_chunk(self, transfer_session):
-        # pull records from server for given transfer session
+        # otherwise compress the data if both client and server have a compression capability,
+        # preferring the faster zstd
+        for capability, content_type in (
+            (ZSTD_BUFFER_POST, "application/zstd"),
+            (GZIP_BUFFER_POST, "application/gzip"),
+        ):
+            if capability in self.capabilities and capability in CAPABILITIES:
+                # the compressed body is joined rather than streamed, since servers need its
+                # content length
+                compressed_data = b"".join(
+                    iter_compressed_json(
+                        data, capability=capability, compresslevel=self.compresslevel
+                    )
+                )
+                return self.session.post(
+                    self.urlresolve(api_urls.BUFFER),
+                    data=compressed_data,
+                    headers={"content-type": content_type},
+                )
+        return self.session.post(self.urlresolve(api_urls.BUFFER), json=data)
+
+    def _pull_record_chunk(self, transfer_session, after=None):
+        # pull records from server for given transfer session, paging by keyset when `after` is
+        # given, otherwise by offset
         params = {
             "limit": self.chunk_size,
-            "offset": transfer_session.records_transferred,
             "transfer_session_id": transfer_session.id,
         }
-        return self.session.get(self.urlresolve(api_urls.BUFFER), params=params)
+        if after is not None:
+            params["after"] = after
+        else:
+            params["offset"] = transfer_session.records_transferred
+
+        headers = {}
+        # request the compact encoding if both client and server have the capability
+        if (
+            COMPACT_BUFFER_FORMAT in self.capabilities
+            and COMPACT_BUFFER_FORMAT in CAPABILITIES
+        ):
+            headers["accept"] = compact.MEDIA_TYPE
+        return self.session.get(
+            self.urlresolve(api_urls.BUFFER), params=params, headers=headers
+        )
 
 
 class SyncClientSignals(SyncSignal):
@@ -1,13 +1,14 @@
-import copy
 import functools
 import logging
 
 from django.db import transaction
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 
 from morango.models.core import Buffer
 from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import SyncableModel
+from morango.models.core import TransferSession
 from morango.registry import syncable_models
 
 
@@ -70,37 +71,53 @@ class mute_signals(object):
         return wrapper
 
 
+# number of model UUIDs per query when checking for already buffered records
+BUFFERED_MODEL_UUIDS_CHUNK_SIZE = 500
+
+
 def validate_and_create_buffer_data(  # noqa: C901
     data, transfer_session, connection=None
 ):
-    data = copy.deepcopy(data)
+    # the records are validated in place, without modifying them, and the lookups that are the
+    # same across records are only done once per chunk
+    profile = transfer_session.sync_session.profile
+    sync_filter = transfer_session.get_filter()
+    models_by_name = {}
+    contained_partitions = {}
+
     rmcb_list = []
     buffer_list = []
     for record in data:
         # ensure the provided model_uuid matches the expected/computed id
+        model_key = (record["profile"], record["model_name"])
         try:
-            Model = syncable_models.get_model(record["profile"], record["model_name"])
+            Model = models_by_name[model_key]
         except KeyError:
-            Model = SyncableModel
-
-        partition = record["partition"].replace(
-            record["model_uuid"], Model.ID_PLACEHOLDER
-        )
+            try:
+                Model = syncable_models.get_model(*model_key)
+            except KeyError:
+                Model = SyncableModel
+            models_by_name[model_key] = Model
+
+        model_uuid = record["model_uuid"]
+        partition = record["partition"].replace(model_uuid, Model.ID_PLACEHOLDER)
         expected_model_uuid = Model.compute_namespaced_id(
             partition, record["source_id"], record["model_name"]
         )
-        if expected_model_uuid != record["model_uuid"]:
+        if expected_model_uuid != model_uuid:
             raise ValidationError(
                 "Does not match results of calling {}.compute_namespaced_id".format(
                     Model.__class__.__name__
                 )
             )
 
-        # ensure the profile is marked onto the buffer record
-        record["profile"] = transfer_session.sync_session.profile
-
         # ensure the partition is within the transfer session's filter
-        if not transfer_session.get_filter().contains_partition(record["partition"]):
+        try:
+            is_contained = contained_partitions[record["partition"]]
+        except KeyError:
+            is_contained = sync_filter.contains_partition(record["partition"])
+            contained_partitions[record["partition"]] = is_contained
+        if not is_contained:
             raise ValidationError(
                 "Partition {} is not contained within filter for TransferSession ({})".format(
                     record["partition"], transfer_session.filter
@@ -108,39 +125,125 @@ def validate_and_create_buffer_data(  # noqa: C901
             )
 
         # ensure that all nested RMCB models are properly associated with this record and transfer session
-        for rmcb in record.pop("rmcb_list"):
+        for rmcb in record["rmcb_list"]:
             if rmcb["transfer_session"] != transfer_session.id:
                 raise ValidationError(
                     "Transfer session on RMCB ({}) does not match Buffer's TransferSession ({})".format(
                         rmcb["transfer_session"], transfer_session
                     )
                 )
-            if rmcb["model_uuid"] != record["model_uuid"]:
+            if rmcb["model_uuid"] != model_uuid:
                 raise ValidationError(
                     "Model UUID on RMCB ({}) does not match Buffer's Model UUID ({})".format(
-                        rmcb["model_uuid"], record["model_uuid"]
+                        rmcb["model_uuid"], model_uuid
                     )
                 )
-            rmcb["transfer_session_id"] = rmcb.pop("transfer_session")
-            rmcb_list += [RecordMaxCounterBuffer(**rmcb)]
+            rmcb_kwargs = dict(rmcb)
+            rmcb_kwargs["transfer_session_id"] = rmcb_kwargs.pop("transfer_session")
+            rmcb_list.append(RecordMaxCounterBuffer(**rmcb_kwargs))
 
-        record["transfer_session_id"] = record.pop("transfer_session")
-        buffer_list += [Buffer(**record)]
+        buffer_kwargs = dict(record)
+        del buffer_kwargs["rmcb_list"]
+        buffer_kwargs["transfer_session_id"] = buffer_kwargs.pop("transfer_session")
+        # ensure the profile is marked onto the buffer record
+        buffer_kwargs["profile"] = profile
+        buffer_list.append(Buffer(**buffer_kwargs))
 
     with transaction.atomic():
-        transfer_session.records_transferred += len(data)
+        # records can be delivered more than once, such as when resuming a pipelined transfer after
+        # a later chunk was received but an earlier one wasn't, so skip those already buffered
+        model_uuids = [b.model_uuid for b in buffer_list]
+        existing_model_uuids = set()
+        for i in range(0, len(model_uuids), BUFFERED_MODEL_UUIDS_CHUNK_SIZE):
+            existing_model_uuids.update(
+                Buffer.objects.filter(
+                    transfer_session_id=transfer_session.id,
+                    model_uuid__in=model_uuids[i : i + BUFFERED_MODEL_UUIDS_CHUNK_SIZE],
+                ).values_list("model_uuid", flat=True)
+            )
+        if existing_model_uuids:
+            buffer_list = [
+                b for b in buffer_list if b.model_uuid not in existing_model_uuids
+            ]
+            rmcb_list = [
+                r for r in rmcb_list if r.model_uuid not in existing_model_uuids
+            ]
+
+        # chunks of the same transfer session may be received concurrently, so increment in the
+        # database, which also locks the transfer session until we're done
+        TransferSession.objects.filter(pk=transfer_session.pk).update(
+            records_transferred=F("records_transferred") + len(buffer_list)
+        )
+        transfer_session.refresh_from_db(fields=["records_transferred"])
 
+        # only the byte counters are written, so a stale copy can't overwrite the increment
         if connection is not None:
             transfer_session.bytes_sent = connection.bytes_sent
-        if connection is not None:
             transfer_session.bytes_received = connection.bytes_received
-
-        transfer_session.save()
+            transfer_session.save(update_fields=["bytes_sent", "bytes_received"])
 
         Buffer.objects.bulk_create(buffer_list)
         RecordMaxCounterBuffer.objects.bulk_create(rmcb_list)
 
 
+class ChunkSizeController(object):
+    """
+    Grows or shrinks the number of records per transferred chunk toward a target latency per
+    request, within bounds. Estimates of the time per record and of the throughput are smoothed
+    across chunks, and each adjustment is at most a doubling or halving of the chunk size.
+    """
+
+    __slots__ = (
+        "min_size",
+        "max_size",
+        "target_latency",
+        "smoothing",
+        "seconds_per_record",
+        "bytes_per_second",
+    )
+
+    def __init__(self, min_size, max_size, target_latency, smoothing=0.5):
+        """
+        :param min_size: The minimum number of records per chunk
+        :param max_size: The maximum number of records per chunk
+        :param target_latency: The target duration, in seconds, of transferring a chunk
+        :param smoothing: The weight of the latest measurement in the smoothed estimates
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self.seconds_per_record = None
+        self.bytes_per_second = None
+
+    def _smooth(self, estimate, sample):
+        if estimate is None:
+            return sample
+        return self.smoothing * sample + (1 - self.smoothing) * estimate
+
+    def update(self, chunk_size, records, seconds, transferred_bytes):
+        """
+        :param chunk_size: The current number of records per chunk
+        :param records: The number of records transferred by the measured request
+        :param seconds: The duration of the measured request
+        :param transferred_bytes: The number of bytes sent and received by the measured request
+        :return: The number of records for the next chunk
+        """
+        if records <= 0 or seconds <= 0:
+            return chunk_size
+
+        self.seconds_per_record = self._smooth(
+            self.seconds_per_record, float(seconds) / records
+        )
+        self.bytes_per_second = self._smooth(
+            self.bytes_per_second, float(transferred_bytes) / seconds
+        )
+
+        size = self.target_latency / self.seconds_per_record
+        size = max(chunk_size / 2.0, min(chunk_size * 2.0, size))
+        return int(max(self.min_size, min(self.max_size, size)))
+
+
 class SyncSignal(object):
     """
     Helper class for firing signals from the sync client
@@ -1,4 +1,6 @@
 import os
+import threading
+from collections import OrderedDict
 
 from django.conf import settings
 
@@ -6,6 +8,9 @@ from morango.constants import settings as default_settings
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
 from morango.constants.capabilities import GZIP_BUFFER_POST
 from morango.constants.capabilities import ASYNC_OPERATIONS
+from morango.constants.capabilities import COMPACT_BUFFER_FORMAT
+from morango.constants.capabilities import KEYSET_BUFFER_PAGINATION
+from morango.constants.capabilities import ZSTD_BUFFER_POST
 
 
 class Settings(object):
@@ -24,6 +29,57 @@ class Settings(object):
 SETTINGS = Settings()
 
 
+class LRUCache(object):
+    """
+    Thread safe dict-like cache that holds at most `max_size` items, evicting the least recently
+    used items first, and which counts its hits, misses and evictions
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            try:
+                # re-insert to mark as most recently used
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def __getitem__(self, key):
+        return self._get(key)
+
+    def __contains__(self, key):
+        try:
+            self._get(key)
+            return True
+        except KeyError:
+            return False
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
 def get_capabilities():
     capabilities = set()
 
@@ -34,6 +90,20 @@ def get_capabilities():
     except ImportError:
         pass
 
+    try:
+        import zlib  # noqa
+
+        capabilities.add(COMPACT_BUFFER_FORMAT)
+    except ImportError:
+        pass
+
+    try:
+        import zstandard  # noqa
+
+        capabilities.add(ZSTD_BUFFER_POST)
+    except ImportError:
+        pass
+
     if SETTINGS.ALLOW_CERTIFICATE_PUSHING:
         capabilities.add(ALLOW_CERTIFICATE_PUSHING)
 
@@ -41,6 +111,8 @@ def get_capabilities():
     if not SETTINGS.MORANGO_DISALLOW_ASYNC_OPERATIONS:
         capabilities.add(ASYNC_OPERATIONS)
 
+    capabilities.add(KEYSET_BUFFER_PAGINATION)
+
     return capabilities
 
 
@@ -97,6 +97,20 @@ class InteractionLog(FacilityDataSyncableModel):
         return '{user_id}:user:interaction'.format(user_id=self.user.id)
 
 
+class Folder(FacilityDataSyncableModel):
+    # Morango syncing settings
+    morango_model_name = "folder"
+
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey('self', null=True, blank=True, related_name='children')
+
+    def calculate_source_id(self, *args, **kwargs):
+        return None
+
+    def calculate_partition(self, *args, **kwargs):
+        return ''
+
+
 class ProxyParent(MorangoMPTTModel):
 
     kind = models.CharField(max_length=20)
@@ -1,6 +1,8 @@
 from django.test import TestCase
+from django.test import override_settings
 from facility_profile.models import MyUser
 
+from morango.models.core import ChangeLog
 from morango.models.manager import SyncableModelManager
 from morango.models.query import SyncableModelQuerySet
 
@@ -61,3 +63,44 @@ class SyncingModelsTestCase(TestCase):
         self.assertTrue(MyUser.objects.first()._morango_dirty_bit)
         user.save(update_dirty_bit_to=None)
         self.assertTrue(MyUser.objects.first()._morango_dirty_bit)
+
+
+@override_settings(MORANGO_ENABLE_CHANGE_LOG=True)
+class ChangeLogTestCase(TestCase):
+
+    def setUp(self):
+        self.user = MyUser.objects.create(username='beans')
+
+    def assertChangesLogged(self, count):
+        self.assertEqual(
+            ChangeLog.objects.filter(
+                model_uuid=self.user.id, profile='facilitydata', model_name='user'
+            ).count(),
+            count,
+        )
+
+    def test_save_logs_change(self):
+        self.assertChangesLogged(1)
+        self.user.save(update_dirty_bit_to=False)
+        self.user.save(update_dirty_bit_to=None)
+        self.assertChangesLogged(1)
+        self.user.save()
+        self.assertChangesLogged(2)
+
+    def test_update_logs_change(self):
+        MyUser.objects.update(update_dirty_bit_to=False)
+        MyUser.objects.update(update_dirty_bit_to=None)
+        self.assertChangesLogged(1)
+        MyUser.objects.filter(username='beans').update(username='beans2')
+        self.assertChangesLogged(2)
+
+    def test_bulk_create_logs_change(self):
+        user = MyUser(username='bulk')
+        user.id = user.calculate_uuid()
+        MyUser.objects.bulk_create([user])
+        self.assertTrue(ChangeLog.objects.filter(model_uuid=user.id).exists())
+
+    @override_settings(MORANGO_ENABLE_CHANGE_LOG=False)
+    def test_disabled(self):
+        self.user.save()
+        self.assertChangesLogged(1)
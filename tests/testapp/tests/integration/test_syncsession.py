@@ -6,6 +6,7 @@ import mock
 from django.conf import settings
 from django.db import connections
 from django.test.testcases import LiveServerTestCase
+from django.test.utils import override_settings
 from facility_profile.models import SummaryLog
 from facility_profile.models import InteractionLog
 from facility_profile.models import MyUser
@@ -21,6 +22,8 @@ from morango.models.core import Buffer
 from morango.models.core import InstanceIDModel
 from morango.models.core import TransferSession
 from morango.sync.controller import MorangoProfileController
+from morango.sync.operations import NetworkOperation
+from morango.sync.utils import ChunkSizeController
 
 
 SECOND_TEST_DATABASE = "default2"
@@ -227,6 +230,91 @@ class PushPullClientTestCase(LiveServerTestCase):
         self.assertEqual(5, SummaryLog.objects.filter(user=self.local_user).count())
         self.assertEqual(5, InteractionLog.objects.filter(user=self.local_user).count())
 
+    @override_settings(MORANGO_TRANSFER_PIPELINE_DEPTH=3)
+    def test_push__pipelined(self):
+        for _ in range(5):
+            SummaryLog.objects.create(user=self.local_user)
+            InteractionLog.objects.create(user=self.local_user)
+
+        client = self.client.get_push_client()
+        client.initialize(self.filter)
+        transfer_session = client.local_context.transfer_session
+        client.run()
+        self.assertEqual(
+            transfer_session.records_total, transfer_session.records_transferred
+        )
+        client.finalize()
+
+        with second_environment():
+            self.assertEqual(
+                5, SummaryLog.objects.filter(user=self.remote_user).count()
+            )
+            self.assertEqual(
+                5, InteractionLog.objects.filter(user=self.remote_user).count()
+            )
+
+    @override_settings(MORANGO_TRANSFER_PIPELINE_DEPTH=3)
+    def test_pull__pipelined(self):
+        with second_environment():
+            for _ in range(5):
+                SummaryLog.objects.create(user=self.remote_user)
+                InteractionLog.objects.create(user=self.remote_user)
+
+        client = self.client.get_pull_client()
+        client.initialize(self.filter)
+        transfer_session = client.local_context.transfer_session
+        with mock.patch(
+            "morango.sync.operations.NetworkOperation.pull_buffers",
+            autospec=True,
+            side_effect=NetworkOperation.pull_buffers,
+        ) as mock_pull_buffers:
+            client.run()
+        self.assertEqual(
+            transfer_session.records_total, transfer_session.records_transferred
+        )
+        # each page was requested once
+        self.assertEqual(
+            -(-transfer_session.records_total // self.conn.chunk_size),
+            mock_pull_buffers.call_count,
+        )
+        self.assertEqual(
+            transfer_session.records_total,
+            Buffer.objects.filter(transfer_session=transfer_session).count(),
+        )
+        client.finalize()
+
+        self.assertEqual(5, SummaryLog.objects.filter(user=self.local_user).count())
+        self.assertEqual(5, InteractionLog.objects.filter(user=self.local_user).count())
+
+    def test_push__adaptive_chunk_size(self):
+        for _ in range(5):
+            SummaryLog.objects.create(user=self.local_user)
+            InteractionLog.objects.create(user=self.local_user)
+
+        # an unreachable target latency shrinks each chunk to the minimum size
+        self.conn.chunk_size_controller = ChunkSizeController(1, 10, 0)
+        client = self.client.get_push_client()
+        client.initialize(self.filter)
+        transfer_session = client.local_context.transfer_session
+        client.run()
+        self.assertEqual(
+            transfer_session.records_total, transfer_session.records_transferred
+        )
+        self.assertEqual(1, self.conn.chunk_size)
+
+        transfer_session.refresh_from_db()
+        chunk_sizes = json.loads(transfer_session.chunk_sizes)
+        self.assertEqual([[3, 1]], [chunk_size[:2] for chunk_size in chunk_sizes])
+        client.finalize()
+
+        with second_environment():
+            self.assertEqual(
+                5, SummaryLog.objects.filter(user=self.remote_user).count()
+            )
+            self.assertEqual(
+                5, InteractionLog.objects.filter(user=self.remote_user).count()
+            )
+
     def test_full_flow_and_repeat(self):
         with second_environment():
             for _ in range(5):
@@ -314,3 +402,80 @@ class PushPullClientTestCase(LiveServerTestCase):
         with second_environment():
             self.assertEqual(5, SummaryLog.objects.filter(user=self.remote_user).count())
             self.assertEqual(5, InteractionLog.objects.filter(user=self.remote_user).count())
+
+    @override_settings(MORANGO_TRANSFER_PIPELINE_DEPTH=3)
+    def test_resume__pipelined(self):
+        for _ in range(5):
+            SummaryLog.objects.create(user=self.local_user)
+            InteractionLog.objects.create(user=self.local_user)
+
+        client = self.client.get_push_client()
+        client.initialize(self.filter)
+        transfer_session = client.local_context.transfer_session
+        buffers = Buffer.objects.filter(transfer_session=transfer_session).order_by("pk")
+        second_chunk_model_uuid = buffers[self.conn.chunk_size].model_uuid
+
+        # the second chunk fails while the first and third reach the server
+        put_buffers = client.remote_context.connection._push_record_chunk
+
+        def _put_buffers(context, data):
+            if data[0]["model_uuid"] == second_chunk_model_uuid:
+                raise Timeout("Network disconnected")
+            return put_buffers(data)
+
+        with mock.patch("morango.sync.operations.NetworkOperation.put_buffers", side_effect=_put_buffers):
+            with self.assertRaises(MorangoError):
+                client.run()
+        # only the chunks before the failed one are acknowledged
+        self.assertEqual(self.conn.chunk_size, transfer_session.records_transferred)
+
+        # resuming re-sends the third chunk, which the server skips
+        resume_client = self.conn.resume_sync_session(client.sync_session.id).get_push_client()
+        resume_client.initialize(self.filter)
+        transfer_session = resume_client.local_context.transfer_session
+        self.assertEqual(self.conn.chunk_size, transfer_session.records_transferred)
+        resume_client.run()
+        self.assertEqual(transfer_session.records_total, transfer_session.records_transferred)
+        resume_client.finalize()
+
+        with second_environment():
+            self.assertEqual(5, SummaryLog.objects.filter(user=self.remote_user).count())
+            self.assertEqual(5, InteractionLog.objects.filter(user=self.remote_user).count())
+
+    def test_resume__mid_transfer(self):
+        # create data
+        for _ in range(5):
+            SummaryLog.objects.create(user=self.local_user)
+            InteractionLog.objects.create(user=self.local_user)
+
+        client = self.client.get_push_client()
+        client.initialize(self.filter)
+        transfer_session = client.local_context.transfer_session
+        records_total = transfer_session.records_total
+
+        # simulate timeout after the first chunk
+        put_buffers = client.remote_context.connection._push_record_chunk
+        with mock.patch("morango.sync.operations.NetworkOperation.put_buffers") as mock_put_buffers:
+            mock_put_buffers.side_effect = [None, Timeout("Network disconnected")]
+            with self.assertRaises(MorangoError):
+                client.run()
+        self.assertEqual(self.conn.chunk_size, transfer_session.records_transferred)
+
+        resume_client = self.conn.resume_sync_session(client.sync_session.id).get_push_client()
+        resume_client.initialize(self.filter)
+        transfer_session = resume_client.local_context.transfer_session
+        self.assertEqual(self.conn.chunk_size, transfer_session.records_transferred)
+
+        pushed = []
+
+        def _put_buffers(context, buffers):
+            pushed.extend(buffer["model_uuid"] for buffer in buffers)
+            return put_buffers(buffers)
+
+        with mock.patch("morango.sync.operations.NetworkOperation.put_buffers", side_effect=_put_buffers):
+            resume_client.run()
+
+        # the remaining records were each pushed once
+        self.assertEqual(records_total, transfer_session.records_transferred)
+        self.assertEqual(records_total - self.conn.chunk_size, len(set(pushed)))
+        self.assertEqual(len(pushed), len(set(pushed)))
@@ -0,0 +1,79 @@
+import json
+
+import mock
+from django.core import exceptions
+from django.db import connection
+from django.test import TestCase
+from facility_profile.models import Facility
+from facility_profile.models import MyUser
+from facility_profile.models import SummaryLog
+
+from morango.models.core import InstanceIDModel
+from morango.models.core import Store
+from morango.registry import syncable_models
+from morango.sync.controller import MorangoProfileController
+
+
+class StoreModelConverterTestCase(TestCase):
+    def setUp(self):
+        InstanceIDModel.get_or_create_current_instance()
+        self.user = MyUser.objects.create(username="beans")
+        self.log = SummaryLog.objects.create(user=self.user)
+        MorangoProfileController("facilitydata").serialize_into_store()
+
+    def _expected_db_values(self, store_model, fk_cache):
+        app_model = store_model._deserialize_store_model(fk_cache)
+        return syncable_models.get_model_converter(
+            app_model.__class__
+        ).app_model_to_db_values(app_model, connection)
+
+    def test_converter_is_cached(self):
+        self.assertIs(
+            syncable_models.get_model_converter(MyUser),
+            syncable_models.get_model_converter(MyUser),
+        )
+
+    def test_can_skip_instantiation(self):
+        self.assertTrue(
+            syncable_models.get_model_converter(SummaryLog).can_skip_instantiation()
+        )
+        # custom model initialization
+        self.assertFalse(
+            syncable_models.get_model_converter(MyUser).can_skip_instantiation()
+        )
+        # custom clean_fields and MPTT model initialization
+        self.assertFalse(
+            syncable_models.get_model_converter(Facility).can_skip_instantiation()
+        )
+
+    def test_to_db_values_without_instantiation(self):
+        converter = syncable_models.get_model_converter(SummaryLog)
+        store_model = Store.objects.get(id=self.log.id)
+        expected = self._expected_db_values(store_model, {})
+
+        fk_cache = {}
+        with mock.patch.object(
+            Store, "_deserialize_store_model"
+        ) as deserialize_mock, mock.patch.object(
+            SummaryLog, "deserialize"
+        ) as model_deserialize_mock:
+            db_values = converter.to_db_values(store_model, fk_cache, connection)
+        deserialize_mock.assert_not_called()
+        model_deserialize_mock.assert_not_called()
+        self.assertEqual(db_values, expected)
+        self.assertEqual(len(fk_cache), 1)
+
+    def test_to_db_values_of_deleted_model(self):
+        converter = syncable_models.get_model_converter(MyUser)
+        store_model = Store.objects.get(id=self.user.id)
+        store_model.deleted = True
+        self.assertIsNone(converter.to_db_values(store_model, {}, connection))
+
+    def test_invalid_model_is_deserialized_to_raise_error(self):
+        converter = syncable_models.get_model_converter(SummaryLog)
+        store_model = Store.objects.get(id=self.log.id)
+        data = json.loads(store_model.serialized)
+        data["user_id"] = "e" * 32
+        store_model.serialized = json.dumps(data)
+        with self.assertRaises(exceptions.ValidationError):
+            converter.to_db_values(store_model, {}, connection)
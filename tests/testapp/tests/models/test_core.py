@@ -1,19 +1,27 @@
 import factory
+import mock
 import uuid
+from django.db import connection
+from django.db import transaction
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.six import iteritems
 
 from facility_profile.models import MyUser
+from facility_profile.models import SummaryLog
 
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.sync.controller import MorangoProfileController
 from morango.models.certificates import Filter
+from morango.models.core import _fk_lookup_cache_key
 from morango.models.core import DatabaseMaxCounter
 from morango.models.core import TransferSession
 from morango.models.core import SyncSession
 from morango.models.core import Store
+from morango.utils import LRUCache
 
 
 class DatabaseMaxCounterFactory(factory.DjangoModelFactory):
@@ -88,6 +96,96 @@ class FilterMaxCounterTestCase(TestCase):
         self.assertEqual(fmcs[self.instance_a], 17)
         self.assertEqual(fmcs[self.instance_b], 10)
 
+    def test_filter_with_duplicate_partitions(self):
+        fmcs = DatabaseMaxCounter.calculate_filter_max_counters(
+            Filter(self.user_prefix_a + "\n" + self.user_prefix_a)
+        )
+        self.assertEqual(fmcs[self.instance_a], 20)
+        self.assertEqual(fmcs[self.instance_b], 10)
+
+    def test_partition_prefixes_are_case_sensitive(self):
+        fmcs = DatabaseMaxCounter.calculate_filter_max_counters(
+            Filter(self.user_prefix_a.lower())
+        )
+        self.assertEqual(fmcs, {})
+
+    def test_partition_prefixes_have_no_wildcards(self):
+        instance_c = "c" * 32
+        DatabaseMaxCounterFactory(instance_id=instance_c, partition="A_A", counter=3)
+        DatabaseMaxCounterFactory(instance_id=instance_c, partition="AA%", counter=4)
+        fmcs = DatabaseMaxCounter.calculate_filter_max_counters(
+            Filter(self.user_prefix_a)
+        )
+        self.assertNotIn(instance_c, fmcs)
+        fmcs = DatabaseMaxCounter.calculate_filter_max_counters(Filter("A_A:user"))
+        self.assertEqual(fmcs, {instance_c: 3})
+
+
+@mock.patch("morango.models.core._fsic_cache", new_callable=lambda: LRUCache(100))
+class FilterMaxCounterCacheTestCase(TransactionTestCase):
+    def setUp(self):
+        self.filter = Filter("AAA:user_id:joe")
+        DatabaseMaxCounter.update_counters({("a" * 32, "AAA"): 15})
+
+    def test_cached_until_counters_updated(self, fsic_cache):
+        self.assertEqual(
+            DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+            {"a" * 32: 15},
+        )
+        with self.assertNumQueries(0):
+            fmcs = DatabaseMaxCounter.calculate_filter_max_counters(self.filter)
+        self.assertEqual(fmcs, {"a" * 32: 15})
+        self.assertEqual(fsic_cache.hits, 1)
+
+        DatabaseMaxCounter.update_counters({("a" * 32, "AAA:user_id"): 20})
+        self.assertEqual(
+            DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+            {"a" * 32: 20},
+        )
+        DatabaseMaxCounter.update_counters({("b" * 32, ""): 5})
+        self.assertEqual(
+            DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+            {"a" * 32: 20, "b" * 32: 5},
+        )
+        self.assertEqual(fsic_cache.hits, 1)
+
+    def test_cached_fsic_is_copied(self, fsic_cache):
+        DatabaseMaxCounter.calculate_filter_max_counters(self.filter)["b" * 32] = 1
+        self.assertEqual(
+            DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+            {"a" * 32: 15},
+        )
+
+    def test_not_cached_in_transaction(self, fsic_cache):
+        with transaction.atomic():
+            DatabaseMaxCounter.update_counters({("b" * 32, "AAA"): 5})
+            self.assertEqual(
+                DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+                {"a" * 32: 15, "b" * 32: 5},
+            )
+            transaction.set_rollback(True)
+        self.assertEqual(len(fsic_cache), 0)
+        self.assertEqual(
+            DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+            {"a" * 32: 15},
+        )
+
+    def test_invalidated_on_commit(self, fsic_cache):
+        with transaction.atomic():
+            DatabaseMaxCounter.update_counters({("b" * 32, "AAA"): 5})
+            # calculated elsewhere before the update is committed
+            with mock.patch.object(connection, "in_atomic_block", False):
+                self.assertEqual(
+                    DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+                    {"a" * 32: 15, "b" * 32: 5},
+                )
+        self.assertEqual(len(fsic_cache), 1)
+        self.assertEqual(
+            DatabaseMaxCounter.calculate_filter_max_counters(self.filter),
+            {"a" * 32: 15, "b" * 32: 5},
+        )
+        self.assertEqual(fsic_cache.hits, 0)
+
 
 class DatabaseMaxCounterUpdateCalculation(TestCase):
     def setUp(self):
@@ -131,6 +229,56 @@ class DatabaseMaxCounterUpdateCalculation(TestCase):
         DatabaseMaxCounter.update_fsics(client_fsic, Filter(self.filter))
         self.assertFalse(DatabaseMaxCounter.objects.filter(counter=1).exists())
 
+    def test_update_fsics_keeps_greater_counters(self):
+        # the DMC of the second partition is ahead of the FSIC calculated over both
+        DatabaseMaxCounter.objects.create(
+            instance_id="a" * 32, counter=1, partition="filter"
+        )
+        DatabaseMaxCounter.objects.create(
+            instance_id="a" * 32, counter=5, partition="other"
+        )
+        DatabaseMaxCounter.update_fsics({"a" * 32: 3}, Filter("filter\nother"))
+        self.assertEqual(DatabaseMaxCounter.objects.get(partition="filter").counter, 3)
+        self.assertEqual(DatabaseMaxCounter.objects.get(partition="other").counter, 5)
+
+    def test_update_fsics_in_bulk(self):
+        client_fsic = {uuid.uuid4().hex: 2 for _ in range(500)}
+        DatabaseMaxCounter.objects.bulk_create(
+            DatabaseMaxCounter(instance_id=instance_id, counter=1, partition=p)
+            for instance_id in list(client_fsic)[:250]
+            for p in ("filter", "other")
+        )
+        with CaptureQueriesContext(connection) as queries:
+            DatabaseMaxCounter.update_fsics(client_fsic, Filter("filter\nother"))
+        # rather than a query or two for each of the 1000 counters
+        self.assertLess(len(queries), 10)
+        self.assertEqual(DatabaseMaxCounter.objects.count(), 1000)
+        self.assertFalse(DatabaseMaxCounter.objects.exclude(counter=2).exists())
+
+    def test_update_counters(self):
+        DatabaseMaxCounter.objects.create(
+            instance_id="a" * 32, counter=4, partition=self.filter
+        )
+        DatabaseMaxCounter.update_counters(
+            {
+                ("a" * 32, self.filter): 2,
+                ("a" * 32, "other"): 2,
+                ("b" * 32, self.filter): 3,
+            }
+        )
+        self.assertEqual(
+            sorted(
+                DatabaseMaxCounter.objects.values_list(
+                    "instance_id", "partition", "counter"
+                )
+            ),
+            [
+                ("a" * 32, self.filter, 4),
+                ("a" * 32, "other", 2),
+                ("b" * 32, self.filter, 3),
+            ],
+        )
+
 
 class TransferSessionTestCase(TestCase):
     def setUp(self):
@@ -240,3 +388,37 @@ class TransferSessionAndStoreTestCase(TestCase):
 
     def test_get_touched_record_ids_for_model__string(self):
         self.assertEqual([self.user.id], list(self.instance.get_touched_record_ids_for_model(MyUser.morango_model_name)))
+
+
+class PrefetchForeignKeysTestCase(TestCase):
+    def setUp(self):
+        self.users = [MyUser.objects.create(username="user{}".format(i)) for i in range(3)]
+
+    def test_seeds_cache_for_existing_referents(self):
+        missing_id = "e" * 32
+        dict_models = [{"user_id": user.id} for user in self.users]
+        dict_models.append({"user_id": missing_id})
+        dict_models.append({"user_id": None})
+
+        fk_cache = {}
+        with self.assertNumQueries(1):
+            SummaryLog.prefetch_foreign_keys(dict_models, fk_cache)
+        field = SummaryLog._meta.get_field("user")
+        self.assertEqual(len(fk_cache), len(self.users))
+        for user in self.users:
+            self.assertIn(_fk_lookup_cache_key(field, user.id), fk_cache)
+        self.assertNotIn(_fk_lookup_cache_key(field, missing_id), fk_cache)
+
+        # cached referents are not checked again
+        with self.assertNumQueries(0):
+            SummaryLog.prefetch_foreign_keys(dict_models[:-2], fk_cache)
+
+    def test_validation_uses_prefetched_referents(self):
+        logs = [SummaryLog(user_id=user.id) for user in self.users]
+        fk_cache = {}
+        SummaryLog.prefetch_foreign_keys(
+            [log.serialize() for log in logs], fk_cache
+        )
+        with self.assertNumQueries(0):
+            for log in logs:
+                log.cached_clean_fields(fk_cache)
@@ -0,0 +1,120 @@
+import uuid
+from unittest import skipUnless
+
+from django.apps import apps
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from facility_profile.models import MyUser
+
+from morango.models.core import RecordMaxCounterBuffer
+from morango.models.indexes import AddSyncableModelIndexes
+from morango.sync.operations import DBBackend
+
+
+class AddSyncableModelIndexesTestCase(TestCase):
+    def setUp(self):
+        self.state = ProjectState.from_apps(apps)
+        self.operation = AddSyncableModelIndexes("myuser")
+
+    def get_index_columns(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, MyUser._meta.db_table
+            )
+        return {
+            name: constraint["columns"]
+            for name, constraint in constraints.items()
+            if "_morango_" in name
+        }
+
+    def test_forwards_and_backwards(self):
+        with connection.schema_editor() as editor:
+            self.operation.database_forwards(
+                "facility_profile", editor, self.state, self.state
+            )
+        columns = self.get_index_columns()
+        self.assertEqual(len(columns), 2)
+        self.assertIn(["_morango_partition"], columns.values())
+
+        with connection.schema_editor() as editor:
+            self.operation.database_backwards(
+                "facility_profile", editor, self.state, self.state
+            )
+        self.assertEqual(self.get_index_columns(), {})
+
+    def test_forwards_is_idempotent(self):
+        for _ in range(2):
+            with connection.schema_editor() as editor:
+                self.operation.database_forwards(
+                    "facility_profile", editor, self.state, self.state
+                )
+        self.assertEqual(len(self.get_index_columns()), 2)
+
+    def test_deconstruct(self):
+        self.assertEqual(
+            self.operation.deconstruct(),
+            ("AddSyncableModelIndexes", ["myuser"], {}),
+        )
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are specific to SQLite")
+class DequeueIndexesTestCase(TestCase):
+    def setUp(self):
+        self.transfer_session_id = uuid.uuid4().hex
+        with connection.cursor() as cursor:
+            DBBackend._dequeuing_create_actions_table(cursor)
+        self.rmcb_index = self.get_index_name(
+            RecordMaxCounterBuffer,
+            ["transfer_session_id", "model_uuid", "instance_id", "counter"],
+        )
+
+    def get_index_name(self, model, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        for name, constraint in constraints.items():
+            if constraint["index"] and constraint["columns"] == columns:
+                return name
+
+    def explain(self, method, *args):
+        with CaptureQueriesContext(connection) as queries:
+            with connection.cursor() as cursor:
+                method(cursor, *args)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN {}".format(queries[-1]["sql"]))
+            return "\n".join(row[-1] for row in cursor.fetchall())
+
+    def assert_searches_with_index(self, plan, table, index):
+        lines = [line for line in plan.splitlines() if " {} ".format(table) in line]
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertTrue(line.startswith("SEARCH"), line)
+            if index:
+                self.assertIn(index, line)
+
+    def test_classify_uses_indexes(self):
+        plan = self.explain(DBBackend._dequeuing_classify, self.transfer_session_id)
+        self.assert_searches_with_index(plan, "buffer", None)
+        self.assert_searches_with_index(plan, "store", None)
+        # the unique index on store model and instance ID
+        self.assert_searches_with_index(plan, "rmc", None)
+        self.assert_searches_with_index(plan, "rmcb", self.rmcb_index)
+
+    def test_insert_rmcb_uses_indexes(self):
+        plan = self.explain(DBBackend._dequeuing_insert_rmcb, self.transfer_session_id)
+        self.assert_searches_with_index(plan, "rmc", None)
+        self.assert_searches_with_index(plan, "rmcb", self.rmcb_index)
+
+    def test_delete_remaining_rmcb_uses_indexes(self):
+        plan = self.explain(
+            DBBackend._dequeuing_delete_remaining_rmcb,
+            self.transfer_session_id,
+            uuid.uuid4().hex,
+            uuid.uuid4().hex,
+        )
+        self.assert_searches_with_index(
+            plan, RecordMaxCounterBuffer._meta.db_table, self.rmcb_index
+        )
@@ -1,12 +1,20 @@
 import json
 import uuid
 import contextlib
+from multiprocessing.pool import ThreadPool
 
 import factory
 import mock
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import signals
 from django.test import SimpleTestCase
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from facility_profile.models import Facility
+from facility_profile.models import Folder
 from facility_profile.models import MyUser
 from facility_profile.models import SummaryLog
 from test.support import EnvironmentVarGuard
@@ -16,14 +24,19 @@ from ..helpers import TestSessionContext
 from morango.constants import transfer_stages
 from morango.constants import transfer_statuses
 from morango.models.certificates import Filter
+from morango.models.core import ChangeLog
 from morango.models.core import DeletedModels
 from morango.models.core import HardDeletedModels
 from morango.models.core import InstanceIDModel
 from morango.models.core import RecordMaxCounter
 from morango.models.core import Store
+from morango.registry import syncable_models
 from morango.sync.controller import _self_referential_fk
 from morango.sync.controller import MorangoProfileController
 from morango.sync.controller import SessionController
+from morango.sync.operations import _deserialize_from_store
+from morango.sync.operations import DBBackend
+from morango.sync.operations import _deserialize_level_in_parallel
 
 
 class FacilityModelFactory(factory.DjangoModelFactory):
@@ -91,6 +104,141 @@ class SerializeIntoStoreTestCase(TestCase):
         deserialized_model = json.loads(store_facility.serialized)
         self.assertEqual(deserialized_model["name"], self.new_name)
 
+    def test_store_models_get_updated_in_bulk(self):
+        [FacilityModelFactory() for _ in range(self.range)]
+        self.mc.serialize_into_store()
+
+        Facility.objects.update(name=self.new_name)
+        with CaptureQueriesContext(connection) as few_queries:
+            self.mc.serialize_into_store()
+
+        [FacilityModelFactory() for _ in range(self.range)]
+        self.mc.serialize_into_store()
+
+        Facility.objects.update(name=self.original_name)
+        with CaptureQueriesContext(connection) as many_queries:
+            self.mc.serialize_into_store()
+
+        # the number of queries should not depend on the number of updated records
+        self.assertEqual(len(few_queries), len(many_queries))
+        for store_facility in Store.objects.all():
+            deserialized_model = json.loads(store_facility.serialized)
+            self.assertEqual(deserialized_model["name"], self.original_name)
+            self.assertEqual(
+                RecordMaxCounter.objects.get(
+                    store_model_id=store_facility.id,
+                    instance_id=store_facility.last_saved_instance,
+                ).counter,
+                store_facility.last_saved_counter,
+            )
+
+    def test_store_models_get_updated_in_chunks(self):
+        [FacilityModelFactory() for _ in range(self.range)]
+        self.mc.serialize_into_store()
+        Facility.objects.update(name=self.new_name)
+
+        # only two store records fit in each query's parameters
+        max_query_params = 2 * len(Store._meta.concrete_fields)
+        with mock.patch.object(
+            DBBackend, "_max_query_params", return_value=max_query_params
+        ), CaptureQueriesContext(connection) as queries:
+            self.mc.serialize_into_store()
+
+        store_updates = [
+            query
+            for query in queries
+            if query["sql"].lstrip().startswith(
+                ("REPLACE INTO morango_store ", "UPDATE morango_store store")
+            )
+        ]
+        self.assertEqual(len(store_updates), self.range // 2)
+        for store_facility in Store.objects.all():
+            deserialized_model = json.loads(store_facility.serialized)
+            self.assertEqual(deserialized_model["name"], self.new_name)
+            self.assertEqual(
+                RecordMaxCounter.objects.get(
+                    store_model_id=store_facility.id,
+                    instance_id=store_facility.last_saved_instance,
+                ).counter,
+                store_facility.last_saved_counter,
+            )
+
+    def test_serialization_in_batches(self):
+        [FacilityModelFactory() for _ in range(self.range)]
+        with self.settings(MORANGO_SERIALIZE_BATCH_SIZE=3):
+            self.mc.serialize_into_store()
+        self.assertEqual(Store.objects.count(), self.range)
+        self.assertFalse(Facility.objects.filter(_morango_dirty_bit=True).exists())
+
+        Facility.objects.update(name=self.new_name)
+        with self.settings(MORANGO_SERIALIZE_BATCH_SIZE=3):
+            self.mc.serialize_into_store()
+        for store_facility in Store.objects.all():
+            deserialized_model = json.loads(store_facility.serialized)
+            self.assertEqual(deserialized_model["name"], self.new_name)
+        self.assertFalse(Facility.objects.filter(_morango_dirty_bit=True).exists())
+
+    def test_serialization_with_change_log(self):
+        with self.settings(MORANGO_ENABLE_CHANGE_LOG=True):
+            [FacilityModelFactory() for _ in range(self.range)]
+            # marked dirty without changing anything else is still logged
+            dirtied = FacilityModelFactory.build()
+            dirtied.save(update_dirty_bit_to=False)
+            Facility.objects.filter(id=dirtied.id).update(
+                update_dirty_bit_to=None, _morango_dirty_bit=True
+            )
+            self.mc.serialize_into_store()
+
+        self.assertEqual(Store.objects.count(), self.range + 1)
+        self.assertTrue(Store.objects.filter(id=dirtied.id).exists())
+        self.assertFalse(ChangeLog.objects.exists())
+
+    def test_serialization_with_change_log_seeds_dirty_models(self):
+        # dirty before the change log was enabled
+        fac = FacilityModelFactory()
+        user = MyUser.objects.create(username="deadbeef")
+        with self.settings(MORANGO_ENABLE_CHANGE_LOG=True):
+            self.assertFalse(ChangeLog.objects.exists())
+            self.mc.serialize_into_store()
+            self.assertTrue(Store.objects.filter(id=fac.id).exists())
+            self.assertTrue(Store.objects.filter(id=user.id).exists())
+
+            # once seeded, the dirty bits aren't scanned again
+            Facility.objects.filter(id=fac.id).update(
+                update_dirty_bit_to=None, _morango_dirty_bit=True
+            )
+            ChangeLog.objects.all().delete()
+            with mock.patch.object(
+                ChangeLog, "log_changes", wraps=ChangeLog.log_changes
+            ) as log_changes_mock:
+                self.mc.serialize_into_store()
+            log_changes_mock.assert_not_called()
+            self.assertTrue(Facility.objects.get(id=fac.id)._morango_dirty_bit)
+
+        # serializing with the change log disabled means it has to be seeded again
+        self.mc.serialize_into_store()
+        user.save(update_dirty_bit_to=False)
+        MyUser.objects.filter(id=user.id).update(
+            update_dirty_bit_to=None, _morango_dirty_bit=True, username="unlogged"
+        )
+        with self.settings(MORANGO_ENABLE_CHANGE_LOG=True):
+            self.mc.serialize_into_store()
+        self.assertIn("unlogged", Store.objects.get(id=user.id).serialized)
+
+    def test_filtered_serialization_with_change_log(self):
+        with self.settings(MORANGO_ENABLE_CHANGE_LOG=True):
+            fac = FacilityModelFactory()
+            user = MyUser.objects.create(username="deadbeef")
+            self.mc.serialize_into_store(filter=Filter(user._morango_partition))
+            self.assertTrue(Store.objects.filter(id=user.id).exists())
+            self.assertFalse(Store.objects.filter(id=fac.id).exists())
+            # change for app model outside of the filter is kept for a later serialization
+            self.assertFalse(ChangeLog.objects.filter(model_uuid=user.id).exists())
+            self.assertTrue(ChangeLog.objects.filter(model_uuid=fac.id).exists())
+            self.mc.serialize_into_store()
+            self.assertTrue(Store.objects.filter(id=fac.id).exists())
+            self.assertFalse(ChangeLog.objects.exists())
+
     def test_last_saved_counter_updates(self):
         FacilityModelFactory(name=self.original_name)
         self.mc.serialize_into_store()
@@ -420,6 +568,68 @@ class DeserializationFromStoreIntoAppTestCase(TestCase):
         self.mc.deserialize_from_store()
         self.assertFalse(Store.objects.filter(dirty_bit=True))
 
+    def test_foreign_keys_are_checked_in_bulk(self):
+        users = [MyUser.objects.create(username="user{}".format(i)) for i in range(5)]
+        logs = [SummaryLog.objects.create(user=user) for user in users for _ in range(2)]
+        self.mc.serialize_into_store()
+        SummaryLog.objects.all().delete()
+        DeletedModels.objects.all().delete()
+        Store.objects.filter(model_name="contentsummarylog").update(dirty_bit=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            _deserialize_from_store("facilitydata")
+        user_queries = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and "FROM \"{}\"".format(MyUser._meta.db_table) in query["sql"]
+        ]
+        self.assertEqual(len(user_queries), 1)
+        self.assertEqual(SummaryLog.objects.count(), len(logs))
+
+    def test_deserialization_errors_are_saved_in_bulk(self):
+        user = MyUser.objects.create(username="penguin")
+        logs = [SummaryLog.objects.create(user=user) for _ in range(20)]
+        self.mc.serialize_into_store()
+        Store.objects.update(dirty_bit=False)
+        for log in logs:
+            store_model = Store.objects.get(id=log.id)
+            data = json.loads(store_model.serialized)
+            data["user_id"] = uuid.uuid4().hex
+            store_model.serialized = json.dumps(data)
+            store_model.dirty_bit = True
+            store_model.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            _deserialize_from_store("facilitydata")
+        error_updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("UPDATE")
+            and "deserialization_error" in query["sql"]
+        ]
+        self.assertEqual(len(error_updates), 1)
+        for log in logs:
+            store_model = Store.objects.get(id=log.id)
+            self.assertTrue(store_model.dirty_bit)
+            self.assertIn("does not exist", store_model.deserialization_error)
+
+    @override_settings(MORANGO_DESERIALIZE_FK_CACHE_SIZE=2)
+    def test_foreign_key_cache_stats_are_logged(self):
+        users = [MyUser.objects.create(username="user{}".format(i)) for i in range(5)]
+        for user in users:
+            SummaryLog.objects.create(user=user)
+        self.mc.serialize_into_store()
+        Store.objects.update(dirty_bit=True)
+
+        with mock.patch("morango.sync.operations.logger") as logger:
+            _deserialize_from_store("facilitydata")
+        self.assertEqual(SummaryLog.objects.count(), len(users))
+        message = logger.info.call_args[0][0]
+        self.assertIn("foreign key cache", message)
+        # the cache is bounded, so prefetched referents get evicted
+        self.assertNotIn(" 0 evictions", message)
+
     def test_record_with_dirty_bit_off_doesnt_deserialize(self):
         st = Store.objects.first()
         st.dirty_bit = False
@@ -538,6 +748,94 @@ class DeserializationFromStoreIntoAppTestCase(TestCase):
         self.assertTrue(MyUser.objects.filter(username="changed").exists())
         self.assertFalse(MyUser.objects.filter(username="changed2").exists())
 
+    @override_settings(MORANGO_DESERIALIZE_WORKERS=4)
+    def test_deserialization_with_workers_in_transaction(self):
+        # within a transaction, deserialization can't be split across connections
+        with mock.patch(
+            "morango.sync.operations._deserialize_level_in_parallel"
+        ) as parallel_mock:
+            self.mc.deserialize_from_store()
+        parallel_mock.assert_not_called()
+        self.assertEqual(len(Facility.objects.all()), self.range)
+
+    def test_deserialize_level_in_parallel(self):
+        pool = ThreadPool(2)
+        fk_cache = {}
+        level = [Facility, MyUser]
+        try:
+            with mock.patch(
+                "morango.sync.operations._deserialize_model_from_store"
+            ) as deserialize_mock:
+                _deserialize_level_in_parallel(
+                    level, "facilitydata", fk_cache, pool, skip_erroring=True
+                )
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(deserialize_mock.call_count, 2)
+        for model in level:
+            deserialize_mock.assert_any_call(
+                model, "facilitydata", fk_cache, skip_erroring=True
+            )
+
+
+class ParallelDeserializationTestCase(TransactionTestCase):
+    def setUp(self):
+        InstanceIDModel.get_or_create_current_instance()
+        self.mc = MorangoProfileController("facilitydata")
+        self.saved_facilities = []
+        signals.post_save.connect(self._facility_saved, sender=Facility)
+
+    def tearDown(self):
+        signals.post_save.disconnect(self._facility_saved, sender=Facility)
+
+    def _facility_saved(self, instance, **kwargs):
+        self.saved_facilities.append(instance.id)
+
+    def _mark_dirty(self, instance):
+        Store.objects.filter(id=instance.id).update(
+            serialized=DjangoJSONEncoder().encode(instance.serialize()), dirty_bit=True
+        )
+
+    def test_deserialize_levels_in_parallel(self):
+        parent = Facility.objects.create(name="parent")
+        child = Facility.objects.create(name="child", parent=parent)
+        user = MyUser.objects.create(username="user", password="password")
+        log = SummaryLog.objects.create(user=user)
+        self.mc.serialize_into_store()
+
+        parent.name = "parent changed"
+        child.name = "child changed"
+        user.username = "user changed"
+        log.content_id = uuid.uuid4().hex
+        for instance in (parent, child, user, log):
+            self._mark_dirty(instance)
+
+        pre_save_receivers = list(signals.pre_save.receivers)
+        post_save_receivers = list(signals.post_save.receivers)
+        self.saved_facilities = []
+
+        pool = ThreadPool(2)
+        try:
+            for level in syncable_models.get_model_levels("facilitydata"):
+                _deserialize_level_in_parallel(level, "facilitydata", {}, pool)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+        self.assertEqual(Facility.objects.get(id=parent.id).name, "parent changed")
+        self.assertEqual(Facility.objects.get(id=child.id).name, "child changed")
+        self.assertEqual(MyUser.objects.get(id=user.id).username, "user changed")
+        self.assertEqual(SummaryLog.objects.get(id=log.id).content_id, log.content_id)
+
+        # signals were muted while deserializing, and are connected again afterwards
+        self.assertEqual(self.saved_facilities, [])
+        self.assertEqual(signals.pre_save.receivers, pre_save_receivers)
+        self.assertEqual(signals.post_save.receivers, post_save_receivers)
+        Facility.objects.create(name="after")
+        self.assertEqual(len(self.saved_facilities), 1)
+
 
 class SelfReferentialFKDeserializationTestCase(TestCase):
     def setUp(self):
@@ -634,6 +932,61 @@ class SelfReferentialFKDeserializationTestCase(TestCase):
         self.assertTrue(new_log.dirty_bit)
         self.assertIn("exist", new_log.deserialization_error)
 
+    def _create_folder_tree(self):
+        root = Folder.objects.create(name="root")
+        children = [Folder.objects.create(name="child", parent=root) for _ in range(3)]
+        grandchildren = [
+            Folder.objects.create(name="grandchild", parent=child)
+            for child in children
+            for _ in range(2)
+        ]
+        self.mc.serialize_into_store()
+        Folder.objects.all().delete()
+        DeletedModels.objects.all().delete()
+        Store.objects.update(dirty_bit=True, deleted=False)
+        return root, children, grandchildren
+
+    def test_self_ref_models_are_inserted_per_level(self):
+        root, children, grandchildren = self._create_folder_tree()
+        with CaptureQueriesContext(connection) as queries:
+            self.mc.deserialize_from_store()
+        folder_inserts = [
+            query
+            for query in queries.captured_queries
+            if "INTO {}".format(Folder._meta.db_table) in query["sql"]
+        ]
+        # one bulk insert per level of the tree
+        self.assertEqual(len(folder_inserts), 3)
+        self.assertFalse(Store.objects.filter(dirty_bit=True).exists())
+        for child in children:
+            self.assertEqual(Folder.objects.get(id=child.id).parent_id, root.id)
+        for grandchild in grandchildren:
+            self.assertEqual(
+                Folder.objects.get(id=grandchild.id).parent_id, grandchild.parent_id
+            )
+
+    def test_self_ref_descendants_of_invalid_model_are_not_deserialized(self):
+        root, children, grandchildren = self._create_folder_tree()
+        invalid_child = Store.objects.get(id=children[0].id)
+        data = json.loads(invalid_child.serialized)
+        data["name"] = "x" * 101
+        invalid_child.serialized = json.dumps(data)
+        invalid_child.save()
+
+        self.mc.deserialize_from_store()
+
+        invalid_child.refresh_from_db()
+        self.assertTrue(invalid_child.dirty_bit)
+        self.assertIn("name", invalid_child.deserialization_error)
+        for grandchild in grandchildren:
+            store_model = Store.objects.get(id=grandchild.id)
+            if grandchild.parent_id == invalid_child.id:
+                self.assertTrue(store_model.dirty_bit)
+                self.assertIn("dirty", store_model.deserialization_error)
+            else:
+                self.assertFalse(store_model.dirty_bit)
+                self.assertTrue(Folder.objects.filter(id=grandchild.id).exists())
+
 
 class SessionControllerTestCase(SimpleTestCase):
     def setUp(self):
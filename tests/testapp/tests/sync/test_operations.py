@@ -5,15 +5,18 @@ import factory
 from django.db import connection
 from django.test import TestCase
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import six
 from django.utils import timezone
 from facility_profile.models import Facility
 import mock
-import pytest
 
+from ..helpers import BufferFactory
 from ..helpers import create_buffer_and_store_dummy_data
 from ..helpers import create_dummy_store_data
+from ..helpers import StoreFactory
 from morango.constants import transfer_statuses
-from morango.errors import MorangoLimitExceeded
+from morango.constants.capabilities import KEYSET_BUFFER_PAGINATION
 from morango.models.core import Buffer
 from morango.models.core import DatabaseIDModel
 from morango.models.core import InstanceIDModel
@@ -22,8 +25,14 @@ from morango.models.core import RecordMaxCounterBuffer
 from morango.models.core import Store
 from morango.models.core import SyncSession
 from morango.models.core import TransferSession
+from morango.sync.backends.base import ACTIONS_TABLE
+from morango.sync.backends.base import FAST_FORWARD
+from morango.sync.backends.base import MERGE_CONFLICT
+from morango.sync.backends.base import REVERSE_FAST_FORWARD
+from morango.sync.backends.sqlite import _prefix_upper_bound
 from morango.sync.backends.utils import load_backend
 from morango.sync.context import LocalSessionContext
+from morango.sync.context import NetworkSessionContext
 from morango.sync.controller import MorangoProfileController
 from morango.sync.controller import SessionController
 from morango.sync.operations import _dequeue_into_store
@@ -33,6 +42,7 @@ from morango.sync.operations import ReceiverDequeueOperation
 from morango.sync.operations import ProducerDequeueOperation
 from morango.sync.operations import ReceiverDeserializeOperation
 from morango.sync.operations import InitializeOperation
+from morango.sync.operations import NetworkOperation
 from morango.sync.operations import ProducerQueueOperation
 from morango.sync.operations import ReceiverQueueOperation
 from morango.sync.syncsession import TransferClient
@@ -104,16 +114,15 @@ class QueueStoreIntoBufferTestCase(TestCase):
         self.assertRecordsBuffered(self.data["group1_c2"])
         self.assertRecordsBuffered(self.data["group2_c1"])
 
-    @pytest.mark.skip("Takes 30+ seconds, manual run only")
     def test_very_very_many_fsics(self):
         """
-        Regression test against 'Expression tree is too large (maximum depth 1000)' error with many fsics
-        Maximum supported value: 99,999
+        Regression test against 'Expression tree is too large (maximum depth 1000)' error with many fsics,
+        and against the previous limit of 100,000 fsics
         """
         fsics = {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}
         fsics.update({
             uuid.uuid4().hex: i
-            for i in range(99999)
+            for i in range(100000)
         })
         self.transfer_session.client_fsic = json.dumps(fsics)
         _queue_into_buffer(self.transfer_session)
@@ -122,16 +131,31 @@ class QueueStoreIntoBufferTestCase(TestCase):
         self.assertRecordsBuffered(self.data["group1_c2"])
         self.assertRecordsBuffered(self.data["group2_c1"])
 
-    def test_too_many_fsics(self):
+    def test_many_fsic_chunks_queue_rmcbs_once(self):
         fsics = {self.data["group1_id"].id: 1, self.data["group2_id"].id: 1}
-        fsics.update({
-            uuid.uuid4().hex: i
-            for i in range(100000)
-        })
+        fsics.update({uuid.uuid4().hex: i for i in range(1000)})
         self.transfer_session.client_fsic = json.dumps(fsics)
-        with self.assertRaises(MorangoLimitExceeded):
+        with mock.patch.object(
+            DBBackend.__class__, "_max_query_params", return_value=20
+        ), CaptureQueriesContext(connection) as queries:
             _queue_into_buffer(self.transfer_session)
 
+        rmcb_inserts = [
+            query
+            for query in queries.captured_queries
+            if RecordMaxCounterBuffer._meta.db_table in query["sql"]
+        ]
+        self.assertEqual(len(rmcb_inserts), 1)
+        self.assertRecordsBuffered(self.data["group1_c1"])
+        self.assertRecordsBuffered(self.data["group2_c1"])
+        # every record max counter of a queued record is queued exactly once
+        self.assertEqual(
+            RecordMaxCounterBuffer.objects.count(),
+            RecordMaxCounter.objects.filter(
+                store_model_id__in=Buffer.objects.values("model_uuid")
+            ).count(),
+        )
+
     def test_fsic_specific_id(self):
         fsics = {self.data["group2_id"].id: 1}
         self.transfer_session.client_fsic = json.dumps(fsics)
@@ -207,6 +231,36 @@ class QueueStoreIntoBufferTestCase(TestCase):
         # ensure that record with valid fsic but invalid partition is not buffered
         self.assertRecordsNotBuffered([self.data["user4"]])
 
+    def test_partition_prefix_filter(self):
+        Store.objects.all().delete()
+        partitions = ["ab", "abc", "abc:user", "abd", "b"]
+        for partition in partitions:
+            StoreFactory(
+                id=uuid.uuid4().hex,
+                partition=partition,
+                last_saved_instance=uuid.uuid4().hex,
+                last_saved_counter=1,
+            )
+        queryset = Store.objects.filter(DBBackend._prefix_filter("partition", "abc"))
+        self.assertEqual(
+            sorted(queryset.values_list("partition", flat=True)), ["abc", "abc:user"]
+        )
+
+    def test_partition_prefix_upper_bound(self):
+        self.assertEqual(_prefix_upper_bound("abc"), "abd")
+        self.assertEqual(_prefix_upper_bound("ab" + six.unichr(0x10FFFF)), "ac")
+        self.assertIsNone(_prefix_upper_bound(""))
+
+    def test_partition_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Store._meta.db_table
+            )
+        self.assertEqual(
+            constraints["morango_store_profile_partition"]["columns"],
+            ["profile", "partition"],
+        )
+
     def test_local_initialize_operation__server(self):
         self.transfer_session.active = False
         self.transfer_session.save()
@@ -330,40 +384,32 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         tagged_expected = set(store_ids)
         assert tagged_actual == tagged_expected
 
-    def test_dequeuing_delete_rmcb_records(self):
-        for i in self.data["model1_rmcb_ids"]:
-            self.assertTrue(
-                RecordMaxCounterBuffer.objects.filter(
-                    instance_id=i, model_uuid=self.data["model1"]
-                ).exists()
-            )
-        with connection.cursor() as cursor:
-            DBBackend._dequeuing_delete_rmcb_records(cursor, self.transfer_session.id)
-        for i in self.data["model1_rmcb_ids"]:
-            self.assertFalse(
-                RecordMaxCounterBuffer.objects.filter(
-                    instance_id=i, model_uuid=self.data["model1"]
-                ).exists()
-            )
-        # ensure other records were not deleted
-        for i in self.data["model2_rmcb_ids"]:
-            self.assertTrue(
-                RecordMaxCounterBuffer.objects.filter(
-                    instance_id=i, model_uuid=self.data["model2"]
-                ).exists()
-            )
-
-    def test_dequeuing_delete_buffered_records(self):
-        self.assertTrue(Buffer.objects.filter(model_uuid=self.data["model1"]).exists())
+    def classify(self):
         with connection.cursor() as cursor:
-            DBBackend._dequeuing_delete_buffered_records(
-                cursor, self.transfer_session.id
-            )
-        self.assertFalse(Buffer.objects.filter(model_uuid=self.data["model1"]).exists())
-        # ensure other records were not deleted
-        self.assertTrue(Buffer.objects.filter(model_uuid=self.data["model2"]).exists())
+            DBBackend._dequeuing_create_actions_table(cursor)
+            DBBackend._dequeuing_classify(cursor, self.transfer_session.id)
+            cursor.execute("SELECT model_uuid, action FROM {}".format(ACTIONS_TABLE))
+            return {uuid.UUID(str(m)).hex: action for m, action in cursor.fetchall()}
 
-    def test_dequeuing_merge_conflict_rmcb_greater_than_rmc(self):
+    def test_dequeuing_classify(self):
+        actions = self.classify()
+        self.assertEqual(
+            actions,
+            {
+                self.data["model1"]: REVERSE_FAST_FORWARD,
+                self.data["model2"]: MERGE_CONFLICT,
+                self.data["model3"]: FAST_FORWARD,
+                self.data["model4"]: FAST_FORWARD,
+                self.data["model5"]: MERGE_CONFLICT,
+                self.data["model7"]: MERGE_CONFLICT,
+            },
+        )
+
+    def test_dequeuing_create_actions_table_replaces_existing(self):
+        self.classify()
+        self.assertEqual(len(self.classify()), 6)
+
+    def test_dequeuing_insert_rmcb_greater_than_rmc(self):
         rmc = RecordMaxCounter.objects.get(
             instance_id=self.data["model2_rmc_ids"][0],
             store_model_id=self.data["model2"],
@@ -373,8 +419,9 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         )
         self.assertNotEqual(rmc.counter, rmcb.counter)
         self.assertGreaterEqual(rmcb.counter, rmc.counter)
+        self.classify()
         with connection.cursor() as cursor:
-            DBBackend._dequeuing_merge_conflict_rmcb(cursor, self.transfer_session.id)
+            DBBackend._dequeuing_insert_rmcb(cursor, self.transfer_session.id)
         rmc = RecordMaxCounter.objects.get(
             instance_id=self.data["model2_rmc_ids"][0],
             store_model_id=self.data["model2"],
@@ -383,8 +430,15 @@ class DequeueBufferIntoStoreTestCase(TestCase):
             instance_id=self.data["model2_rmc_ids"][0], model_uuid=self.data["model2"]
         )
         self.assertEqual(rmc.counter, rmcb.counter)
+        # counters of instances new to the record are added
+        self.assertTrue(
+            RecordMaxCounter.objects.filter(
+                instance_id=self.data["model2_rmcb_ids"][1],
+                store_model_id=self.data["model2"],
+            ).exists()
+        )
 
-    def test_dequeuing_merge_conflict_rmcb_less_than_rmc(self):
+    def test_dequeuing_insert_rmcb_less_than_rmc(self):
         rmc = RecordMaxCounter.objects.get(
             instance_id=self.data["model5_rmc_ids"][0],
             store_model_id=self.data["model5"],
@@ -394,8 +448,9 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         )
         self.assertNotEqual(rmc.counter, rmcb.counter)
         self.assertGreaterEqual(rmc.counter, rmcb.counter)
+        self.classify()
         with connection.cursor() as cursor:
-            DBBackend._dequeuing_merge_conflict_rmcb(cursor, self.transfer_session.id)
+            DBBackend._dequeuing_insert_rmcb(cursor, self.transfer_session.id)
         rmc = RecordMaxCounter.objects.get(
             instance_id=self.data["model5_rmc_ids"][0],
             store_model_id=self.data["model5"],
@@ -406,11 +461,38 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         self.assertNotEqual(rmc.counter, rmcb.counter)
         self.assertGreaterEqual(rmc.counter, rmcb.counter)
 
+    def test_dequeuing_insert_rmcb_fast_forward(self):
+        for i in self.data["model4_rmcb_ids"]:
+            self.assertFalse(
+                RecordMaxCounter.objects.filter(
+                    instance_id=i, store_model_id=self.data["model4"]
+                ).exists()
+            )
+        self.classify()
+        with connection.cursor() as cursor:
+            DBBackend._dequeuing_insert_fast_forward_buffer(
+                cursor, self.transfer_session.id
+            )
+            DBBackend._dequeuing_insert_rmcb(cursor, self.transfer_session.id)
+        for i in self.data["model4_rmcb_ids"]:
+            self.assertTrue(
+                RecordMaxCounter.objects.filter(
+                    instance_id=i, store_model_id=self.data["model4"]
+                ).exists()
+            )
+        # reverse fast-forwards are left alone
+        self.assertFalse(
+            RecordMaxCounter.objects.filter(
+                instance_id=self.data["model1_rmcb_ids"][1]
+            ).exists()
+        )
+
     def test_dequeuing_merge_conflict_buffer_rmcb_greater_than_rmc(self):
         store = Store.objects.get(id=self.data["model2"])
         self.assertNotEqual(store.last_saved_instance, self.current_id.id)
         self.assertEqual(store.conflicting_serialized_data, "store")
         self.assertFalse(store.deleted)
+        self.classify()
         with connection.cursor() as cursor:
             current_id = InstanceIDModel.get_current_instance_and_increment_counter()
             DBBackend._dequeuing_merge_conflict_buffer(
@@ -426,6 +508,7 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         store = Store.objects.get(id=self.data["model5"])
         self.assertNotEqual(store.last_saved_instance, self.current_id.id)
         self.assertEqual(store.conflicting_serialized_data, "store")
+        self.classify()
         with connection.cursor() as cursor:
             current_id = InstanceIDModel.get_current_instance_and_increment_counter()
             DBBackend._dequeuing_merge_conflict_buffer(
@@ -435,11 +518,15 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         self.assertEqual(store.last_saved_instance, current_id.id)
         self.assertEqual(store.last_saved_counter, current_id.counter)
         self.assertEqual(store.conflicting_serialized_data, "buffer\nstore")
+        # fast-forwards are left alone
+        store = Store.objects.get(id=self.data["model3"])
+        self.assertNotEqual(store.last_saved_instance, current_id.id)
 
     def test_dequeuing_merge_conflict_hard_delete(self):
         store = Store.objects.get(id=self.data["model7"])
         self.assertEqual(store.serialized, "store")
         self.assertEqual(store.conflicting_serialized_data, "store")
+        self.classify()
         with connection.cursor() as cursor:
             current_id = InstanceIDModel.get_current_instance_and_increment_counter()
             DBBackend._dequeuing_merge_conflict_buffer(
@@ -453,82 +540,36 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         self.assertFalse(
             RecordMaxCounter.objects.filter(instance_id=self.current_id.id).exists()
         )
+        self.classify()
         with connection.cursor() as cursor:
             current_id = InstanceIDModel.get_current_instance_and_increment_counter()
             DBBackend._dequeuing_update_rmcs_last_saved_by(
                 cursor, current_id, self.transfer_session.id
             )
-        self.assertTrue(
-            RecordMaxCounter.objects.filter(instance_id=current_id.id).exists()
-        )
-
-    def test_dequeuing_delete_mc_buffer(self):
-        self.assertTrue(Buffer.objects.filter(model_uuid=self.data["model2"]).exists())
-        with connection.cursor() as cursor:
-            DBBackend._dequeuing_delete_mc_buffer(cursor, self.transfer_session.id)
-        self.assertFalse(Buffer.objects.filter(model_uuid=self.data["model2"]).exists())
-        # ensure other records were not deleted
-        self.assertTrue(Buffer.objects.filter(model_uuid=self.data["model3"]).exists())
-
-    def test_dequeuing_delete_mc_rmcb(self):
-        self.assertTrue(
-            RecordMaxCounterBuffer.objects.filter(
-                model_uuid=self.data["model2"],
-                instance_id=self.data["model2_rmcb_ids"][0],
-            ).exists()
-        )
-        with connection.cursor() as cursor:
-            DBBackend._dequeuing_delete_mc_rmcb(cursor, self.transfer_session.id)
-        self.assertFalse(
-            RecordMaxCounterBuffer.objects.filter(
-                model_uuid=self.data["model2"],
-                instance_id=self.data["model2_rmcb_ids"][0],
-            ).exists()
-        )
-        self.assertTrue(
-            RecordMaxCounterBuffer.objects.filter(
-                model_uuid=self.data["model2"],
-                instance_id=self.data["model2_rmcb_ids"][1],
-            ).exists()
-        )
-        # ensure other records were not deleted
-        self.assertTrue(
-            RecordMaxCounterBuffer.objects.filter(
-                model_uuid=self.data["model3"],
-                instance_id=self.data["model3_rmcb_ids"][0],
-            ).exists()
+        self.assertEqual(
+            set(
+                RecordMaxCounter.objects.filter(instance_id=current_id.id).values_list(
+                    "store_model_id", flat=True
+                )
+            ),
+            {self.data["model2"], self.data["model5"], self.data["model7"]},
         )
 
-    def test_dequeuing_insert_remaining_buffer(self):
+    def test_dequeuing_insert_fast_forward_buffer(self):
         self.assertNotEqual(
             Store.objects.get(id=self.data["model3"]).serialized, "buffer"
         )
         self.assertFalse(Store.objects.filter(id=self.data["model4"]).exists())
+        self.classify()
         with connection.cursor() as cursor:
-            DBBackend._dequeuing_insert_remaining_buffer(
+            DBBackend._dequeuing_insert_fast_forward_buffer(
                 cursor, self.transfer_session.id
             )
         self.assertEqual(Store.objects.get(id=self.data["model3"]).serialized, "buffer")
         self.assertTrue(Store.objects.filter(id=self.data["model4"]).exists())
-
-    def test_dequeuing_insert_remaining_rmcb(self):
-        for i in self.data["model4_rmcb_ids"]:
-            self.assertFalse(
-                RecordMaxCounter.objects.filter(
-                    instance_id=i, store_model_id=self.data["model4"]
-                ).exists()
-            )
-        with connection.cursor() as cursor:
-            DBBackend._dequeuing_insert_remaining_buffer(
-                cursor, self.transfer_session.id
-            )
-            DBBackend._dequeuing_insert_remaining_rmcb(cursor, self.transfer_session.id)
-        for i in self.data["model4_rmcb_ids"]:
-            self.assertTrue(
-                RecordMaxCounter.objects.filter(
-                    instance_id=i, store_model_id=self.data["model4"]
-                ).exists()
-            )
+        # reverse fast-forwards and merge conflicts are left alone
+        self.assertEqual(Store.objects.get(id=self.data["model1"]).serialized, "store")
+        self.assertEqual(Store.objects.get(id=self.data["model2"]).serialized, "store")
 
     def test_dequeuing_delete_remaining_rmcb(self):
         self.assertTrue(
@@ -639,6 +680,116 @@ class DequeueBufferIntoStoreTestCase(TestCase):
             ).exists()
         )
 
+    def test_dequeue_into_store_statements_independent_of_buffer_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            _dequeue_into_store(self.transfer_session)
+        expected_queries = len(queries)
+
+        records = []
+        for _ in range(5):
+            records.append(create_buffer_and_store_dummy_data(self.transfer_session.id))
+        with CaptureQueriesContext(connection) as queries:
+            _dequeue_into_store(self.transfer_session)
+        self.assertEqual(len(queries), expected_queries)
+
+        current_id = InstanceIDModel.get_or_create_current_instance()[0]
+        for data in records:
+            self.assertEqual(Store.objects.get(id=data["model1"]).serialized, "store")
+            self.assertEqual(
+                Store.objects.get(id=data["model2"]).last_saved_instance,
+                current_id.id,
+            )
+            self.assertEqual(Store.objects.get(id=data["model3"]).serialized, "buffer")
+            self.assertTrue(Store.objects.filter(id=data["model4"]).exists())
+        self.assertFalse(
+            Buffer.objects.filter(transfer_session_id=self.transfer_session.id).exists()
+        )
+
+    def assert_dequeued(self):
+        self.assertEqual(Store.objects.get(id=self.data["model1"]).serialized, "store")
+        self.assertEqual(
+            Store.objects.get(id=self.data["model2"]).conflicting_serialized_data,
+            "buffer\nstore",
+        )
+        self.assertEqual(Store.objects.get(id=self.data["model3"]).serialized, "buffer")
+        self.assertTrue(Store.objects.filter(id=self.data["model4"]).exists())
+        self.assertTrue(
+            RecordMaxCounter.objects.filter(
+                instance_id=self.data["model5_rmcb_ids"][1]
+            ).exists()
+        )
+        self.assertFalse(
+            Buffer.objects.filter(transfer_session_id=self.transfer_session.id).exists()
+        )
+        self.assertFalse(
+            RecordMaxCounterBuffer.objects.filter(
+                transfer_session_id=self.transfer_session.id
+            ).exists()
+        )
+        # ensure a record with different transfer session id is not affected
+        self.assertTrue(
+            Buffer.objects.filter(transfer_session_id=self.data["tfs_id"]).exists()
+        )
+
+    def test_dequeue_into_store_in_chunks(self):
+        _dequeue_into_store(self.transfer_session, chunk_size=2)
+        self.assert_dequeued()
+        self.transfer_session.refresh_from_db()
+        self.assertEqual(self.transfer_session.records_dequeued, 6)
+        self.assertIsNotNone(self.transfer_session.dequeue_cursor)
+
+    def test_dequeue_into_store_in_chunks__resume(self):
+        model_uuids = sorted(
+            Buffer.objects.filter(
+                transfer_session_id=self.transfer_session.id
+            ).values_list("model_uuid", flat=True)
+        )
+        with mock.patch(
+            "morango.sync.operations._dequeue_buffers",
+            side_effect=[2, Exception("interrupted")],
+        ):
+            with self.assertRaises(Exception):
+                _dequeue_into_store(self.transfer_session, chunk_size=2)
+
+        self.transfer_session.refresh_from_db()
+        self.assertEqual(self.transfer_session.records_dequeued, 2)
+        self.assertEqual(self.transfer_session.dequeue_cursor, model_uuids[1])
+
+        with mock.patch(
+            "morango.sync.operations._dequeue_buffers", return_value=2
+        ) as mock_dequeue:
+            _dequeue_into_store(self.transfer_session, chunk_size=2)
+        # resumes after the last completed chunk
+        self.assertEqual(
+            [c[1] for c in mock_dequeue.call_args_list],
+            [
+                dict(after=model_uuids[1], upto=model_uuids[3]),
+                dict(after=model_uuids[3], upto=model_uuids[5]),
+            ],
+        )
+
+    def test_dequeue_into_store_in_chunks__interrupted(self):
+        with mock.patch(
+            "morango.sync.operations.InstanceIDModel.get_current_instance_and_increment_counter",
+            side_effect=[
+                InstanceIDModel.get_current_instance_and_increment_counter(),
+                Exception("interrupted"),
+            ],
+        ):
+            with self.assertRaises(Exception):
+                _dequeue_into_store(self.transfer_session, chunk_size=3)
+        self.transfer_session.refresh_from_db()
+        self.assertEqual(self.transfer_session.records_dequeued, 3)
+        self.assertEqual(
+            Buffer.objects.filter(transfer_session_id=self.transfer_session.id).count(),
+            3,
+        )
+
+        _dequeue_into_store(self.transfer_session, chunk_size=3)
+        self.assert_dequeued()
+        self.transfer_session.refresh_from_db()
+        self.assertEqual(self.transfer_session.records_dequeued, 6)
+
     def test_local_dequeue_operation(self):
         self.transfer_session.records_transferred = 1
         self.context.filter = [self.transfer_session.filter]
@@ -689,3 +840,56 @@ class DequeueBufferIntoStoreTestCase(TestCase):
         self.assertFalse(
             RecordMaxCounterBuffer.objects.filter(transfer_session_id=self.transfer_session.id).exists()
         )
+
+
+class NetworkPullCursorTestCase(TestCase):
+    def setUp(self):
+        super(NetworkPullCursorTestCase, self).setUp()
+        session = SyncSession.objects.create(
+            id=uuid.uuid4().hex, profile="", last_activity_timestamp=timezone.now()
+        )
+        self.transfer_session = TransferSession.objects.create(
+            id=uuid.uuid4().hex,
+            sync_session=session,
+            push=False,
+            last_activity_timestamp=timezone.now(),
+        )
+        self.context = mock.Mock(
+            spec=NetworkSessionContext,
+            transfer_session=self.transfer_session,
+            capabilities=[KEYSET_BUFFER_PAGINATION],
+        )
+        self.operation = NetworkOperation()
+
+    def test_cursor_without_keyset_pagination(self):
+        self.context.capabilities = []
+        self.assertIsNone(self.operation._get_pull_cursor(self.context))
+
+    def test_cursor_without_buffers(self):
+        self.assertEqual("", self.operation._get_pull_cursor(self.context))
+
+    def test_cursor_is_greatest_buffered_model_uuid(self):
+        model_uuids = sorted(uuid.uuid4().hex for _ in range(3))
+        for model_uuid in model_uuids:
+            BufferFactory(
+                model_uuid=model_uuid,
+                transfer_session=self.transfer_session,
+                last_saved_instance=uuid.uuid4().hex,
+                last_saved_counter=1,
+            )
+        # buffers of other transfer sessions are ignored
+        other_session = TransferSession.objects.create(
+            id=uuid.uuid4().hex,
+            sync_session=self.transfer_session.sync_session,
+            push=False,
+            last_activity_timestamp=timezone.now(),
+        )
+        BufferFactory(
+            model_uuid="f" * 32,
+            transfer_session=other_session,
+            last_saved_instance=uuid.uuid4().hex,
+            last_saved_counter=1,
+        )
+        self.assertEqual(
+            model_uuids[-1], self.operation._get_pull_cursor(self.context)
+        )
@@ -1,7 +1,10 @@
+import gzip
+import io
 import json
 import uuid
 
 import mock
+from django.test import SimpleTestCase
 from django.test.testcases import LiveServerTestCase
 from django.test.utils import override_settings
 from requests.exceptions import HTTPError
@@ -26,6 +29,7 @@ from morango.sync.controller import MorangoProfileController
 from morango.sync.context import LocalSessionContext
 from morango.sync.context import NetworkSessionContext
 from morango.sync.session import SessionWrapper
+from morango.sync.syncsession import iter_compressed_json
 from morango.sync.syncsession import NetworkSyncConnection
 from morango.sync.syncsession import TransferClient
 from morango.sync.syncsession import PullClient
@@ -48,6 +52,26 @@ def mock_patch_decorator(func):
     return wrapper
 
 
+class IterCompressedJSONTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = [
+            {"model_uuid": uuid.uuid4().hex, "serialized": u"unicode \u00e9" * 10}
+            for _ in range(100)
+        ]
+
+    @mock.patch("morango.sync.syncsession.COMPRESS_BUFFER_SIZE", 100)
+    def test_gzip(self):
+        pieces = list(iter_compressed_json(self.data, compresslevel=1))
+        self.assertGreater(len(pieces), 1)
+        with gzip.GzipFile(fileobj=io.BytesIO(b"".join(pieces))) as f:
+            self.assertEqual(self.data, json.loads(f.read().decode("utf-8")))
+
+    def test_same_json_as_dumps(self):
+        compressed = b"".join(iter_compressed_json(self.data))
+        with gzip.GzipFile(fileobj=io.BytesIO(compressed)) as f:
+            self.assertEqual(json.dumps(self.data), f.read().decode("utf-8"))
+
+
 class NetworkSyncConnectionTestCase(LiveServerTestCase):
     def setUp(self):
         super(NetworkSyncConnectionTestCase, self).setUp()
@@ -1,10 +1,40 @@
 import mock
 from django.test import TestCase
 
+from morango.sync.utils import ChunkSizeController
 from morango.sync.utils import SyncSignal
 from morango.sync.utils import SyncSignalGroup
 
 
+class ChunkSizeControllerTestCase(TestCase):
+    def setUp(self):
+        self.controller = ChunkSizeController(10, 1000, 2.0, smoothing=1)
+
+    def test_grows_toward_target_latency(self):
+        # 100 records in 1 second, so 200 records should take 2
+        self.assertEqual(200, self.controller.update(100, 100, 1.0, 5000))
+        self.assertEqual(5000, self.controller.bytes_per_second)
+
+    def test_shrinks_toward_target_latency(self):
+        # 100 records in 5 seconds, so 40 records should take 2
+        self.assertEqual(50, self.controller.update(100, 100, 5.0, 5000))
+        self.assertEqual(40, self.controller.update(50, 50, 2.5, 2500))
+
+    def test_bounds(self):
+        self.assertEqual(1000, self.controller.update(800, 800, 0.1, 5000))
+        self.assertEqual(10, self.controller.update(15, 15, 60.0, 5000))
+
+    def test_smoothing(self):
+        controller = ChunkSizeController(10, 1000, 2.0, smoothing=0.5)
+        self.assertEqual(200, controller.update(100, 100, 1.0, 5000))
+        # averages 0.01 and 0.03 seconds per record
+        self.assertEqual(100, controller.update(200, 200, 6.0, 5000))
+
+    def test_no_measurement(self):
+        self.assertEqual(100, self.controller.update(100, 0, 1.0, 0))
+        self.assertEqual(100, self.controller.update(100, 100, 0, 0))
+
+
 class SyncSignalTestCase(TestCase):
     def test_defaults(self):
         signaler = SyncSignal(this_is_a_default=True)
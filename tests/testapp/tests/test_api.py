@@ -1,17 +1,24 @@
 import base64
+import copy
+import io
 import json
 import sys
 import uuid
+import zlib
 
 import mock
 from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase
 from django.test.utils import override_settings
 from django.urls.exceptions import NoReverseMatch
 from django.utils import timezone
 from facility_profile.models import MyUser
+from rest_framework.exceptions import ParseError
 from rest_framework.test import APITestCase as BaseTestCase
 from test.support import EnvironmentVarGuard
 
+from morango.api import compact
+from morango.api.parsers import GzipParser
 from morango.api.serializers import BufferSerializer
 from morango.api.serializers import CertificateSerializer
 from morango.api.serializers import InstanceIDSerializer
@@ -30,6 +37,7 @@ from morango.models.core import TransferSession
 from morango.models.fields.crypto import SharedKey
 from morango.registry import syncable_models
 from morango.sync.syncsession import compress_string
+from morango.sync.syncsession import iter_compressed_json
 from morango.sync.utils import validate_and_create_buffer_data
 
 if sys.version_info >= (3,):
@@ -942,12 +950,95 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
             [rec_1, rec_2, rec_3], expected_status=201, gzip=True
         )
 
+    def test_push_valid_incrementally_gzipped_buffer_chunk(self):
+        rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
+        rec_2 = self.build_buffer_item(
+            serialized=u"unicode \u00e9", transfer_session=rec_1.transfer_session
+        )
+        data = BufferSerializer([rec_1, rec_2], many=True).data
+        Buffer.objects.all().delete()
+        RecordMaxCounterBuffer.objects.all().delete()
+
+        with mock.patch("morango.api.parsers.READ_SIZE", 16):
+            response = self.client.post(
+                reverse("buffers-list"),
+                b"".join(iter_compressed_json(data)),
+                content_type="application/gzip",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Buffer.objects.count(), 2)
+        buffer = Buffer.objects.get(model_uuid=rec_2.model_uuid)
+        self.assertEqual(u"unicode \u00e9", buffer.serialized)
+
+    def test_push_valid_compact_buffer_chunk(self):
+        rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
+        rec_2 = self.build_buffer_item(
+            serialized=u"unicode \u00e9", transfer_session=rec_1.transfer_session
+        )
+        data = BufferSerializer([rec_1, rec_2], many=True).data
+        Buffer.objects.all().delete()
+        RecordMaxCounterBuffer.objects.all().delete()
+
+        response = self.client.post(
+            reverse("buffers-list"),
+            compact.dumps(data),
+            content_type=compact.MEDIA_TYPE,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Buffer.objects.count(), 2)
+        self.assertEqual(RecordMaxCounterBuffer.objects.count(), 6)
+
+    def test_push_malformed_compact_buffer_chunk(self):
+        response = self.client.post(
+            reverse("buffers-list"), b"not compact", content_type=compact.MEDIA_TYPE
+        )
+        self.assertEqual(response.status_code, 400)
+
     def test_push_valid_buffer_chunk(self):
         rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
         rec_2 = self.build_buffer_item(transfer_session=rec_1.transfer_session)
         rec_3 = self.build_buffer_item(transfer_session=rec_1.transfer_session)
         self.make_buffer_post_request([rec_1, rec_2, rec_3], expected_status=201)
 
+    def test_push_interleaved_buffer_chunks(self):
+        rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
+        transfer_session = rec_1.transfer_session
+        rec_2 = self.build_buffer_item(transfer_session=transfer_session)
+        rec_3 = self.build_buffer_item(transfer_session=transfer_session)
+        rec_4 = self.build_buffer_item(transfer_session=transfer_session)
+        first_chunk = BufferSerializer([rec_1, rec_2], many=True).data
+        second_chunk = BufferSerializer([rec_3, rec_4], many=True).data
+        Buffer.objects.all().delete()
+        RecordMaxCounterBuffer.objects.all().delete()
+
+        client = self.client
+        update_state = TransferSession.update_state
+        update_calls = []
+        second_responses = []
+
+        def _update_state(transfer_session, stage=None, stage_status=None):
+            update_calls.append(stage_status)
+            # the second chunk is received after the first one was buffered, but before the
+            # first request saves the result of its stage
+            if len(update_calls) == 2:
+                second_responses.append(
+                    client.post(reverse("buffers-list"), second_chunk, format="json")
+                )
+            update_state(transfer_session, stage=stage, stage_status=stage_status)
+
+        with mock.patch.object(
+            TransferSession, "update_state", autospec=True, side_effect=_update_state
+        ):
+            response = self.client.post(
+                reverse("buffers-list"), first_chunk, format="json"
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(second_responses[0].status_code, 201)
+        self.assertEqual(Buffer.objects.count(), 4)
+        transfer_session.refresh_from_db()
+        self.assertEqual(transfer_session.records_transferred, 4)
+
     def test_push_with_invalid_model_uuid(self):
         rec_1 = self.build_buffer_item(push=True, filter=self.default_push_filter)
         rec_2 = self.build_buffer_item(
@@ -1054,12 +1145,83 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
 
             return data
 
+    def test_serialize_many_buffers_in_bulk(self):
+        transfer_session_id = self.create_records_for_pulling(count=5)
+        buffers = Buffer.objects.filter(transfer_session_id=transfer_session_id)
+
+        expected = [json.loads(json.dumps(BufferSerializer(b).data)) for b in buffers]
+        # one query for the buffers and one for all of their record max counter buffers
+        with self.assertNumQueries(2):
+            data = BufferSerializer(buffers.all(), many=True).data
+        data = json.loads(json.dumps(data))
+
+        for record in expected + data:
+            record["rmcb_list"].sort(key=lambda rmcb: rmcb["instance_id"])
+        self.assertEqual(expected, data)
+        # field order is preserved too
+        self.assertEqual(
+            [list(record) for record in expected], [list(record) for record in data]
+        )
+
+    def test_validate_buffer_data_in_place(self):
+        transfer_session_id = self.create_records_for_pulling(count=5)
+        transfer_session = TransferSession.objects.get(id=transfer_session_id)
+        buffers = Buffer.objects.filter(transfer_session_id=transfer_session_id)
+        data = json.loads(json.dumps(BufferSerializer(buffers, many=True).data))
+        expected = copy.deepcopy(data)
+        buffers.delete()
+        RecordMaxCounterBuffer.objects.filter(
+            transfer_session_id=transfer_session_id
+        ).delete()
+
+        with mock.patch.object(
+            TransferSession, "get_filter", wraps=transfer_session.get_filter
+        ) as mock_get_filter:
+            validate_and_create_buffer_data(data, transfer_session)
+
+        mock_get_filter.assert_called_once_with()
+        self.assertEqual(expected, data)
+        self.assertEqual(5, buffers.count())
+        self.assertEqual(
+            15,
+            RecordMaxCounterBuffer.objects.filter(
+                transfer_session_id=transfer_session_id
+            ).count(),
+        )
+
     def test_pull_valid_buffer_list(self):
 
         transfer_session_id = self.create_records_for_pulling()
 
         self.make_buffer_get_request(transfer_session_id=transfer_session_id)
 
+    def test_pull_compact_buffer_list(self):
+        transfer_session_id = self.create_records_for_pulling()
+        params = {"transfer_session_id": transfer_session_id, "after": ""}
+
+        expected = json.loads(
+            self.client.get(reverse("buffers-list"), params).content.decode()
+        )["results"]
+        response = self.client.get(
+            reverse("buffers-list"), params, HTTP_ACCEPT=compact.MEDIA_TYPE
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], compact.MEDIA_TYPE)
+
+        data = compact.loads(response.content)
+        for record in expected + data:
+            record["rmcb_list"].sort(key=lambda rmcb: rmcb["instance_id"])
+        self.assertEqual(expected, data)
+
+    def test_pull_compact_error_is_json(self):
+        self.create_records_for_pulling()
+        response = self.client.get(
+            reverse("buffers-list"), HTTP_ACCEPT=compact.MEDIA_TYPE
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response["Content-Type"], "application/json")
+        json.loads(response.content.decode())
+
     def test_pull_fails_when_transfer_session_id_not_specified(self):
 
         self.create_records_for_pulling()
@@ -1123,6 +1285,126 @@ class BufferEndpointTestCase(CertificateTestCaseMixin, APITestCase):
             expected_count=2,
         )
 
+    def test_pull_by_keyset_works(self):
+
+        transfer_session_id = self.create_records_for_pulling(count=5)
+        model_uuids = sorted(
+            Buffer.objects.filter(transfer_session_id=transfer_session_id).values_list(
+                "model_uuid", flat=True
+            )
+        )
+
+        data = self.make_buffer_get_request(
+            transfer_session_id=transfer_session_id,
+            limit=3,
+            after="",
+            expected_count=3,
+        )
+        self.assertEqual(model_uuids[:3], [d["model_uuid"] for d in data])
+
+        data = self.make_buffer_get_request(
+            transfer_session_id=transfer_session_id,
+            limit=3,
+            after=model_uuids[2],
+            expected_count=2,
+        )
+        self.assertEqual(model_uuids[3:], [d["model_uuid"] for d in data])
+
+
+class CompactEncodingTestCase(APITestCase):
+    def setUp(self):
+        transfer_session_id = uuid.uuid4().hex
+        instance_id = uuid.uuid4().hex
+        self.data = []
+        for i in range(3):
+            model_uuid = uuid.uuid4().hex
+            self.data.append(
+                {
+                    "serialized": u'{"title": "unicode \u00e9"}',
+                    "deleted": i == 1,
+                    "last_saved_instance": instance_id,
+                    "last_saved_counter": 2 ** 40 + i,
+                    "hard_deleted": i == 2,
+                    "partition": "abc:def",
+                    "source_id": uuid.uuid4().hex,
+                    "model_name": "facility",
+                    "conflicting_serialized_data": "" if i else None,
+                    "model_uuid": model_uuid,
+                    "transfer_session": transfer_session_id,
+                    "profile": "facilitydata",
+                    "rmcb_list": [
+                        {
+                            "transfer_session": transfer_session_id,
+                            "model_uuid": model_uuid,
+                            "instance_id": instance_id,
+                            "counter": i,
+                        }
+                    ],
+                    "_self_ref_fk": None if i else uuid.uuid4().hex,
+                }
+            )
+
+    def test_round_trip(self):
+        self.assertEqual(self.data, compact.loads(compact.dumps(self.data)))
+        self.assertEqual([], compact.loads(compact.dumps([])))
+
+    def test_smaller_than_gzipped_json(self):
+        data = self.data * 100
+        self.assertLess(
+            len(compact.dumps(data)), len(b"".join(iter_compressed_json(data)))
+        )
+
+    def test_malformed(self):
+        encoded = compact.dumps(self.data)
+        with self.assertRaises(compact.CompactFormatError):
+            compact.loads(encoded[:-5])
+        with self.assertRaises(compact.CompactFormatError):
+            compact.loads(zlib.compress(b"XXXX"))
+        with self.assertRaises(compact.CompactFormatError):
+            compact.loads(zlib.compress(b"MRGB\x02"))
+
+
+class GzipParserTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = [
+            {"serialized": u"unicode \u00e9 " * 50, "model_uuid": uuid.uuid4().hex}
+            for _ in range(100)
+        ]
+
+    def parse(self, body):
+        return GzipParser().parse(io.BytesIO(compress_string(body)))
+
+    @mock.patch("morango.api.parsers.READ_SIZE", 64)
+    def test_parse_array_incrementally(self):
+        text = json.dumps(self.data)
+        decoded_lengths = []
+
+        class RecordingJSONDecoder(json.JSONDecoder):
+            def raw_decode(self, s, *args, **kwargs):
+                decoded_lengths.append(len(s))
+                return super(RecordingJSONDecoder, self).raw_decode(s, *args, **kwargs)
+
+        with mock.patch(
+            "morango.api.parsers.json.JSONDecoder", RecordingJSONDecoder
+        ), mock.patch("morango.api.parsers.json.loads") as loads_mock:
+            parsed = self.parse(text.encode("utf-8"))
+
+        self.assertEqual(self.data, parsed)
+        loads_mock.assert_not_called()
+        # only the text of about one element at a time was held in memory
+        self.assertLess(max(decoded_lengths), len(text) // 10)
+
+    def test_parse_empty_array(self):
+        self.assertEqual([], self.parse(b" [ ] "))
+
+    def test_parse_object(self):
+        self.assertEqual(self.data[0], self.parse(json.dumps(self.data[0]).encode()))
+
+    def test_parse_malformed_json(self):
+        for body in (b"[1,]", b"[1 2]", b"[1", b"[1] 2", b""):
+            with self.assertRaises(ParseError):
+                self.parse(body)
+
 
 class MorangoInfoTestCase(APITestCase):
     def setUp(self):
@@ -0,0 +1,39 @@
+import mock
+from django.test import SimpleTestCase
+from facility_profile.models import Facility
+from facility_profile.models import Folder
+from facility_profile.models import InteractionLog
+from facility_profile.models import MyUser
+from facility_profile.models import SummaryLog
+
+from morango.registry import syncable_models
+
+
+class SyncableModelRegistryTestCase(SimpleTestCase):
+    def test_get_model_dependencies(self):
+        dependencies = syncable_models.get_model_dependencies("facilitydata")
+        self.assertEqual(list(dependencies), syncable_models.get_models("facilitydata"))
+        # self referential foreign keys are not dependencies
+        self.assertEqual(dependencies[Facility], set())
+        self.assertEqual(dependencies[Folder], set())
+        self.assertEqual(dependencies[MyUser], set())
+        self.assertEqual(dependencies[SummaryLog], {MyUser})
+        self.assertEqual(dependencies[InteractionLog], {MyUser})
+
+    def test_get_model_levels(self):
+        levels = syncable_models.get_model_levels("facilitydata")
+        self.assertEqual(len(levels), 2)
+        self.assertEqual(set(levels[0]), {Facility, Folder, MyUser})
+        self.assertEqual(set(levels[1]), {SummaryLog, InteractionLog})
+
+    def test_get_model_levels__circular(self):
+        dependencies = syncable_models.get_model_dependencies("facilitydata")
+        dependencies[MyUser] = {SummaryLog}
+        with mock.patch.object(
+            syncable_models, "get_model_dependencies", return_value=dependencies
+        ):
+            levels = syncable_models.get_model_levels("facilitydata")
+        # falls back to processing one at a time, in registry order
+        self.assertEqual(set(levels[0]), {Facility, Folder})
+        self.assertEqual(levels[1], [MyUser])
+        self.assertEqual(set(levels[2]), {SummaryLog, InteractionLog})
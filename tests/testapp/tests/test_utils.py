@@ -8,6 +8,7 @@ import pytest
 from morango.constants.capabilities import ALLOW_CERTIFICATE_PUSHING
 from morango.constants.capabilities import ASYNC_OPERATIONS
 from morango.constants import transfer_stages
+from morango.utils import LRUCache
 from morango.utils import SETTINGS
 from morango.utils import CAPABILITIES_CLIENT_HEADER
 from morango.utils import CAPABILITIES_SERVER_HEADER
@@ -29,6 +30,16 @@ class SettingsTestCase(SimpleTestCase):
         self.assertEqual(SETTINGS.MORANGO_SERIALIZE_BEFORE_QUEUING, True)
         self.assertEqual(SETTINGS.MORANGO_DESERIALIZE_AFTER_DEQUEUING, True)
         self.assertEqual(SETTINGS.MORANGO_DISALLOW_ASYNC_OPERATIONS, False)
+        self.assertEqual(SETTINGS.MORANGO_SERIALIZE_BATCH_SIZE, 500)
+        self.assertEqual(SETTINGS.MORANGO_ENABLE_CHANGE_LOG, False)
+        self.assertEqual(SETTINGS.MORANGO_DESERIALIZE_WORKERS, 1)
+        self.assertEqual(SETTINGS.MORANGO_DESERIALIZE_FK_CACHE_SIZE, 100000)
+        self.assertEqual(SETTINGS.MORANGO_TRANSFER_PIPELINE_DEPTH, 1)
+        self.assertEqual(SETTINGS.MORANGO_ADAPTIVE_CHUNK_SIZE, False)
+        self.assertEqual(SETTINGS.MORANGO_CHUNK_SIZE_MIN, 50)
+        self.assertEqual(SETTINGS.MORANGO_CHUNK_SIZE_MAX, 5000)
+        self.assertEqual(SETTINGS.MORANGO_CHUNK_TARGET_LATENCY, 2.0)
+        self.assertIsNone(SETTINGS.MORANGO_DEQUEUE_CHUNK_SIZE)
         self.assertLength(3, SETTINGS.MORANGO_INITIALIZE_OPERATIONS)
         self.assertLength(3, SETTINGS.MORANGO_SERIALIZE_OPERATIONS)
         self.assertLength(4, SETTINGS.MORANGO_QUEUE_OPERATIONS)
@@ -101,3 +112,38 @@ class ProcessIDExistsTestCase(SimpleTestCase):
         pid = os.getpid()
         self.assertTrue(pid_exists(pid))
         self.assertFalse(pid_exists(123456789))
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cache = LRUCache(2)
+
+    def test_get_and_set(self):
+        self.cache["a"] = 1
+        self.assertEqual(self.cache["a"], 1)
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        with self.assertRaises(KeyError):
+            self.cache["b"]
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.stats(), {"hits": 2, "misses": 2, "evictions": 0})
+
+    def test_evicts_least_recently_used(self):
+        self.cache["a"] = 1
+        self.cache["b"] = 2
+        # using "a" makes "b" the least recently used
+        self.cache["a"]
+        self.cache["c"] = 3
+        self.assertEqual(len(self.cache), 2)
+        self.assertIn("a", self.cache)
+        self.assertIn("c", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_overwrite_does_not_evict(self):
+        self.cache["a"] = 1
+        self.cache["b"] = 2
+        self.cache["a"] = 3
+        self.assertEqual(self.cache["a"], 3)
+        self.assertEqual(self.cache["b"], 2)
+        self.assertEqual(self.cache.evictions, 0)